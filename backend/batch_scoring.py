@@ -0,0 +1,144 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from water_quality_model import WaterSafetyPredictor
+from ml_gate import predict_gated, ML_GATE_MODE
+
+def compute_block_scores(predictor: WaterSafetyPredictor, matrix: np.ndarray, metals: List[str],
+                         unit_check_metals: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Numeric scores for a block of uploaded rows as compact arrays.
+
+    matrix holds one column per entry of metals, with unreadable values already
+    set to 0.0. Levels come back as int8 codes into the water_quality_model level
+    tables and ML predictions as int16 codes into predictor.get_class_labels().
+    With ML gating on, 'ml_gate' holds the gating counts (None otherwise).
+    """
+    metal_df = pd.DataFrame(matrix, columns=metals)
+
+    # Unit detection as main.auto_detect_unit does it (zero readings included)
+    unit_metals = [metal for metal in unit_check_metals if metal in metals]
+    if unit_metals:
+        units = predictor.detect_unit_batch(metal_df[unit_metals].to_numpy(dtype=float), positive_only=False)
+        unit_is_mgL = units == "mg/L"
+    else:
+        unit_is_mgL = np.zeros(len(metal_df), dtype=bool)
+
+    indices = predictor.calculate_index_arrays(metal_df)
+
+    ml_matrix = metal_df.reindex(columns=predictor.hmpi_metals, fill_value=0.0).to_numpy(dtype=float)
+    gate_summary = None
+    if ML_GATE_MODE == "on":
+        ml_labels, _, _, gate_summary = predict_gated(
+            predictor, ml_matrix, indices['hmpi_score'], indices['hmpi_level_code']
+        )
+    else:
+        ml_labels, _ = predictor.predict_pollution_batch(ml_matrix)
+    ml_codes = pd.Categorical(ml_labels, categories=predictor.get_class_labels()).codes.astype(np.int16)
+
+    return {
+        'unit_is_mgL': unit_is_mgL,
+        'hmpi_score': indices['hmpi_score'],
+        'hmpi_level_code': indices['hmpi_level_code'],
+        'pli_score': indices['pli_score'],
+        'pli_level_code': indices['pli_level_code'],
+        'cf_value': indices['cf_value'],
+        'cf_level_code': indices['cf_level_code'],
+        'ml_code': ml_codes,
+        'ml_gate': gate_summary
+    }
+
+# Per-process state of the scoring workers
+_worker_model_path = None
+_worker_default_version = None  # version of the predictor loaded at startup
+_worker_predictors = {}  # model_version -> predictor, the most recently used last
+_worker_unit_check_metals = None
+WORKER_MODEL_VERSIONS = 3
+
+def _load_worker_predictor(path: str) -> WaterSafetyPredictor:
+    if os.path.isdir(path):
+        predictor = WaterSafetyPredictor.load_artifact(path)
+    else:
+        predictor = WaterSafetyPredictor.load_model(path)
+
+    # One thread per worker, the pool provides the parallelism
+    if predictor.model is not None:
+        try:
+            predictor.model.get_booster().set_param({'nthread': 1})
+        except Exception as e:
+            print(f"Could not limit worker threads: {e}")
+    return predictor
+
+def _init_worker(model_path: str, unit_check_metals: List[str]):
+    """Load the predictor once when a worker process starts"""
+    global _worker_model_path, _worker_default_version, _worker_unit_check_metals
+    _worker_model_path = model_path
+    _worker_unit_check_metals = unit_check_metals
+    predictor = _load_worker_predictor(model_path)
+    _worker_default_version = predictor.model_version
+    _worker_predictors[predictor.model_version] = predictor
+
+def _worker_predictor(model_version: Optional[str]) -> WaterSafetyPredictor:
+    """
+    The predictor of a model version, loaded from the artifact directory on
+    first use; the predictor loaded at startup when no version is given
+    """
+    if model_version is None:
+        model_version = _worker_default_version
+    predictor = _worker_predictors.pop(model_version, None)
+    if predictor is None:
+        if model_version == _worker_default_version:
+            path = _worker_model_path
+        else:
+            path = os.path.join(_worker_model_path, model_version)
+        predictor = _load_worker_predictor(path)
+        while len(_worker_predictors) >= WORKER_MODEL_VERSIONS:
+            _worker_predictors.pop(next(iter(_worker_predictors)))
+    _worker_predictors[model_version] = predictor
+    return predictor
+
+def _score_shared_block(shm_name: str, shape: tuple, metals: List[str],
+                        model_version: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Score a metal matrix that the parent placed in shared memory with the given model version"""
+    # The parent owns the segment and unlinks it once the block is scored
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        scores = compute_block_scores(_worker_predictor(model_version), matrix, metals, _worker_unit_check_metals)
+        del matrix
+        return scores
+    finally:
+        shm.close()
+
+class ProcessBlockScorer:
+    """Run compute_block_scores in a pool of worker processes, handing blocks over via shared memory"""
+
+    def __init__(self, model_path: str, max_workers: int, unit_check_metals: List[str]):
+        self.max_workers = max_workers
+        self.pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_path, list(unit_check_metals))
+        )
+
+    def score(self, matrix: np.ndarray, metals: List[str], model_version: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Score one block in a worker process with a model version, blocking the calling thread until done"""
+        matrix = np.ascontiguousarray(matrix, dtype=np.float64)
+        shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            np.ndarray(matrix.shape, dtype=np.float64, buffer=shm.buf)[...] = matrix
+            return self.pool.submit(_score_shared_block, shm.name, matrix.shape, list(metals), model_version).result()
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self.pool.shutdown(wait=False, cancel_futures=True)
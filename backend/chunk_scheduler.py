@@ -0,0 +1,130 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Dict
+
+class FairChunkScheduler:
+    """
+    Share a fixed number of executor slots between the chunks of concurrent batch jobs.
+
+    Each job queues its chunks separately. A free slot goes to the job that has
+    had the fewest rows scheduled relative to its priority (stride scheduling),
+    so a large upload cannot starve smaller ones and a priority 2 job gets
+    twice the rows of a priority 1 job. Chunk sizes follow the measured cost
+    per row so that one chunk takes about target_chunk_seconds.
+    """
+
+    def __init__(self, executor, workers: int, initial_chunk_size: int = 100, min_chunk_size: int = 50,
+                 max_chunk_size: int = 5000, target_chunk_seconds: float = 0.5, smoothing: float = 0.2):
+        self.executor = executor
+        self.workers = max(1, workers)
+        self.initial_chunk_size = initial_chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.target_chunk_seconds = target_chunk_seconds
+        self.smoothing = smoothing
+
+        self._jobs = {}
+        self._running = 0
+        self._seconds_per_row = None
+        self._loop = None
+
+        # Metrics
+        self.total_chunks = 0
+        self.total_rows = 0
+
+    def register(self, job_id: str, priority: int = 1):
+        """Add a job; it starts level with the jobs already running"""
+        passes = [state['pass'] for state in self._jobs.values()]
+        self._jobs[job_id] = {
+            'priority': max(1, priority),
+            'queue': deque(),
+            'pass': min(passes) if passes else 0.0,
+            'running': 0,
+            'rows_done': 0,
+            'chunks_done': 0,
+            'registered_at': time.perf_counter()
+        }
+
+    def unregister(self, job_id: str):
+        """Forget a job once all of its chunks have completed"""
+        self._jobs.pop(job_id, None)
+
+    def chunk_size(self) -> int:
+        """Rows per chunk that should take about target_chunk_seconds to score"""
+        if self._seconds_per_row is None:
+            return self.initial_chunk_size
+        size = int(self.target_chunk_seconds / max(self._seconds_per_row, 1e-9))
+        return max(self.min_chunk_size, min(self.max_chunk_size, size))
+
+    async def submit(self, job_id: str, rows: int, fn: Callable, *args) -> Any:
+        """Queue fn(*args), a chunk of rows for job_id, and wait for its result"""
+        self._loop = asyncio.get_running_loop()
+        future = self._loop.create_future()
+        self._jobs[job_id]['queue'].append((rows, fn, args, future))
+        self._dispatch()
+        return await future
+
+    def _dispatch(self):
+        """Start queued chunks while executor slots are free, fairest job first"""
+        while self._running < self.workers:
+            waiting = [state for state in self._jobs.values() if state['queue']]
+            if not waiting:
+                return
+            state = min(waiting, key=lambda s: (s['pass'], s['registered_at']))
+            rows, fn, args, future = state['queue'].popleft()
+            state['pass'] += rows / state['priority']
+            state['running'] += 1
+            self._running += 1
+            self._loop.create_task(self._run(state, rows, fn, args, future))
+
+    async def _run(self, state: Dict, rows: int, fn: Callable, args: tuple, future: asyncio.Future):
+        started = time.perf_counter()
+        try:
+            result = await self._loop.run_in_executor(self.executor, fn, *args)
+            if not future.done():
+                future.set_result(result)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._running -= 1
+            state['running'] -= 1
+            state['rows_done'] += rows
+            state['chunks_done'] += 1
+            self.total_chunks += 1
+            self.total_rows += rows
+            if rows:
+                cost = elapsed / rows
+                if self._seconds_per_row is None:
+                    self._seconds_per_row = cost
+                else:
+                    self._seconds_per_row += self.smoothing * (cost - self._seconds_per_row)
+            self._dispatch()
+
+    def metrics(self) -> Dict:
+        """Queue depth, chunk sizing and per-job throughput"""
+        now = time.perf_counter()
+        jobs = {}
+        for job_id, state in self._jobs.items():
+            elapsed = now - state['registered_at']
+            jobs[job_id] = {
+                'priority': state['priority'],
+                'queued_chunks': len(state['queue']),
+                'running_chunks': state['running'],
+                'rows_done': state['rows_done'],
+                'chunks_done': state['chunks_done'],
+                'rows_per_second': round(state['rows_done'] / elapsed, 1) if elapsed > 0 else 0.0
+            }
+
+        return {
+            'workers': self.workers,
+            'busy_workers': self._running,
+            'queue_depth': sum(len(state['queue']) for state in self._jobs.values()),
+            'chunk_size': self.chunk_size(),
+            'seconds_per_row': self._seconds_per_row,
+            'total_chunks': self.total_chunks,
+            'total_rows': self.total_rows,
+            'jobs': jobs
+        }
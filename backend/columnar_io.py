@@ -0,0 +1,95 @@
+import io
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Columnar payload formats: an Arrow IPC stream, or an .npz archive with one NumPy array per column
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+NUMPY_ARCHIVE = "application/x-npz"
+COLUMNAR_FORMATS = [ARROW_STREAM, NUMPY_ARCHIVE]
+
+class ColumnarFormatError(Exception):
+    """The payload format is not supported (or its library is not installed)"""
+
+class ColumnarPayloadError(ValueError):
+    """The payload could not be read or its columns are invalid"""
+
+def read_columns(body: bytes, content_type: str) -> Dict[str, np.ndarray]:
+    """One 1-D array per column of an Arrow IPC stream or .npz payload"""
+    if content_type == ARROW_STREAM:
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ColumnarFormatError("Arrow payloads need pyarrow, send an .npz archive instead")
+        try:
+            table = pa.ipc.open_stream(body).read_all()
+        except Exception as e:
+            raise ColumnarPayloadError(f"Invalid Arrow IPC stream: {e}")
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+
+    if content_type == NUMPY_ARCHIVE:
+        try:
+            # Object arrays are refused: loading them would unpickle client data
+            with np.load(io.BytesIO(body), allow_pickle=False) as archive:
+                columns = {name: archive[name] for name in archive.files}
+        except Exception as e:
+            raise ColumnarPayloadError(f"Invalid .npz archive: {e}")
+        for name, values in columns.items():
+            if values.ndim != 1:
+                raise ColumnarPayloadError(f"Column {name} must be one-dimensional")
+        return columns
+
+    raise ColumnarFormatError(f"Unsupported content type {content_type!r}, use one of {', '.join(COLUMNAR_FORMATS)}")
+
+def write_columns(columns: Dict[str, np.ndarray], content_type: str) -> bytes:
+    """Serialize columns in the given format; object columns are written as strings"""
+    if content_type == ARROW_STREAM:
+        import pyarrow as pa
+        table = pa.table({name: pa.array(values) for name, values in columns.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    buffer = io.BytesIO()
+    np.savez(buffer, **{
+        name: np.asarray(values, dtype=str) if values.dtype == object else values
+        for name, values in columns.items()
+    })
+    return buffer.getvalue()
+
+def validated_frame(columns: Dict[str, np.ndarray], numeric_columns: List[str],
+                    text_columns: List[str]) -> pd.DataFrame:
+    """
+    DataFrame of the known columns of a payload, validated per column: all of
+    equal length, numeric ones castable to finite floats (missing values are
+    NaN), text ones strings or missing. Other columns are ignored.
+    """
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ColumnarPayloadError("All columns must have the same length")
+
+    frame = {}
+    for name in numeric_columns:
+        if name not in columns:
+            continue
+        values = columns[name]
+        if values.dtype.kind not in 'iuf':
+            raise ColumnarPayloadError(f"Column {name} must be numeric")
+        values = values.astype(np.float64)
+        if np.isinf(values).any():
+            raise ColumnarPayloadError(f"Column {name} contains infinite values")
+        frame[name] = values
+
+    for name in text_columns:
+        if name not in columns:
+            continue
+        values = columns[name]
+        if values.dtype.kind in 'US':
+            values = values.astype(str).astype(object)
+        elif values.dtype.kind != 'O' or pd.api.types.infer_dtype(values, skipna=True) not in ('string', 'empty'):
+            raise ColumnarPayloadError(f"Column {name} must hold strings")
+        frame[name] = values
+
+    return pd.DataFrame(frame)
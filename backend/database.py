@@ -1,24 +1,128 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+from motor.motor_asyncio import AsyncIOMotorClient
+from bson.objectid import ObjectId
 from datetime import datetime,timedelta
+import hashlib
+import json
 import os
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import Any, List, Dict, Optional
+
+# Bulk ingestion settings
+BULK_BATCH_SIZE = int(os.getenv("DB_BULK_BATCH_SIZE", "1000"))
+BULK_FLUSH_INTERVAL = float(os.getenv("DB_BULK_FLUSH_INTERVAL", "1.0"))
+
+# Sample fields (matched case-insensitively) that say when a sample was taken
+SAMPLE_TIME_FIELDS = ['sample_date', 'sampled_at', 'date']
+
+def sample_fingerprint(sample_data: Dict, metals: List[str], source: Optional[str] = None) -> Optional[str]:
+    """
+    Content fingerprint of a sample: its location, coordinates, sampling time
+    and metal values. Stored samples are unique per fingerprint, so saving the
+    same row again updates the sample instead of adding another one. When the
+    sample was saved (timestamp, created_at) is not part of it.
+    
+    Repeated readings at a site can have the same values, so a sample without
+    a sampling time is told apart by source, the row it was read from (e.g.
+    "<upload hash>:<row_id>"). Without either it has no fingerprint (None) and
+    is always inserted.
+    """
+    fields = {str(key).lower(): value for key, value in sample_data.items()}
+    sampled_at = next((fields[name] for name in SAMPLE_TIME_FIELDS if fields.get(name) is not None), None)
+    if sampled_at is None and source is None:
+        return None
+    identity = {
+        'location': fields.get('location_name'),
+        'coordinates': [fields.get('latitude'), fields.get('longitude')],
+        'sampled_at': sampled_at,
+        'metals': {metal: sample_data.get(metal) for metal in sorted(metals)}
+    }
+    if sampled_at is None:
+        identity['source'] = source
+    return hashlib.sha1(json.dumps(identity, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def is_valid_sample_id(sample_id: str) -> bool:
+    """Whether sample_id is a well-formed sample ID (a 24-character hex ObjectId)"""
+    return ObjectId.is_valid(sample_id)
+
+def sample_write(sample_data: Dict):
+    """Bulk write operation saving a sample: an upsert on its fingerprint, a plain insert without one"""
+    if not sample_data.get('fingerprint'):
+        return InsertOne(sample_data)
+    fields = {key: value for key, value in sample_data.items() if key not in ('_id', 'created_at')}
+    return UpdateOne(
+        {'fingerprint': sample_data['fingerprint']},
+        {'$set': fields, '$setOnInsert': {'_id': sample_data['_id'], 'created_at': sample_data['created_at']}},
+        upsert=True
+    )
+
+def build_samples_query(days: int = 30, location: Optional[str] = None) -> Dict:
+    """Build the filter used by get_samples"""
+    query = {}
+    
+    if days:
+        start_date = datetime.utcnow() - timedelta(days=days)
+        query['created_at'] = {'$gte': start_date}
+    
+    if location:
+        query['location_name'] = {'$regex': location, '$options': 'i'}
+    
+    return query
+
+def build_delete_query(delete_option: str, start_date: str = None,
+                       end_date: str = None, sample_ids: List[str] = None) -> Optional[Dict]:
+    """Build the filter used by delete_samples, None if the parameters are invalid"""
+    if delete_option == "all":
+        return {}
+    elif delete_option == "date_range" and start_date and end_date:
+        start_dt = datetime.fromisoformat(start_date)
+        end_dt = datetime.fromisoformat(end_date)
+        return {'created_at': {'$gte': start_dt, '$lte': end_dt}}
+    elif delete_option == "selected" and sample_ids:
+        return {'_id': {'$in': [ObjectId(id) for id in sample_ids]}}
+    return None
 
 class MongoDBManager:
     def __init__(self, connection_string: str = None, db_name: str = "water_quality"):
         self.connection_string = connection_string or os.getenv("MONGODB_URI")
         self.db_name = db_name
         self.client = None
-        self.db = None
-        self.connect()
+        self._db = None
+    
+    @property
+    def db(self):
+        """Database handle, connecting on first use"""
+        if self._db is None:
+            self.connect()
+        return self._db
+    
+    @db.setter
+    def db(self, value):
+        self._db = value
     
     def connect(self):
-        """Connect to MongoDB"""
+        """Connect to MongoDB (once; the API does this at startup, not at import)"""
+        if self._db is not None:
+            return
         try:
             self.client = MongoClient(self.connection_string)
-            self.db = self.client[self.db_name]
+            self._db = self.client[self.db_name]
             print("Connected to MongoDB successfully")
         except Exception as e:
             print(f"Error connecting to MongoDB: {e}")
+            return
+        self.ensure_indexes()
+    
+    def ensure_indexes(self):
+        """Unique index on sample fingerprints, which batch ingestion upserts on"""
+        try:
+            self._db.samples.create_index(
+                'fingerprint', unique=True, partialFilterExpression={'fingerprint': {'$type': 'string'}}
+            )
+        except Exception as e:
+            print(f"Could not create the sample fingerprint index: {e}")
     
     def insert_sample(self, sample_data: Dict) -> str:
         """Insert a single sample into the database"""
@@ -26,17 +130,72 @@ class MongoDBManager:
         result = self.db.samples.insert_one(sample_data)
         return str(result.inserted_id)
     
-    def get_samples(self, days: int = 30, location: Optional[str] = None) -> List[Dict]:
-        """Get samples with optional filtering"""
-        query = {}
+    def insert_samples_bulk(self, samples: List[Dict], row_ids: Optional[List[Any]] = None,
+                            batch_size: int = None) -> Dict:
+        """
+        Save many samples with unordered bulk_write calls of batch_size documents.
+        Samples with a fingerprint are upserted on it, so saving a row again
+        (a retried or resumed job) updates its sample; the others are inserted.
+        Returns the saved IDs and per-row errors keyed by row_id (list position
+        when row_ids is not given); a sample that was already stored keeps its
+        ID, which may differ from the one sample_data was given.
+        """
+        batch_size = batch_size or BULK_BATCH_SIZE
+        if row_ids is None:
+            row_ids = list(range(len(samples)))
         
-        if days:
-            start_date = datetime.utcnow() - timedelta(days=days)
-            query['created_at'] = {'$gte': start_date}
+        now = datetime.utcnow()
+        for sample_data in samples:
+            sample_data.setdefault('created_at', now)
+            if '_id' not in sample_data:
+                sample_data['_id'] = ObjectId()
         
-        if location:
-            query['location_name'] = {'$regex': location, '$options': 'i'}
+        inserted_ids = {}
+        errors = {}
+        for start in range(0, len(samples), batch_size):
+            batch = samples[start:start + batch_size]
+            batch_row_ids = row_ids[start:start + batch_size]
+            failed = {}
+            upserted = set()
+            try:
+                result = self.db.samples.bulk_write([sample_write(sample_data) for sample_data in batch], ordered=False)
+                upserted = set(result.upserted_ids)
+            except BulkWriteError as e:
+                for write_error in e.details.get('writeErrors', []):
+                    failed[write_error['index']] = write_error.get('errmsg', 'Write error')
+                upserted = {item['index'] for item in e.details.get('upserted', [])}
+            except Exception as e:
+                failed = {i: str(e) for i in range(len(batch))}
+            
+            # Samples saved before (matched on their fingerprint) keep the ID they were stored under
+            stored_ids = {}
+            matched = [sample_data['fingerprint'] for i, sample_data in enumerate(batch)
+                       if sample_data.get('fingerprint') and i not in upserted and i not in failed]
+            if matched:
+                try:
+                    stored_ids = {
+                        document['fingerprint']: document['_id']
+                        for document in self.db.samples.find({'fingerprint': {'$in': matched}}, {'fingerprint': 1})
+                    }
+                except Exception as e:
+                    print(f"Could not look up the IDs of updated samples: {e}")
+            
+            for i, (row_id, sample_data) in enumerate(zip(batch_row_ids, batch)):
+                if i in failed:
+                    errors[row_id] = failed[i]
+                else:
+                    inserted_ids[row_id] = str(stored_ids.get(sample_data.get('fingerprint'), sample_data['_id']))
         
+        return {
+            'inserted_ids': inserted_ids,
+            'errors': errors,
+            'inserted_count': len(inserted_ids),
+            'failed_count': len(errors)
+        }
+    
+    def get_samples(self, days: int = 30, location: Optional[str] = None) -> List[Dict]:
+        """Get samples with optional filtering"""
+        query = build_samples_query(days, location)
         samples = list(self.db.samples.find(query).sort('created_at', -1))
         
         # Convert ObjectId to string for JSON serialization
@@ -48,18 +207,8 @@ class MongoDBManager:
     def delete_samples(self, delete_option: str, start_date: str = None, 
                       end_date: str = None, sample_ids: List[str] = None) -> Dict:
         """Delete samples based on criteria"""
-        query = {}
-        
-        if delete_option == "all":
-            query = {}
-        elif delete_option == "date_range" and start_date and end_date:
-            start_dt = datetime.fromisoformat(start_date)
-            end_dt = datetime.fromisoformat(end_date)
-            query['created_at'] = {'$gte': start_dt, '$lte': end_dt}
-        elif delete_option == "selected" and sample_ids:
-            from bson.objectid import ObjectId
-            query['_id'] = {'$in': [ObjectId(id) for id in sample_ids]}
-        else:
+        query = build_delete_query(delete_option, start_date, end_date, sample_ids)
+        if query is None:
             return {"success": False, "message": "Invalid delete parameters"}
         
         result = self.db.samples.delete_many(query)
@@ -70,8 +219,9 @@ class MongoDBManager:
         }
     
     def get_sample_by_id(self, sample_id: str) -> Optional[Dict]:
-        """Get a single sample by ID"""
-        from bson.objectid import ObjectId
+        """Get a single sample by ID, None if it is unknown or the ID is malformed"""
+        if not is_valid_sample_id(sample_id):
+            return None
         sample = self.db.samples.find_one({'_id': ObjectId(sample_id)})
         if sample:
             sample['_id'] = str(sample['_id'])
@@ -81,6 +231,198 @@ class MongoDBManager:
         """Close the database connection"""
         if self.client:
             self.client.close()
+            self.client = None
+            self._db = None
+
+class BulkWriteBuffer:
+    """
+    Write-behind buffer for batch jobs. add() only queues the document and
+    returns its pre-assigned ID; a background thread flushes through
+    insert_samples_bulk whenever batch_size documents are waiting or
+    flush_interval seconds have passed. Producers only block when max_pending
+    documents are queued. Rows whose sample was already stored under another
+    ID are reported by reassigned_rows().
+    """
+    
+    def __init__(self, manager: 'MongoDBManager', batch_size: int = None,
+                 flush_interval: float = None, max_pending: int = None):
+        self.manager = manager
+        self.batch_size = batch_size or BULK_BATCH_SIZE
+        self.flush_interval = flush_interval or BULK_FLUSH_INTERVAL
+        self.max_pending = max_pending or self.batch_size * 10
+        
+        self.inserted_ids = {}
+        self.reassigned_ids = {}
+        self.errors = {}
+        self._pending = []
+        self._flushing = []
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="bulk-write-buffer", daemon=True)
+        self._thread.start()
+    
+    def add(self, sample_data: Dict, row_id: Any = None) -> str:
+        """Queue a sample for insertion and return the ID it will be stored under"""
+        sample_data.setdefault('created_at', datetime.utcnow())
+        if '_id' not in sample_data:
+            sample_data['_id'] = ObjectId()
+        
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Write buffer is closed")
+            while len(self._pending) >= self.max_pending:
+                self._condition.wait()
+            self._pending.append((row_id, sample_data))
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+        
+        return str(sample_data['_id'])
+    
+    def _run(self):
+        """Flush on size or time until closed"""
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._pending) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                
+                pending, self._pending = self._pending, []
+                self._flushing = [row_id for row_id, _ in pending]
+                closing = self._closed
+                self._condition.notify_all()
+            
+            if pending:
+                result = self.manager.insert_samples_bulk(
+                    [sample_data for _, sample_data in pending],
+                    row_ids=[row_id for row_id, _ in pending],
+                    batch_size=self.batch_size
+                )
+                with self._condition:
+                    self.inserted_ids.update(result['inserted_ids'])
+                    self.errors.update(result['errors'])
+                    for row_id, sample_data in pending:
+                        stored_id = result['inserted_ids'].get(row_id)
+                        if stored_id is not None and stored_id != str(sample_data['_id']):
+                            self.reassigned_ids[row_id] = stored_id
+                    self._flushing = []
+            
+            if closing:
+                return
+    
+    def failed_rows(self) -> Dict:
+        """Copy of {row_id: error} for rows that failed to insert so far"""
+        with self._condition:
+            return dict(self.errors)
+    
+    def reassigned_rows(self) -> Dict:
+        """Copy of {row_id: sample ID} for rows saved under another ID than add() returned, so far"""
+        with self._condition:
+            return dict(self.reassigned_ids)
+    
+    def oldest_unwritten(self) -> Any:
+        """Smallest row_id still queued or being flushed, None when everything added so far is written"""
+        with self._condition:
+            row_ids = [row_id for row_id, _ in self._pending] + self._flushing
+        return min(row_ids) if row_ids else None
+    
+    def close(self) -> Dict:
+        """Flush everything still queued, stop the flusher and return the outcome"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        
+        if self.errors:
+            print(f"Bulk write finished with {len(self.errors)} failed rows")
+        return {
+            'inserted_ids': self.inserted_ids,
+            'reassigned_ids': self.reassigned_ids,
+            'errors': self.errors,
+            'inserted_count': len(self.inserted_ids),
+            'failed_count': len(self.errors)
+        }
+
+class AsyncMongoDBManager:
+    """Non-blocking counterpart of MongoDBManager for use inside async endpoints"""
+    
+    def __init__(self, connection_string: str = None, db_name: str = "water_quality"):
+        self.connection_string = connection_string or os.getenv("MONGODB_URI")
+        self.db_name = db_name
+        self.client = None
+        self._db = None
+    
+    @property
+    def db(self):
+        """Database handle, creating the client on first use"""
+        if self._db is None:
+            self.connect()
+        return self._db
+    
+    @db.setter
+    def db(self, value):
+        self._db = value
+    
+    def connect(self):
+        """Create the motor client once (connections are opened on first use)"""
+        if self._db is not None:
+            return
+        try:
+            self.client = AsyncIOMotorClient(self.connection_string)
+            self._db = self.client[self.db_name]
+        except Exception as e:
+            print(f"Error creating async MongoDB client: {e}")
+    
+    async def insert_sample(self, sample_data: Dict) -> str:
+        """Insert a single sample into the database"""
+        sample_data['created_at'] = datetime.utcnow()
+        result = await self.db.samples.insert_one(sample_data)
+        return str(result.inserted_id)
+    
+    async def get_samples(self, days: int = 30, location: Optional[str] = None) -> List[Dict]:
+        """Get samples with optional filtering"""
+        query = build_samples_query(days, location)
+        samples = await self.db.samples.find(query).sort('created_at', -1).to_list(length=None)
+        
+        # Convert ObjectId to string for JSON serialization
+        for sample in samples:
+            sample['_id'] = str(sample['_id'])
+        
+        return samples
+    
+    async def delete_samples(self, delete_option: str, start_date: str = None,
+                             end_date: str = None, sample_ids: List[str] = None) -> Dict:
+        """Delete samples based on criteria"""
+        query = build_delete_query(delete_option, start_date, end_date, sample_ids)
+        if query is None:
+            return {"success": False, "message": "Invalid delete parameters"}
+        
+        result = await self.db.samples.delete_many(query)
+        return {
+            "success": True,
+            "message": f"Deleted {result.deleted_count} samples",
+            "deleted_count": result.deleted_count
+        }
+    
+    async def get_sample_by_id(self, sample_id: str) -> Optional[Dict]:
+        """Get a single sample by ID, None if it is unknown or the ID is malformed"""
+        if not is_valid_sample_id(sample_id):
+            return None
+        sample = await self.db.samples.find_one({'_id': ObjectId(sample_id)})
+        if sample:
+            sample['_id'] = str(sample['_id'])
+        return sample
+    
+    def close(self):
+        """Close the database connection"""
+        if self.client:
+            self.client.close()
+            self.client = None
+            self._db = None
 
-# Singleton instance
-db_manager = MongoDBManager()
\ No newline at end of file
+# Singleton instances: db_manager for worker threads, async_db_manager for async endpoints.
+# Neither connects until connect() is called or the database is first used.
+db_manager = MongoDBManager()
+async_db_manager = AsyncMongoDBManager()
\ No newline at end of file
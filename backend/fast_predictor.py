@@ -0,0 +1,146 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import xgboost as xgb
+
+# Boosting rounds kept by the fast evaluator, 0 keeps every round
+FAST_MODEL_MAX_ROUNDS = int(os.getenv("FAST_MODEL_MAX_ROUNDS", "0"))
+# Synthetic samples the fast evaluator is compared with the full model on
+FAST_MODEL_AGREEMENT_ROWS = int(os.getenv("FAST_MODEL_AGREEMENT_ROWS", "5000"))
+
+class TreeEnsembleEvaluator:
+    """
+    A multi-class XGBoost booster compiled into flat NumPy arrays.
+
+    Every tree is walked for all rows at once, one tree level per step, so a
+    prediction is a handful of array gathers instead of a DMatrix round trip
+    through the XGBoost library. Leaves point back at themselves, which lets
+    every walk run for exactly max_depth steps. Only numerical splits are
+    supported; max_rounds keeps the first boosting rounds only.
+    """
+
+    def __init__(self, booster: xgb.Booster, max_rounds: int = 0):
+        model = json.loads(bytes(booster.save_raw('json')))
+        learner = model['learner']
+        trees = learner['gradient_booster']['model']['trees']
+        tree_info = learner['gradient_booster']['model']['tree_info']
+        self.n_classes = max(int(learner['learner_model_param']['num_class']), 1)
+        self.n_features = int(learner['learner_model_param']['num_feature'])
+        self.total_rounds = len(trees) // self.n_classes
+        self.rounds = min(max_rounds, self.total_rounds) if max_rounds > 0 else self.total_rounds
+
+        features, thresholds, lefts, rights, default_lefts, values, roots = [], [], [], [], [], [], []
+        offset = 0
+        self.max_depth = 0
+        for tree in trees:
+            if any(tree.get('split_type', [])):
+                raise ValueError("Categorical splits are not supported by the fast evaluator")
+            left = np.asarray(tree['left_children'], dtype=np.int64)
+            right = np.asarray(tree['right_children'], dtype=np.int64)
+            leaf = left == -1
+            nodes = np.arange(len(left))
+
+            # Leaves loop back to themselves and never match a split
+            features.append(np.where(leaf, 0, tree['split_indices']))
+            thresholds.append(np.where(leaf, np.inf, tree['split_conditions']).astype(np.float32))
+            lefts.append(np.where(leaf, nodes, left) + offset)
+            rights.append(np.where(leaf, nodes, right) + offset)
+            default_lefts.append(np.asarray(tree['default_left'], dtype=bool))
+            values.append(np.where(leaf, tree['split_conditions'], 0.0))
+            roots.append(offset)
+            self.max_depth = max(self.max_depth, self._depth(left, right))
+            offset += len(left)
+
+        self.feature = np.concatenate(features).astype(np.int64)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts)
+        self.right = np.concatenate(rights)
+        self.default_left = np.concatenate(default_lefts)
+        self.value = np.concatenate(values).astype(np.float64)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.tree_class = np.asarray(tree_info, dtype=np.int64)
+
+        # The intercept is whatever the booster adds on top of all of its trees; taking it
+        # from a margin prediction avoids depending on how each XGBoost version stores it
+        zeros = np.zeros((1, self.n_features), dtype=np.float32)
+        full_margin = booster.predict(xgb.DMatrix(zeros), output_margin=True).reshape(1, -1)
+        self.bias = (full_margin - self._tree_margin(zeros, len(self.roots)))[0]
+        self.n_trees = self.rounds * self.n_classes
+
+    @staticmethod
+    def _depth(left: np.ndarray, right: np.ndarray) -> int:
+        depth, frontier = 0, [0]
+        while True:
+            frontier = [child for node in frontier for child in (left[node], right[node]) if child != -1]
+            if not frontier:
+                return depth
+            depth += 1
+
+    def _tree_margin(self, features: np.ndarray, n_trees: int) -> np.ndarray:
+        """Summed leaf values per class of the first n_trees trees"""
+        nodes = np.broadcast_to(self.roots[:n_trees], (len(features), n_trees)).copy()
+        rows = np.arange(len(features))[:, None]
+        for _ in range(self.max_depth):
+            values = features[rows, self.feature[nodes]]
+            go_left = np.where(np.isnan(values), self.default_left[nodes], values < self.threshold[nodes])
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        margin = np.zeros((len(features), self.n_classes))
+        leaf_values = self.value[nodes]
+        for class_index in range(self.n_classes):
+            margin[:, class_index] = leaf_values[:, self.tree_class[:n_trees] == class_index].sum(axis=1)
+        return margin
+
+    def predict_margin(self, features: np.ndarray) -> np.ndarray:
+        """(N, n_classes) raw scores of already scaled features"""
+        features = np.asarray(features, dtype=np.float32).reshape(-1, self.n_features)
+        return self._tree_margin(features, self.n_trees) + self.bias
+
+    def predict_proba(self, features: np.ndarray) -> np.ndarray:
+        """(N, n_classes) class probabilities, as XGBClassifier.predict_proba gives them"""
+        margin = self.predict_margin(features)
+        margin -= margin.max(axis=1, keepdims=True)
+        probabilities = np.exp(margin)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+def reference_samples(metals: List[str], n_samples: int, seed: int = 7) -> np.ndarray:
+    """Raw concentrations drawn like the model's training data, for agreement checks"""
+    rng = np.random.default_rng(seed)
+    matrix = rng.lognormal(mean=-2, sigma=2, size=(n_samples, len(metals)))
+    high = rng.random(matrix.shape) < 0.1
+    matrix[high] = rng.uniform(10, 100, size=int(high.sum()))
+    return matrix
+
+def measure_agreement(predictor, samples: Optional[np.ndarray] = None, timing_calls: int = 50) -> Dict:
+    """
+    Compare the fast evaluator of predictor with its full model: share of
+    identical predicted levels, probability differences, and single-sample
+    latency of both.
+    """
+    if samples is None:
+        samples = reference_samples(predictor.hmpi_metals, FAST_MODEL_AGREEMENT_ROWS)
+    full_labels, full_probabilities = predictor.predict_pollution_batch(samples)
+    fast_labels, fast_probabilities = predictor.predict_pollution_batch(samples, fast=True)
+    difference = np.abs(full_probabilities - fast_probabilities)
+
+    def latency_ms(fast: bool) -> float:
+        started = time.perf_counter()
+        for i in range(timing_calls):
+            predictor.predict_pollution_batch(samples[i % len(samples):i % len(samples) + 1], fast=fast)
+        return (time.perf_counter() - started) / timing_calls * 1000.0
+
+    evaluator = predictor.get_fast_model()
+    return {
+        'model_version': predictor.model_version,
+        'rounds': evaluator.rounds,
+        'total_rounds': evaluator.total_rounds,
+        'samples': len(samples),
+        'label_agreement': float(np.mean(full_labels == fast_labels)),
+        'mean_probability_difference': float(difference.mean()),
+        'max_probability_difference': float(difference.max()),
+        'full_latency_ms': round(latency_ms(False), 4),
+        'fast_latency_ms': round(latency_ms(True), 4)
+    }
@@ -0,0 +1,241 @@
+import asyncio
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+class JobQueueFullError(Exception):
+    """Raised when no more batch jobs can be queued"""
+
+class JobManager:
+    """
+    Thread-safe registry of batch jobs.
+
+    At most max_concurrent_jobs run at once and up to max_queued_jobs wait for a
+    slot. Finished jobs are dropped after retention_seconds, and sooner (oldest
+    first) when the result rows they hold in memory together exceed
+    max_retained_rows. Results spilled to disk by a result store do not count.
+    """
+
+    FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+    def __init__(self, max_concurrent_jobs: int = 2, max_queued_jobs: int = 20,
+                 retention_seconds: float = 3600, max_retained_rows: int = 200000):
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.max_queued_jobs = max_queued_jobs
+        self.retention_seconds = retention_seconds
+        self.max_retained_rows = max_retained_rows
+
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._cancel_events = {}
+        self._subscribers = {}  # job_id -> [(loop, asyncio.Event)]
+        self._slots = None
+        self._slots_loop = None
+
+    def create_job(self, job_id: str, total_samples: int, priority: int = 1) -> Dict:
+        """Register a new job in the queued state; higher priority jobs get a larger share of workers"""
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job['status'] == 'queued')
+            if queued >= self.max_queued_jobs:
+                raise JobQueueFullError(f"{queued} batch jobs are already waiting, try again later")
+
+            self._jobs[job_id] = {
+                'status': 'queued',
+                'progress': 0.0,
+                'total': total_samples,
+                'processed': 0,
+                'results': [],
+                'priority': priority,
+                'created_at': datetime.utcnow()
+            }
+            self._cancel_events[job_id] = threading.Event()
+            return dict(self._jobs[job_id])
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrent_jobs)
+            self._slots_loop = loop
+        return self._slots
+
+    async def start(self, job_id: str) -> bool:
+        """Wait for a free slot and mark the job as processing; False if it was cancelled while queued"""
+        await self._get_slots().acquire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != 'queued':
+                self._slots.release()
+                return False
+            job['status'] = 'processing'
+            job['start_time'] = datetime.utcnow()
+            self._notify(job_id)
+            return True
+
+    def release(self, job_id: str):
+        """Give the job's slot back once it has finished"""
+        self._slots.release()
+
+    def add_progress(self, job_id: str, processed: int):
+        """Atomically count processed rows of a job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job['processed'] += processed
+            if job['total']:
+                job['progress'] = min(job['processed'] / job['total'] * 100, 100.0)
+            self._notify(job_id)
+
+    def is_cancelled(self, job_id: str) -> bool:
+        """Whether cancellation was requested for the job"""
+        event = self._cancel_events.get(job_id)
+        return event is not None and event.is_set()
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Request cancellation, returns the job's resulting status or None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job['status'] in self.FINISHED_STATUSES:
+                return job['status']
+
+            self._cancel_events[job_id].set()
+            if job['status'] == 'queued':
+                job['status'] = 'cancelled'
+                job['end_time'] = datetime.utcnow()
+            else:
+                job['status'] = 'cancelling'
+            self._notify(job_id)
+            return job['status']
+
+    def finish(self, job_id: str, results, **details):
+        """
+        Store a job's results; it ends as cancelled if cancellation was requested.
+        details are stored with the job, e.g. failed_writes or a corrected total.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(details)
+            job['results'] = results
+            job['end_time'] = datetime.utcnow()
+            if self._cancel_events[job_id].is_set():
+                job['status'] = 'cancelled'
+            else:
+                job['status'] = 'completed'
+                job['progress'] = 100.0
+            self._notify(job_id)
+            self._enforce_row_limit()
+
+    def fail(self, job_id: str, error: str):
+        """Mark a job as failed"""
+        with self._lock:
+            job = self._jobs.setdefault(job_id, {
+                'progress': 0.0, 'total': 0, 'processed': 0, 'results': [], 'created_at': datetime.utcnow()
+            })
+            self._cancel_events.setdefault(job_id, threading.Event())
+            job['status'] = 'failed'
+            job['error'] = error
+            job['end_time'] = datetime.utcnow()
+            self._notify(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Snapshot of a job's fields, None if unknown"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def subscribe(self, job_id: str) -> Optional[asyncio.Event]:
+        """
+        Event on the running loop that is set whenever the job changes,
+        None if the job is unknown. Pair with unsubscribe.
+        """
+        event = asyncio.Event()
+        with self._lock:
+            if job_id not in self._jobs:
+                return None
+            self._subscribers.setdefault(job_id, []).append((asyncio.get_running_loop(), event))
+        return event
+
+    def unsubscribe(self, job_id: str, event: asyncio.Event):
+        """Stop delivering change notifications to event"""
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, [])
+            self._subscribers[job_id] = [(loop, e) for loop, e in subscribers if e is not event]
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def _notify(self, job_id: str):
+        """Wake the job's subscribers (lock held, callable from any thread)"""
+        for loop, event in self._subscribers.get(job_id, []):
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # The subscriber's loop has already been closed
+                pass
+
+    def discard(self, job_id: str):
+        """Forget a job right away (e.g. one whose state lives in a durable queue)"""
+        with self._lock:
+            self._remove(job_id)
+
+    def _remove(self, job_id: str):
+        job = self._jobs.pop(job_id, None)
+        self._cancel_events.pop(job_id, None)
+        self._notify(job_id)
+        # Result stores hold spilled files that have to be removed
+        if job is not None and hasattr(job.get('results'), 'close'):
+            job['results'].close()
+
+    @staticmethod
+    def _memory_rows(results) -> int:
+        """Result rows a job holds in memory"""
+        if results is None:
+            return 0
+        return getattr(results, 'memory_rows', len(results))
+
+    def _enforce_row_limit(self):
+        """Drop the oldest finished jobs while their results exceed max_retained_rows (lock held)"""
+        finished = sorted(
+            (job['end_time'], job_id, self._memory_rows(job.get('results')))
+            for job_id, job in self._jobs.items()
+            if job['status'] in self.FINISHED_STATUSES
+        )
+        retained_rows = sum(rows for _, _, rows in finished)
+        # Always keep the most recent job so its results can still be read
+        for _, job_id, rows in finished[:-1]:
+            if retained_rows <= self.max_retained_rows:
+                break
+            self._remove(job_id)
+            retained_rows -= rows
+            print(f"Evicted batch job {job_id} to stay within {self.max_retained_rows} retained rows")
+
+    def cleanup(self) -> int:
+        """Remove finished jobs older than retention_seconds, returns how many were removed"""
+        now = datetime.utcnow()
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job['status'] in self.FINISHED_STATUSES
+                and (now - job['end_time']).total_seconds() > self.retention_seconds
+            ]
+            for job_id in expired:
+                self._remove(job_id)
+            self._enforce_row_limit()
+        return len(expired)
+
+    def clear(self):
+        """Remove every job and its stored results"""
+        with self._lock:
+            for job_id in list(self._jobs):
+                self._remove(job_id)
+
+    def stats(self) -> Dict:
+        """Job counts by status"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return counts
@@ -0,0 +1,385 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+# Where batch jobs are queued: "memory" keeps them in the API process only,
+# "sqlite" and "mongo" persist them so any worker can pick them up and resume them
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "batch_jobs.sqlite3")
+# A worker that stops renewing its lease for this long loses the job to another worker
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+ACTIVE_STATUSES = ('processing', 'cancelling')
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+def new_job_record(job_id: str, input_path: str, total: int, priority: int) -> Dict:
+    """Fields of a freshly queued durable job"""
+    now = time.time()
+    return {
+        'job_id': job_id,
+        'status': 'queued',
+        'priority': priority,
+        'input_path': input_path,
+        'total': total,
+        'processed': 0,
+        'chunk_id': 0,
+        'row_offset': 0,
+        'worker_id': None,
+        'lease_until': None,
+        'failed_writes': 0,
+        'results_count': None,
+        'error': None,
+        'created_at': now,
+        'updated_at': now,
+        'end_time': None
+    }
+
+def completed_job_record(job_id: str, total: int, results_count: int, priority: int) -> Dict:
+    """Fields of a job whose results were in place when it was created"""
+    now = time.time()
+    return {**new_job_record(job_id, '', total, priority), 'status': 'completed', 'processed': total,
+            'results_count': results_count, 'end_time': now}
+
+class SQLiteJobQueue:
+    """
+    Durable job queue in a local SQLite file, for single-host deployments and
+    development. Several processes may share the file (WAL mode), each with a
+    connection of its own opened on first use, so the queue can be created
+    before a server forks its workers.
+    """
+
+    COLUMNS = list(new_job_record('', '', 0, 1).keys())
+
+    def __init__(self, path: str = None, lease_seconds: float = None):
+        self.path = path or JOB_QUEUE_PATH
+        self.lease_seconds = JOB_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """
+        The connection of this process (lock held), opened on first use: a
+        connection must not be shared with processes forked from this one.
+        """
+        if self._connection is None or self._connection_pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 1,
+                    input_path TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    processed INTEGER NOT NULL DEFAULT 0,
+                    chunk_id INTEGER NOT NULL DEFAULT 0,
+                    row_offset INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    lease_until REAL,
+                    failed_writes INTEGER NOT NULL DEFAULT 0,
+                    results_count INTEGER,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    end_time REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS batch_jobs_claim ON batch_jobs (status, priority, created_at)")
+            self._connection = conn
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _insert(self, record: Dict):
+        placeholders = ", ".join("?" for _ in self.COLUMNS)
+        self._execute(
+            f"INSERT INTO batch_jobs ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+            tuple(record[col] for col in self.COLUMNS)
+        )
+
+    def enqueue(self, job_id: str, input_path: str, total: int, priority: int = 1):
+        """Queue a job whose rows are in the CSV file at input_path"""
+        self._insert(new_job_record(job_id, input_path, total, priority))
+
+    def add_completed(self, job_id: str, total: int, results_count: int, priority: int = 1):
+        """Record a job that is already completed, its results already in place (e.g. from the upload cache)"""
+        self._insert(completed_job_record(job_id, total, results_count, priority))
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Take the next job for worker_id: a queued job (highest priority, oldest
+        first) or a running one whose worker stopped renewing its lease.
+        Returns its record, including the checkpoint to resume from.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs cancelled while their worker was gone are closed here
+                self._conn.execute(
+                    "UPDATE batch_jobs SET status = 'cancelled', end_time = ?, updated_at = ? "
+                    "WHERE status = 'cancelling' AND lease_until < ?",
+                    (now, now, now)
+                )
+                row = self._conn.execute(
+                    "SELECT * FROM batch_jobs WHERE status = 'queued' OR (status = 'processing' AND lease_until < ?) "
+                    "ORDER BY priority DESC, created_at ASC LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                self._conn.execute(
+                    "UPDATE batch_jobs SET status = 'processing', worker_id = ?, lease_until = ?, "
+                    "processed = row_offset, updated_at = ? WHERE job_id = ?",
+                    (worker_id, now + self.lease_seconds, now, row['job_id'])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        record = dict(row)
+        record.update(status='processing', worker_id=worker_id, processed=record['row_offset'])
+        return record
+
+    def renew(self, job_id: str, worker_id: str, processed: int) -> Optional[str]:
+        """Extend worker_id's lease and record progress; returns the job's status, None if the lease was lost"""
+        now = time.time()
+        self._execute(
+            "UPDATE batch_jobs SET lease_until = ?, processed = ?, updated_at = ? "
+            "WHERE job_id = ? AND worker_id = ? AND status IN ('processing', 'cancelling')",
+            (now + self.lease_seconds, processed, now, job_id, worker_id)
+        )
+        record = self.get(job_id)
+        if record is None or record['worker_id'] != worker_id:
+            return None
+        return record['status']
+
+    def checkpoint(self, job_id: str, worker_id: str, chunk_id: int, row_offset: int, failed_writes: int):
+        """Record that every row before row_offset (chunks before chunk_id) is scored and saved"""
+        now = time.time()
+        self._execute(
+            "UPDATE batch_jobs SET chunk_id = ?, row_offset = ?, failed_writes = ?, updated_at = ? "
+            "WHERE job_id = ? AND worker_id = ? AND row_offset <= ?",
+            (chunk_id, row_offset, failed_writes, now, job_id, worker_id, row_offset)
+        )
+
+    def release(self, job_id: str, worker_id: str):
+        """Hand a running job back to the queue, e.g. when its worker shuts down"""
+        now = time.time()
+        self._execute(
+            "UPDATE batch_jobs SET status = CASE status WHEN 'cancelling' THEN 'cancelled' ELSE 'queued' END, "
+            "end_time = CASE status WHEN 'cancelling' THEN ? ELSE end_time END, "
+            "worker_id = NULL, lease_until = NULL, updated_at = ? WHERE job_id = ? AND worker_id = ?",
+            (now, now, job_id, worker_id)
+        )
+
+    def finish(self, job_id: str, worker_id: str, status: str, results_count: int = 0,
+               failed_writes: int = 0, error: str = None, total: int = None) -> bool:
+        """
+        Close a job as completed, cancelled or failed; total corrects the
+        submitted row count. Returns False if worker_id no longer holds the job.
+        """
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE batch_jobs SET status = ?, results_count = ?, failed_writes = ?, error = ?, "
+            "total = COALESCE(?, total), processed = CASE WHEN ? = 'completed' THEN COALESCE(?, total) ELSE processed END, "
+            "lease_until = NULL, end_time = ?, updated_at = ? WHERE job_id = ? AND worker_id IS ?",
+            (status, results_count, failed_writes, error, total, status, total, now, now, job_id, worker_id)
+        )
+        return cursor.rowcount > 0
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Request cancellation, returns the job's resulting status or None if unknown"""
+        now = time.time()
+        self._execute(
+            "UPDATE batch_jobs SET status = CASE status WHEN 'queued' THEN 'cancelled' ELSE 'cancelling' END, "
+            "end_time = CASE status WHEN 'queued' THEN ? ELSE end_time END, updated_at = ? "
+            "WHERE job_id = ? AND status IN ('queued', 'processing')",
+            (now, now, job_id)
+        )
+        record = self.get(job_id)
+        return record['status'] if record else None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """The job's record, None if unknown"""
+        row = self._execute("SELECT * FROM batch_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count_queued(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return self._execute("SELECT COUNT(*) FROM batch_jobs WHERE status = 'queued'").fetchone()[0]
+
+    def cleanup(self, retention_seconds: float) -> List[str]:
+        """Remove finished jobs older than retention_seconds, returns their IDs"""
+        cutoff = time.time() - retention_seconds
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id FROM batch_jobs WHERE status IN ('completed', 'failed', 'cancelled') AND end_time < ?",
+                (cutoff,)
+            ).fetchall()
+            job_ids = [row['job_id'] for row in rows]
+            self._conn.executemany("DELETE FROM batch_jobs WHERE job_id = ?", [(job_id,) for job_id in job_ids])
+        return job_ids
+
+class MongoJobQueue:
+    """Durable job queue in the batch_jobs collection, shared by every API replica and worker"""
+
+    def __init__(self, db_manager, lease_seconds: float = None):
+        self.db_manager = db_manager
+        self.lease_seconds = JOB_LEASE_SECONDS if lease_seconds is None else lease_seconds
+        self._collection = None
+
+    @property
+    def collection(self):
+        """The batch_jobs collection; the database is connected and indexed on first use"""
+        if self._collection is None:
+            collection = self.db_manager.db.batch_jobs
+            try:
+                collection.create_index([('status', ASCENDING), ('priority', DESCENDING), ('created_at', ASCENDING)])
+            except Exception as e:
+                print(f"Could not create batch job index: {e}")
+            self._collection = collection
+        return self._collection
+
+    @staticmethod
+    def _record(document: Optional[Dict]) -> Optional[Dict]:
+        if document is None:
+            return None
+        document.pop('_id', None)
+        return document
+
+    def enqueue(self, job_id: str, input_path: str, total: int, priority: int = 1):
+        """Queue a job whose rows are in the CSV file at input_path"""
+        record = new_job_record(job_id, input_path, total, priority)
+        self.collection.insert_one({'_id': job_id, **record})
+
+    def add_completed(self, job_id: str, total: int, results_count: int, priority: int = 1):
+        """Record a job that is already completed, its results already in place (e.g. from the upload cache)"""
+        record = completed_job_record(job_id, total, results_count, priority)
+        self.collection.insert_one({'_id': job_id, **record})
+
+    def claim(self, worker_id: str) -> Optional[Dict]:
+        """
+        Take the next job for worker_id: a queued job (highest priority, oldest
+        first) or a running one whose worker stopped renewing its lease.
+        Returns its record, including the checkpoint to resume from.
+        """
+        now = time.time()
+        # Jobs cancelled while their worker was gone are closed here
+        self.collection.update_many(
+            {'status': 'cancelling', 'lease_until': {'$lt': now}},
+            {'$set': {'status': 'cancelled', 'end_time': now, 'updated_at': now}}
+        )
+        document = self.collection.find_one_and_update(
+            {'$or': [{'status': 'queued'}, {'status': 'processing', 'lease_until': {'$lt': now}}]},
+            [{'$set': {
+                'status': 'processing',
+                'worker_id': worker_id,
+                'lease_until': now + self.lease_seconds,
+                'processed': '$row_offset',
+                'updated_at': now
+            }}],
+            sort=[('priority', DESCENDING), ('created_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        return self._record(document)
+
+    def renew(self, job_id: str, worker_id: str, processed: int) -> Optional[str]:
+        """Extend worker_id's lease and record progress; returns the job's status, None if the lease was lost"""
+        now = time.time()
+        document = self.collection.find_one_and_update(
+            {'_id': job_id, 'worker_id': worker_id, 'status': {'$in': list(ACTIVE_STATUSES)}},
+            {'$set': {'lease_until': now + self.lease_seconds, 'processed': processed, 'updated_at': now}},
+            return_document=ReturnDocument.AFTER
+        )
+        return document['status'] if document else None
+
+    def checkpoint(self, job_id: str, worker_id: str, chunk_id: int, row_offset: int, failed_writes: int):
+        """Record that every row before row_offset (chunks before chunk_id) is scored and saved"""
+        self.collection.update_one(
+            {'_id': job_id, 'worker_id': worker_id, 'row_offset': {'$lte': row_offset}},
+            {'$set': {'chunk_id': chunk_id, 'row_offset': row_offset,
+                      'failed_writes': failed_writes, 'updated_at': time.time()}}
+        )
+
+    def release(self, job_id: str, worker_id: str):
+        """Hand a running job back to the queue, e.g. when its worker shuts down"""
+        now = time.time()
+        self.collection.update_one(
+            {'_id': job_id, 'worker_id': worker_id},
+            [{'$set': {
+                'status': {'$cond': [{'$eq': ['$status', 'cancelling']}, 'cancelled', 'queued']},
+                'end_time': {'$cond': [{'$eq': ['$status', 'cancelling']}, now, '$end_time']},
+                'worker_id': None,
+                'lease_until': None,
+                'updated_at': now
+            }}]
+        )
+
+    def finish(self, job_id: str, worker_id: str, status: str, results_count: int = 0,
+               failed_writes: int = 0, error: str = None, total: int = None) -> bool:
+        """
+        Close a job as completed, cancelled or failed; total corrects the
+        submitted row count. Returns False if worker_id no longer holds the job.
+        """
+        now = time.time()
+        update = {'status': {'$literal': status}, 'results_count': results_count, 'failed_writes': failed_writes,
+                  'error': {'$literal': error}, 'lease_until': None, 'end_time': now, 'updated_at': now}
+        if total is not None:
+            update['total'] = total
+        if status == 'completed':
+            update['processed'] = '$total' if total is None else total
+        result = self.collection.update_one({'_id': job_id, 'worker_id': worker_id}, [{'$set': update}])
+        return result.matched_count > 0
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Request cancellation, returns the job's resulting status or None if unknown"""
+        now = time.time()
+        self.collection.update_one(
+            {'_id': job_id, 'status': 'queued'},
+            {'$set': {'status': 'cancelled', 'end_time': now, 'updated_at': now}}
+        )
+        self.collection.update_one(
+            {'_id': job_id, 'status': 'processing'},
+            {'$set': {'status': 'cancelling', 'updated_at': now}}
+        )
+        record = self.get(job_id)
+        return record['status'] if record else None
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """The job's record, None if unknown"""
+        return self._record(self.collection.find_one({'_id': job_id}))
+
+    def count_queued(self) -> int:
+        """Number of jobs waiting for a worker"""
+        return self.collection.count_documents({'status': 'queued'})
+
+    def cleanup(self, retention_seconds: float) -> List[str]:
+        """Remove finished jobs older than retention_seconds, returns their IDs"""
+        query = {'status': {'$in': list(FINISHED_STATUSES)}, 'end_time': {'$lt': time.time() - retention_seconds}}
+        job_ids = [document['_id'] for document in self.collection.find(query, {'_id': 1})]
+        if job_ids:
+            self.collection.delete_many({'_id': {'$in': job_ids}})
+        return job_ids
+
+def create_job_queue(backend: str = None, db_manager=None):
+    """The durable queue for backend ("sqlite" or "mongo"), None for in-process jobs"""
+    backend = backend or JOB_QUEUE_BACKEND
+    if backend == "sqlite":
+        return SQLiteJobQueue()
+    if backend == "mongo":
+        return MongoJobQueue(db_manager)
+    return None
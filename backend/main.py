@@ -1,25 +1,70 @@
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File, BackgroundTasks
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import pandas as pd
-import numpy as np
+# Imported first so the startup report covers every import below
+from startup_timer import startup_timer
+
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 import io
+import csv
+import gc
 import json
+import hashlib
 import tempfile
 import os
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 import uuid
-from PyPDF2 import PdfReader
+import time
+import shutil
+import socket
+import threading
+from collections import deque
+
+from fastapi import FastAPI, HTTPException, Query, Request, UploadFile, File, BackgroundTasks
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+startup_timer.mark("import fastapi")
+
+import pandas as pd
+import numpy as np
+startup_timer.mark("import pandas/numpy")
 
-from water_quality_model import WaterSafetyPredictor
-from database import db_manager
+# xgboost brings in scikit-learn and scipy; PDF and Excel parsers are imported on first use
+from water_quality_model import WaterSafetyPredictor, decode_levels, HMPI_LEVELS, PLI_LEVELS, CF_LEVELS
+from model_registry import ModelRegistry, MODEL_WATCH_INTERVAL
+from fast_predictor import measure_agreement
+from ml_gate import predict_gated, ml_gate_stats, ML_GATE_MODE, ML_GATE_BAND
+from score_cache import score_cache, cached_scores, limits_fingerprint
+from upload_cache import upload_cache, hash_file, UPLOAD_CACHE_DUPLICATES
+from standards import standards_registry, StandardsRegistry, StandardsProfile, DEFAULT_PROFILE
+startup_timer.mark("import model code")
+
+from database import db_manager, async_db_manager, BulkWriteBuffer, sample_fingerprint, is_valid_sample_id
+startup_timer.mark("import database drivers")
+
+from batch_scoring import compute_block_scores, ProcessBlockScorer
+from micro_batcher import MicroBatcher
+from job_manager import JobManager, JobQueueFullError
+from chunk_scheduler import FairChunkScheduler
+from job_queue import create_job_queue, JOB_QUEUE_BACKEND
+from result_store import ColumnarResultStore, block_rows, block_columns, filter_block
+from columnar_io import read_columns, write_columns, validated_frame, ColumnarFormatError, ColumnarPayloadError
+from response_views import FastJSONResponse, parse_fields, pick_fields, wants, detail_sections
+startup_timer.mark("import batch modules")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the app's connections and background tasks (see startup_event) and stop them on shutdown"""
+    await startup_event()
+    try:
+        yield
+    finally:
+        await shutdown_event()
 
 # Initialize FastAPI app
-app = FastAPI(title="Water Quality Monitoring API", version="1.0.0")
+app = FastAPI(title="Water Quality Monitoring API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -28,30 +73,173 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Model-Version"],
 )
 
+@app.middleware("http")
+async def model_version_header(request: Request, call_next):
+    """Name the model version serving new requests on every response"""
+    response = await call_next(request)
+    current = model_registry.current
+    if current is not None and current.model_version and "X-Model-Version" not in response.headers:
+        response.headers["X-Model-Version"] = str(current.model_version)
+    return response
+
 # Global variables for batch processing
-batch_jobs = {}
-MAX_WORKERS = 4  # Limit concurrent workers
-CHUNK_SIZE = 100  # Process 100 samples at a time
-
-# Thread pool for CPU-intensive tasks
-thread_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS)
-
-# Load the trained model
-try:
-    predictor = WaterSafetyPredictor.load_model('water_quality_model.pkl')
-    print("Model loaded successfully")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    # Train a new model if loading fails
-    predictor = WaterSafetyPredictor()
-    geo_dataset, y = predictor.generate_sample_data()
-    X = geo_dataset[predictor.hmpi_metals]
-    accuracy = predictor.train_model(X, y)
-    predictor.save_model('water_quality_model.pkl')
+MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "4"))  # Limit concurrent workers
+CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "100"))  # Starting chunk size, adapted to the measured cost per row
+MIN_CHUNK_SIZE = int(os.getenv("BATCH_MIN_CHUNK_SIZE", "50"))
+MAX_CHUNK_SIZE = int(os.getenv("BATCH_MAX_CHUNK_SIZE", "5000"))
+TARGET_CHUNK_SECONDS = float(os.getenv("BATCH_TARGET_CHUNK_SECONDS", "0.5"))
+MODEL_PATH = 'water_quality_model.pkl'  # Legacy pickle, converted to an artifact on first load
+MODEL_ARTIFACT_DIR = os.getenv("MODEL_ARTIFACT_DIR", "model_artifacts")
+
+# Batch execution mode: "thread" scores chunks in the thread pool, "process" hands the
+# numeric work to worker processes through shared memory
+BATCH_EXECUTION_MODE = os.getenv("BATCH_EXECUTION_MODE", "thread")
+PROCESS_WORKERS = int(os.getenv("BATCH_PROCESS_WORKERS", str(os.cpu_count() or MAX_WORKERS)))
+BATCH_CONCURRENCY = PROCESS_WORKERS if BATCH_EXECUTION_MODE == "process" else MAX_WORKERS
+
+# Thread pool for CPU-intensive tasks of requests (small uploads, standards, cached replays)
+thread_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY)
+
+# Chunks of all running jobs share their own pool's workers fairly, weighted by job priority;
+# the scheduler counts its slots, so nothing else is submitted to chunk_pool
+chunk_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch-chunk")
+chunk_scheduler = FairChunkScheduler(
+    chunk_pool,
+    BATCH_CONCURRENCY,
+    initial_chunk_size=CHUNK_SIZE,
+    min_chunk_size=MIN_CHUNK_SIZE,
+    max_chunk_size=MAX_CHUNK_SIZE,
+    target_chunk_seconds=TARGET_CHUNK_SECONDS
+)
+
+# Batch job tracking: concurrent job cap with queueing, retention by age and retained rows
+job_manager = JobManager(
+    max_concurrent_jobs=int(os.getenv("MAX_CONCURRENT_JOBS", "8")),
+    max_queued_jobs=int(os.getenv("MAX_QUEUED_JOBS", "20")),
+    retention_seconds=float(os.getenv("JOB_RETENTION_SECONDS", "3600")),
+    max_retained_rows=int(os.getenv("JOB_RETENTION_MAX_ROWS", "200000"))
+)
+
+# Durable batch jobs (JOB_QUEUE_BACKEND=sqlite or mongo): inputs and results are kept under
+# JOB_DATA_DIR so any worker can run a job and resume it from its last checkpoint
+job_queue = create_job_queue(db_manager=db_manager)
+JOB_DATA_DIR = os.getenv("JOB_DATA_DIR", "batch_jobs")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_QUEUE_EMBEDDED_WORKER = os.getenv("JOB_QUEUE_EMBEDDED_WORKER", "1") == "1"
+
+# Coalescing window for concurrent /analyze-sample requests
+ANALYZE_BATCH_WINDOW_MS = float(os.getenv("ANALYZE_BATCH_WINDOW_MS", "5"))
+ANALYZE_MAX_BATCH_SIZE = int(os.getenv("ANALYZE_MAX_BATCH_SIZE", "64"))
+
+# Largest batch /batch-analyze-columnar scores in one request
+COLUMNAR_MAX_ROWS = int(os.getenv("COLUMNAR_MAX_ROWS", "100000"))
+
+# Default ML prediction mode of /analyze-sample and /batch-analyze, overridable per request:
+# "full" runs the XGBoost model, "fast" the model's trees compiled into a NumPy evaluator
+PREDICTION_MODE = os.getenv("PREDICTION_MODE", "full")
+
+# Server-sent progress events: minimum seconds between events and keep-alive interval
+PROGRESS_EVENT_INTERVAL = float(os.getenv("PROGRESS_EVENT_INTERVAL", "0.5"))
+PROGRESS_HEARTBEAT_INTERVAL = float(os.getenv("PROGRESS_HEARTBEAT_INTERVAL", "15"))
+
+# Model state reported by /ready: loading, training, ready or failed
+model_state = {'status': 'loading', 'source': None, 'model_version': None, 'load_seconds': None, 'error': None}
+model_ready = threading.Event()
+
+def save_model_artifact(model: WaterSafetyPredictor):
+    """Write the model as a new artifact version, keeping going if the directory is not writable"""
+    try:
+        model.model_version = model.save_artifact(MODEL_ARTIFACT_DIR)
+    except Exception as e:
+        print(f"Could not save model artifact: {e}")
+
+def load_predictor() -> Optional[WaterSafetyPredictor]:
+    """Load the model artifact, converting the legacy pickle when there is none yet; None if neither loads"""
+    started = time.perf_counter()
+    try:
+        loaded = WaterSafetyPredictor.load_artifact(MODEL_ARTIFACT_DIR)
+        source = 'artifact'
+    except Exception as e:
+        print(f"No usable model artifact in {MODEL_ARTIFACT_DIR}: {e}")
+        loaded = WaterSafetyPredictor.load_model(MODEL_PATH) if os.path.exists(MODEL_PATH) else None
+        if loaded is None or loaded.model is None:
+            return None
+        source = 'pickle'
+        save_model_artifact(loaded)
+    
+    model_state.update(status='ready', source=source, model_version=loaded.model_version,
+                       load_seconds=round(time.perf_counter() - started, 4))
+    model_ready.set()
+    print(f"Model {loaded.model_version} loaded from {source} in {model_state['load_seconds']}s")
+    return loaded
+
+def train_fallback_model():
+    """Train a new model when none could be loaded, then swap it in"""
+    started = time.perf_counter()
+    try:
+        trained = WaterSafetyPredictor()
+        geo_dataset, y = trained.generate_sample_data()
+        X = geo_dataset[trained.hmpi_metals]
+        accuracy = trained.train_model(X, y)
+    except Exception as e:
+        print(f"Error training model: {e}")
+        model_state.update(status='failed', error=str(e))
+        return
+    save_model_artifact(trained)
+    
+    model_registry.publish(trained)
+    score_cache.clear()
+    model_state.update(status='ready', source='trained', model_version=trained.model_version,
+                       load_seconds=round(time.perf_counter() - started, 4))
+    model_ready.set()
     print(f"New model trained with accuracy: {accuracy:.2f}")
 
+def ensure_model():
+    """Start training a fallback model in the background unless one is loaded or training"""
+    if model_ready.is_set() or model_state['status'] == 'training':
+        return
+    model_state['status'] = 'training'
+    threading.Thread(target=train_fallback_model, name="model-training", daemon=True).start()
+
+def refresh_model() -> bool:
+    """Swap in a newer model artifact if one was published, True if the model changed"""
+    if not model_registry.refresh():
+        return False
+    score_cache.clear()
+    model_state.update(status='ready', source='artifact', model_version=model_registry.current.model_version, error=None)
+    model_ready.set()
+    return True
+
+async def watch_model_artifacts():
+    """Pick up model versions written by training runs every MODEL_WATCH_INTERVAL seconds"""
+    loop = asyncio.get_event_loop()
+    while True:
+        await asyncio.sleep(MODEL_WATCH_INTERVAL)
+        try:
+            await loop.run_in_executor(None, refresh_model)
+        except Exception as e:
+            print(f"Error checking for a new model: {e}")
+
+# Load the trained model at import: a preloading server (gunicorn --preload) then loads it
+# once and forked workers share its pages copy-on-write. Without a model the API starts
+# anyway and ensure_model trains one in the background of each worker.
+# Requests take model_registry.current once per batch; jobs pin their version for their lifetime.
+model_registry = ModelRegistry(MODEL_ARTIFACT_DIR)
+model_registry.publish(load_predictor() or WaterSafetyPredictor())
+startup_timer.mark("load model")
+
+def require_model():
+    """Reject requests that need ML predictions until the model is ready"""
+    if not model_ready.is_set():
+        raise HTTPException(
+            status_code=503,
+            detail=f"Model is not ready yet ({model_state['status']})",
+            headers={"Retry-After": "5"}
+        )
+
 # Pydantic models
 class SampleData(BaseModel):
     location_name: Optional[str] = "Unknown"
@@ -67,6 +255,7 @@ class SampleData(BaseModel):
     zinc: Optional[float] = 0.0
     iron: Optional[float] = 0.0
     manganese: Optional[float] = 0.0
+    sample_date: Optional[str] = None
     unit_input: Optional[str] = "Auto-detect"
 
 class AnalysisResponse(BaseModel):
@@ -76,9 +265,14 @@ class AnalysisResponse(BaseModel):
     ml_prediction: Dict[str, Any]
     recommendations: Dict[str, Any]
     unit_detected: str
+    model_version: Optional[str] = None
 
 class BatchProcessRequest(BaseModel):
     samples: List[SampleData]
+    priority: Optional[int] = 1
+
+class StandardsEvaluationRequest(BaseModel):
+    samples: List[SampleData]
 
 class DeleteRequest(BaseModel):
     delete_option: str
@@ -92,6 +286,8 @@ class FileUploadResponse(BaseModel):
     processed_samples: int
     results: List[Dict]
     available_metals: List[str]
+    model_version: Optional[str] = None
+    cached: bool = False
 
 class BatchJobResponse(BaseModel):
     job_id: str
@@ -102,6 +298,27 @@ class BatchJobResponse(BaseModel):
     processed_samples: int
     results: Optional[List[Dict]] = None
 
+def resolve_metal_columns(df: pd.DataFrame) -> Dict[str, str]:
+    """Work out which column holds each HMPI metal, returns {metal: column}"""
+    # Check which HMPI metals are available in the dataset
+    hmpi_metals = model_registry.current.hmpi_metals
+    metal_columns = {metal: metal for metal in hmpi_metals if metal in df.columns}
+    if metal_columns:
+        return metal_columns
+    
+    # Try to find columns that might match our metals
+    for metal in hmpi_metals:
+        for col in df.columns:
+            if metal.lower() in str(col).lower():
+                metal_columns[metal] = col
+                break
+    if metal_columns:
+        return metal_columns
+    
+    # Try to use the first few numeric columns
+    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    return dict(zip(hmpi_metals, numeric_cols))
+
 # Improved helper function to process uploaded files
 def process_uploaded_file(file: UploadFile):
     """Process uploaded CSV, Excel, or PDF file"""
@@ -115,6 +332,7 @@ def process_uploaded_file(file: UploadFile):
         elif file_ext == 'pdf':
             # For PDFs, extract text and try to find tabular data
             pdf_text = ""
+            from PyPDF2 import PdfReader
             pdf_reader = PdfReader(file.file)
             for page in pdf_reader.pages:
                 pdf_text += page.extract_text()
@@ -134,41 +352,18 @@ def process_uploaded_file(file: UploadFile):
                             continue
             
             if data:
-                df = pd.DataFrame(data, columns=predictor.hmpi_metals[:7])
+                df = pd.DataFrame(data, columns=model_registry.current.hmpi_metals[:7])
             else:
                 raise ValueError("Could not extract tabular data from PDF")
         else:
             raise ValueError("Unsupported file format")
         
-        # Check which HMPI metals are available in the dataset
-        available_metals = [metal for metal in predictor.hmpi_metals if metal in df.columns]
-        
-        if not available_metals:
-            # Try to find columns that might match our metals
-            column_mapping = {}
-            for metal in predictor.hmpi_metals:
-                for col in df.columns:
-                    if metal.lower() in col.lower():
-                        column_mapping[metal] = col
-                        break
-            
-            if column_mapping:
-                df = df.rename(columns={v: k for k, v in column_mapping.items()})
-                available_metals = list(column_mapping.keys())
-            else:
-                # Try to use the first few numeric columns
-                numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
-                if len(numeric_cols) >= len(predictor.hmpi_metals):
-                    for i, metal in enumerate(predictor.hmpi_metals):
-                        if i < len(numeric_cols):
-                            df[metal] = df[numeric_cols[i]]
-                    available_metals = predictor.hmpi_metals[:len(numeric_cols)]
-                else:
-                    # Use available numeric columns
-                    available_metals = predictor.hmpi_metals[:len(numeric_cols)]
-                    for i, metal in enumerate(available_metals):
-                        if i < len(numeric_cols):
-                            df[metal] = df[numeric_cols[i]]
+        # Map HMPI metals onto the dataset columns
+        metal_columns = resolve_metal_columns(df)
+        for metal, col in metal_columns.items():
+            if col != metal:
+                df[metal] = df[col]
+        available_metals = list(metal_columns.keys())
         
         # Fill NaN values with 0 for calculation
         df = df.fillna(0)
@@ -178,6 +373,88 @@ def process_uploaded_file(file: UploadFile):
     except Exception as e:
         raise ValueError(f"Error processing file: {str(e)}")
 
+def spool_upload(file: UploadFile, block_size: int = 1024 * 1024, path: str = None) -> Tuple[str, int, str]:
+    """
+    Copy an upload to path (a temporary file by default) block by block,
+    returning its path, data row count and SHA-256 content hash
+    """
+    line_count = 0
+    last_block = b''
+    hasher = hashlib.sha256()
+    with (open(path, 'wb') if path else tempfile.NamedTemporaryFile(delete=False, suffix='.csv')) as spool:
+        while True:
+            block = file.file.read(block_size)
+            if not block:
+                break
+            spool.write(block)
+            hasher.update(block)
+            line_count += block.count(b'\n')
+            last_block = block
+    
+    if last_block and not last_block.endswith(b'\n'):
+        line_count += 1
+    rows = max(line_count - 1, 0)  # Minus the header line
+    return spool.name, rows, hasher.hexdigest()
+
+def read_csv_chunks(path: str, skip_rows: int = 0):
+    """
+    Stream a CSV in chunks, loading only the resolved metal and geo columns.
+    Columns are resolved from the first rows; returns (available_metals, reader,
+    next_chunk) where next_chunk(size) reads the next size rows or returns None
+    at the end of the file. Close the reader when done. Reading starts after
+    the first skip_rows data rows.
+    """
+    head = pd.read_csv(path, nrows=1000)
+    metal_columns = resolve_metal_columns(head)
+    geo_columns = [col for col in GEO_COLUMNS if col in head.columns]
+    
+    # Only the metal and geo columns are read, everything else is skipped
+    usecols = list(dict.fromkeys(list(metal_columns.values()) + geo_columns))
+    # Numeric columns are converted chunk by chunk: a value like "BDL" becomes NaN instead of failing the read
+    numeric_columns = list(dict.fromkeys(
+        list(metal_columns.values()) + [col for col in geo_columns if col.lower() in ['latitude', 'longitude']]
+    ))
+    reader = pd.read_csv(path, usecols=usecols, iterator=True,
+                         skiprows=range(1, skip_rows + 1) if skip_rows else None)
+    
+    def next_chunk(size: int) -> Optional[pd.DataFrame]:
+        try:
+            chunk = reader.get_chunk(size)
+        except StopIteration:
+            return None
+        for col in numeric_columns:
+            if chunk[col].dtype != 'float64':
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype('float64')
+        for metal, col in metal_columns.items():
+            if col != metal:
+                chunk[metal] = chunk[col]
+        # Fill NaN values with 0 for calculation
+        return chunk.fillna(0)
+    
+    return list(metal_columns.keys()), reader, next_chunk
+
+def frame_chunks(df: pd.DataFrame):
+    """next_chunk(size) over the rows of an in-memory DataFrame"""
+    position = 0
+    
+    def next_chunk(size: int) -> Optional[pd.DataFrame]:
+        nonlocal position
+        if position >= len(df):
+            return None
+        chunk = df[position:position + size]
+        position += size
+        return chunk
+    
+    return next_chunk
+
+# Metals considered when auto-detecting the unit of an uploaded sample
+UNIT_CHECK_METALS = ['arsenic', 'lead', 'cadmium', 'chromium', 'mercury', 'nickel', 'copper', 'zinc', 'iron', 'manganese']
+
+# Columns carried through from uploaded rows into stored samples
+GEO_COLUMNS = ['latitude', 'longitude', 'Latitude', 'Longitude', 'location', 'Location', 'location_name', 'Location_Name',
+               'sample_date', 'Sample_Date', 'date', 'Date']
+LOCATION_COLUMNS = ['location_name', 'Location', 'location', 'Location_Name']
+
 # Improved unit detection function
 def auto_detect_unit(sample_data: Dict) -> str:
     """
@@ -185,9 +462,8 @@ def auto_detect_unit(sample_data: Dict) -> str:
     Improved detection logic
     """
     metal_values = []
-    metals_to_check = ['arsenic', 'lead', 'cadmium', 'chromium', 'mercury', 'nickel', 'copper', 'zinc', 'iron', 'manganese']
     
-    for metal in metals_to_check:
+    for metal in UNIT_CHECK_METALS:
         if (metal in sample_data and 
             sample_data[metal] is not None and 
             not pd.isna(sample_data[metal])):
@@ -208,6 +484,15 @@ def auto_detect_unit(sample_data: Dict) -> str:
     else:
         return "µg/L"
 
+def auto_detect_unit_batch(metal_df: pd.DataFrame) -> np.ndarray:
+    """Vectorized auto_detect_unit for every row of a DataFrame (NaN = not measured)"""
+    metals_present = [metal for metal in UNIT_CHECK_METALS if metal in metal_df.columns]
+    if not metals_present:
+        return np.full(len(metal_df), "µg/L", dtype=object)
+    
+    matrix = metal_df[metals_present].to_numpy(dtype=float)
+    return model_registry.current.detect_unit_batch(matrix, positive_only=False)
+
 # Fixed generate_recommendations function (removed self parameter)
 def generate_recommendations(analysis_results):
     """Generate specific recommendations based on analysis results"""
@@ -245,183 +530,890 @@ def generate_recommendations(analysis_results):
     
     return recommendations
 
+def score_sample_block(df: pd.DataFrame, available_metals: List[str], row_ids: List[int],
+                       writer: Optional[BulkWriteBuffer] = None,
+                       block_scorer: Optional[ProcessBlockScorer] = None,
+                       model: Optional[WaterSafetyPredictor] = None, source: Optional[str] = None) -> Dict:
+    """
+    Score a block of uploaded rows with the batch index engine and save them to the database.
+    With a writer the rows are queued on its write-behind buffer, otherwise the
+    block is upserted with insert_samples_bulk's bulk writes and rows that failed to save are dropped.
+    With a block_scorer the numeric work runs in its worker processes.
+    model defaults to the current one; stored samples record its version.
+    source identifies where the rows come from (see save_block_samples).
+    Returns a columnar result block (see result_store) rather than per-row dicts.
+    """
+    model = model or model_registry.current
+    
+    # Metal columns as floats, unreadable or missing values count as 0.0
+    metal_df = pd.DataFrame(index=df.index)
+    for metal in available_metals:
+        if metal in df.columns:
+            metal_df[metal] = pd.to_numeric(df[metal], errors='coerce').fillna(0.0).astype(float)
+        else:
+            metal_df[metal] = 0.0
+    
+    # Auto-detect unit, comprehensive indices and ML prediction for the whole block
+    # Rows scored recently come from the score cache, only the others are computed
+    matrix = metal_df.to_numpy(dtype=float)
+    
+    def compute(rows):
+        rows_matrix = matrix if len(rows) == len(matrix) else matrix[rows]
+        if block_scorer is not None:
+            computed = block_scorer.score(rows_matrix, available_metals, model.model_version)
+        else:
+            computed = compute_block_scores(model, rows_matrix, available_metals, UNIT_CHECK_METALS)
+        if computed['ml_gate'] is not None:
+            ml_gate_stats.record(computed['ml_gate'])
+        return computed
+    
+    scores = cached_scores(score_cache, score_cache_namespace('block', model, tuple(available_metals)), matrix, compute)
+    
+    block = {
+        'row_id': np.asarray(row_ids, dtype=np.int64),
+        'sample_id': np.full(len(row_ids), None, dtype=object),
+        'hmpi_score': scores['hmpi_score'],
+        'pli_score': scores['pli_score'],
+        'hmpi_level_code': scores['hmpi_level_code'],
+        'pli_level_code': scores['pli_level_code'],
+        'unit_is_mgL': scores['unit_is_mgL'],
+        'ml_code': scores['ml_code'],
+        'metal_values': matrix,
+        'cf_value': scores['cf_value'],
+        'cf_level_code': scores['cf_level_code'],
+        'geo': {col: df[col].to_numpy() for col in GEO_COLUMNS if col in df.columns}
+    }
+    return save_block_samples(block, available_metals, model.model_version, writer, source)
+
+def save_block_samples(block: Dict, available_metals: List[str], model_version: str,
+                       writer: Optional[BulkWriteBuffer] = None, source: Optional[str] = None) -> Dict:
+    """
+    Save the rows of a scored result block to the database as samples of model_version,
+    upserted on their fingerprints. source identifies where the rows come from
+    (an upload's content hash, a request payload's hash or a job ID), so rows
+    without a sampling time are told apart by source and row_id. With a writer
+    the rows are queued on its write-behind buffer, otherwise the block is
+    upserted with insert_samples_bulk's bulk writes and rows that failed to save are dropped.
+    Returns the block with the sample IDs filled in.
+    """
+    row_ids = block['row_id'].tolist()
+    detected_units = np.where(block['unit_is_mgL'], "mg/L", "µg/L").tolist()
+    hmpi_scores = block['hmpi_score'].tolist()
+    pli_scores = block['pli_score'].tolist()
+    hmpi_levels = decode_levels(np.asarray(block['hmpi_level_code']), HMPI_LEVELS)[0].tolist()
+    
+    metal_records = [dict(zip(available_metals, values)) for values in block['metal_values'].tolist()]
+    geo_values = {col: values.tolist() for col, values in block['geo'].items()}
+    
+    sample_ids = np.full(len(row_ids), None, dtype=object)
+    keep = np.zeros(len(row_ids), dtype=bool)
+    db_samples = []
+    for i, row_id in enumerate(row_ids):
+        try:
+            # Preserve geographical and location data
+            sample_data = metal_records[i]
+            for geo_col, values in geo_values.items():
+                if not pd.isna(values[i]):
+                    sample_data[geo_col] = values[i]
+            
+            if not sample_data:
+                continue
+            
+            # Prepare data for database
+            db_sample = {
+                **sample_data,
+                'hmpi_score': hmpi_scores[i],
+                'pli_score': pli_scores[i],
+                'pollution_level': hmpi_levels[i],
+                'unit_detected': detected_units[i],
+                'model_version': model_version,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+            
+            # Add location name if available
+            for loc_col in LOCATION_COLUMNS:
+                if loc_col in sample_data:
+                    db_sample['location_name'] = sample_data[loc_col]
+                    break
+            else:
+                db_sample['location_name'] = f"Batch Sample {row_id}"
+            
+            # Saving the same row again updates its sample instead of adding a duplicate
+            db_sample['fingerprint'] = sample_fingerprint(
+                db_sample, available_metals, f"{source}:{row_id}" if source is not None else None
+            )
+            
+            # Save to database (queued on the write-behind buffer or bulk written below)
+            if writer is not None:
+                sample_ids[i] = writer.add(db_sample, row_id)
+            db_samples.append((i, row_id, db_sample))
+            keep[i] = True
+            
+        except Exception as e:
+            print(f"Error processing row {row_id}: {e}")
+            continue
+    
+    if writer is None and db_samples:
+        outcome = db_manager.insert_samples_bulk(
+            [db_sample for _, _, db_sample in db_samples], row_ids=[row_id for _, row_id, _ in db_samples]
+        )
+        for row_id, error in outcome['errors'].items():
+            print(f"Error saving row {row_id}: {error}")
+        
+        for i, row_id, _ in db_samples:
+            if row_id in outcome['inserted_ids']:
+                sample_ids[i] = outcome['inserted_ids'][row_id]
+            else:
+                keep[i] = False
+    
+    block = {**block, 'sample_id': sample_ids}
+    return filter_block(block, keep) if not keep.all() else block
+
+# Worker processes for the "process" execution mode, each loads the model once
+block_scorer = ProcessBlockScorer(MODEL_ARTIFACT_DIR, PROCESS_WORKERS, UNIT_CHECK_METALS) if BATCH_EXECUTION_MODE == "process" else None
+
 # Optimized batch processing function
-def process_sample_chunk(chunk_data, chunk_id, job_id):
-    """Process a chunk of samples in a separate thread"""
+def process_sample_chunk(chunk_df, chunk_id, row_offset, job_id, available_metals, writer=None, store=None, model=None,
+                         source=None):
+    """
+    Process a chunk of samples in a separate thread with the job's model, adding its result block to the job's store.
+    Returns the rows kept, or None when the job was cancelled before the chunk started; errors are raised.
+    """
     try:
-        results = []
-        for idx, row in enumerate(chunk_data):
-            try:
-                # Update progress
-                batch_jobs[job_id]['processed'] += 1
-                progress = (batch_jobs[job_id]['processed'] / batch_jobs[job_id]['total']) * 100
-                batch_jobs[job_id]['progress'] = progress
-                
-                # Extract available metals for calculation
-                sample_data = {}
-                available_metals = batch_jobs[job_id]['available_metals']
-                
-                for metal in available_metals:
-                    if metal in row and not pd.isna(row[metal]):
-                        sample_data[metal] = float(row[metal])
-                    else:
-                        sample_data[metal] = 0.0
-                
-                # Preserve geographical and location data
-                geo_columns = ['latitude', 'longitude', 'Latitude', 'Longitude', 'location', 'Location', 'location_name', 'Location_Name']
-                for geo_col in geo_columns:
-                    if geo_col in row and not pd.isna(row[geo_col]):
-                        sample_data[geo_col] = row[geo_col]
-                
-                if not sample_data:
-                    continue
-                
-                # Auto-detect unit for each sample
-                detected_unit = auto_detect_unit(sample_data)
-                
-                # Calculate comprehensive indices
-                comprehensive_results = predictor.calculate_comprehensive_indices(sample_data)
-                comprehensive_results['unit_detected'] = detected_unit
-                
-                # ML Prediction
-                ml_input = []
-                for metal in predictor.hmpi_metals:
-                    ml_input.append(sample_data.get(metal, 0.0))
-                
-                ml_prediction, probabilities = predictor.predict_pollution(ml_input)
-                
-                # Prepare data for database
-                db_sample = {
-                    **sample_data,
-                    'hmpi_score': comprehensive_results['hmpi']['score'],
-                    'pli_score': comprehensive_results['pli']['score'],
-                    'pollution_level': comprehensive_results['hmpi']['level'],
-                    'unit_detected': detected_unit,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                
-                # Add location name if available
-                location_cols = ['location_name', 'Location', 'location', 'Location_Name']
-                for loc_col in location_cols:
-                    if loc_col in row and not pd.isna(row[loc_col]):
-                        db_sample['location_name'] = row[loc_col]
-                        break
-                else:
-                    db_sample['location_name'] = f"Batch Sample {chunk_id * len(chunk_data) + idx + 1}"
-                
-                # Save to database (consider bulk insert optimization)
-                sample_id = db_manager.insert_sample(db_sample)
-                
-                result_row = {
-                    'sample_id': sample_id,
-                    'row_id': chunk_id * len(chunk_data) + idx + 1,
-                    'hmpi_score': comprehensive_results['hmpi']['score'],
-                    'pli_score': comprehensive_results['pli']['score'],
-                    'pollution_level': comprehensive_results['hmpi']['level'],
-                    'pli_level': comprehensive_results['pli']['level'],
-                    'recommendation': comprehensive_results['hmpi']['recommendation'],
-                    'unit_detected': detected_unit,
-                    'ml_prediction': ml_prediction,
-                    **sample_data
-                }
-                
-                # Add contamination factors
-                for metal, cf_data in comprehensive_results['contamination_factors'].items():
-                    result_row[f'{metal}_cf'] = cf_data['cf_value']
-                    result_row[f'{metal}_cf_level'] = cf_data['level']
-                
-                results.append(result_row)
-                
-            except Exception as e:
-                print(f"Error processing row {chunk_id * len(chunk_data) + idx + 1}: {e}")
-                continue
+        if job_manager.is_cancelled(job_id):
+            return None
+        
+        row_ids = [row_offset + idx + 1 for idx in range(len(chunk_df))]
+        block = score_sample_block(chunk_df, available_metals, row_ids, writer, block_scorer, model, source)
+        store.add_block(chunk_id, block)
+        
+        # Update progress once per chunk
+        job_manager.add_progress(job_id, len(chunk_df))
         
-        return results
+        return len(block['row_id'])
         
     except Exception as e:
         print(f"Error processing chunk {chunk_id}: {e}")
-        return []
+        raise
 
-async def process_large_batch_async(job_id: str, df: pd.DataFrame, available_metals: List[str]):
-    """Process large batch asynchronously in chunks"""
-    try:
-        # Split dataframe into chunks
-        chunks = [df[i:i + CHUNK_SIZE] for i in range(0, len(df), CHUNK_SIZE)]
-        
-        # Initialize job tracking
-        batch_jobs[job_id] = {
-            'status': 'processing',
-            'progress': 0.0,
-            'total': len(df),
-            'processed': 0,
-            'results': [],
-            'available_metals': available_metals,
-            'start_time': datetime.utcnow()
-        }
+def score_cache_namespace(kind: str, model: WaterSafetyPredictor, *settings) -> tuple:
+    """Score cache namespace: what scored the rows, with which model, standard limits and settings"""
+    return (kind, model.model_version, limits_fingerprint(model), ML_GATE_MODE, ML_GATE_BAND) + settings
+
+def score_analysis_rows(model: WaterSafetyPredictor, raw: np.ndarray, mode: str) -> Dict[str, np.ndarray]:
+    """Index arrays plus ML codes and probabilities for a metal matrix in hmpi_metals order (NaN = not measured)"""
+    scores = model.calculate_index_arrays(raw)
+    ml_matrix = np.where(np.isnan(raw), 0.0, raw)
+    if ML_GATE_MODE == "on":
+        ml_labels, ml_probabilities, gated, gate_summary = predict_gated(
+            model, ml_matrix, scores['hmpi_score'], scores['hmpi_level_code'], fast=mode == "fast"
+        )
+        ml_gate_stats.record(gate_summary)
+    else:
+        ml_labels, ml_probabilities = model.predict_pollution_batch(ml_matrix, fast=mode == "fast")
+        gated = np.zeros(len(raw), dtype=bool)
+    scores['ml_code'] = pd.Categorical(ml_labels, categories=model.get_class_labels()).codes.astype(np.int16)
+    scores['ml_probabilities'] = np.asarray(ml_probabilities, dtype=float)
+    scores['ml_gated'] = gated
+    return scores
+
+def score_analysis_batch(items: List[tuple]) -> List[tuple]:
+    """
+    Score coalesced /analyze-sample requests, (sample_data, unit_input, mode,
+    sections) items, in one vectorized pass per mode with one model version.
+    sections names the per-metal sections of the analysis results to build
+    (None for all of them). Samples scored recently are served from the score cache.
+    """
+    model = model_registry.current
+    samples_data = [sample_data for sample_data, _, _, _ in items]
+    samples_df = pd.DataFrame(samples_data)
+    
+    # Auto-detect unit if requested
+    auto_units = auto_detect_unit_batch(samples_df.reindex(columns=UNIT_CHECK_METALS).astype(float)).tolist()
+    
+    # Comprehensive indices and ML prediction, one pass per requested mode
+    raw = model.to_metal_matrix(samples_df)
+    class_labels = np.array(model.get_class_labels(), dtype=object)
+    has_classes = hasattr(model.label_encoder, 'classes_')
+    modes = np.array([mode for _, _, mode, _ in items], dtype=object)
+    
+    scored = [None] * len(items)
+    for mode in set(modes.tolist()):
+        rows = np.flatnonzero(modes == mode)
+        mode_raw = raw[rows]
+        scores = cached_scores(
+            score_cache, score_cache_namespace('analysis', model, mode), mode_raw,
+            lambda missing: score_analysis_rows(model, mode_raw[missing], mode)
+        )
+        analysis_results = model.comprehensive_indices_records(
+            model.decode_index_arrays(scores), sections=[items[i][3] for i in rows]
+        )
+        ml_labels = class_labels[scores['ml_code']]
+        ml_confidences = model.probabilities_to_dicts(scores['ml_probabilities'])
         
-        # Process chunks in parallel using thread pool
+        for j, i in enumerate(rows):
+            unit_input = items[i][1]
+            detected_unit = auto_units[i] if unit_input == "Auto-detect" else unit_input
+            ml_result = {
+                'prediction': ml_labels[j],
+                'confidence': ml_confidences[j],
+                'mode': "gated" if scores['ml_gated'][j] else mode
+            } if has_classes else {'prediction': 'N/A', 'confidence': {}}
+            scored[i] = (analysis_results[j], ml_result, detected_unit, model.model_version)
+    
+    return scored
+
+def score_standards(model: WaterSafetyPredictor, raw: np.ndarray, profiles: List[StandardsProfile]) -> Dict[str, np.ndarray]:
+    """
+    calculate_standards_arrays of a metal matrix in hmpi_metals order against
+    standards profiles, all of them in one pass. Rows scored recently against
+    the same profiles are served from the score cache.
+    """
+    limits = StandardsRegistry.limits_matrix(profiles, model.hmpi_metals)
+    namespace = ('standards', tuple(model.hmpi_metals), StandardsRegistry.fingerprint(profiles))
+    return cached_scores(
+        score_cache, namespace, raw,
+        lambda rows: model.calculate_standards_arrays(raw[rows], limits, contributions=False)
+    )
+
+def standards_records(scores: Dict[str, np.ndarray], profiles: List[StandardsProfile], metals: List[str]) -> List[Dict]:
+    """Per-sample dicts of score_standards output: each standard's indices, levels and the metals above its limits"""
+    hmpi_scores = scores['hmpi_score'].tolist()
+    pli_scores = scores['pli_score'].tolist()
+    total_cf_scores = scores['total_cf_score'].tolist()
+    cf_values = scores['cf_value'].tolist()
+    hmpi_levels = decode_levels(scores['hmpi_level_code'], HMPI_LEVELS)[0].tolist()
+    pli_levels = decode_levels(scores['pli_level_code'], PLI_LEVELS)[0].tolist()
+    total_cf_levels = decode_levels(scores['total_cf_level_code'], CF_LEVELS)[0].tolist()
+    cf_levels = decode_levels(scores['cf_level_code'], CF_LEVELS)[0].tolist()
+    units = np.where(scores['unit_is_mgL'], "mg/L", "µg/L").tolist()
+    
+    # Metals each standard sets a limit for
+    limited = [[j for j, metal in enumerate(metals) if metal in profile.limits_ugL] for profile in profiles]
+    
+    records = []
+    for i, unit in enumerate(units):
+        evaluations = {}
+        for p, profile in enumerate(profiles):
+            evaluations[profile.name] = {
+                'version': profile.version,
+                'hmpi': {'score': hmpi_scores[i][p], 'level': hmpi_levels[i][p]},
+                'pli': {'score': pli_scores[i][p], 'level': pli_levels[i][p]},
+                'total_cf': {'score': total_cf_scores[i][p], 'level': total_cf_levels[i][p]},
+                'compliance_status': "Compliant" if hmpi_levels[i][p] == "Safe" else "Non-Compliant",
+                'exceeded_metals': [metals[j] for j in limited[p] if cf_values[i][p][j] > 1.0],
+                'contamination_factors': {
+                    metals[j]: {'cf_value': cf_values[i][p][j], 'level': cf_levels[i][p][j]}
+                    for j in limited[p]
+                }
+            }
+        records.append({'unit_detected': unit, 'standards': evaluations})
+    return records
+
+def standards_columns(scores: Dict[str, np.ndarray], profiles: List[StandardsProfile]) -> Dict[str, np.ndarray]:
+    """Result columns of score_standards output, one set per standard prefixed with its name"""
+    hmpi_levels = decode_levels(scores['hmpi_level_code'], HMPI_LEVELS)[0]
+    pli_levels = decode_levels(scores['pli_level_code'], PLI_LEVELS)[0]
+    columns = {}
+    for p, profile in enumerate(profiles):
+        columns[f'{profile.name}_hmpi_score'] = scores['hmpi_score'][:, p]
+        columns[f'{profile.name}_pollution_level'] = hmpi_levels[:, p]
+        columns[f'{profile.name}_pli_score'] = scores['pli_score'][:, p]
+        columns[f'{profile.name}_pli_level'] = pli_levels[:, p]
+        columns[f'{profile.name}_total_cf_score'] = scores['total_cf_score'][:, p]
+    return columns
+
+analyze_batcher = MicroBatcher(
+    score_analysis_batch,
+    window_ms=ANALYZE_BATCH_WINDOW_MS,
+    max_batch_size=ANALYZE_MAX_BATCH_SIZE
+)
+
+async def score_job_chunks(job_id: str, next_chunk, available_metals: List[str], store: ColumnarResultStore,
+                           writer: BulkWriteBuffer, model: WaterSafetyPredictor, start_chunk: int = 0,
+                           start_row: int = 0, on_checkpoint=None, source: Optional[str] = None) -> Dict:
+    """
+    Score a job's rows chunk by chunk. next_chunk(size) returns the next
+    DataFrame chunk or None; sizes come from the chunk scheduler, which
+    interleaves the chunks of all running jobs. The next chunk is read while
+    earlier ones are scored, with at most BATCH_CONCURRENCY * 2 chunks in
+    flight. Cancellation stops reading new chunks. Every chunk is scored with
+    model, the version pinned for the job, and saved with source (see
+    save_block_samples).
+    
+    Chunks are numbered from start_chunk and rows from start_row. Whenever every
+    chunk before some chunk_id has completed, on_checkpoint(chunk_id, row_offset)
+    is called; a chunk that failed or was skipped never completes, so the
+    checkpoint stays before it. Closes writer and returns its outcome, with
+    'input_rows' set to the number of rows in the input once it was read to the
+    end (None otherwise). When a chunk failed, no further chunks are read and a
+    RuntimeError is raised once the chunks in flight are done.
+    """
+    loop = asyncio.get_event_loop()
+    pending = set()
+    completed = {}
+    failed = []  # (chunk_id, error)
+    checkpoint = [start_chunk]
+    input_rows = None
+    
+    def chunk_done(chunk_id: int, end_row: int, future: asyncio.Future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            failed.append((chunk_id, future.exception()))
+            return
+        if future.result() is None:
+            return
+        completed[chunk_id] = end_row
+        if checkpoint[0] not in completed:
+            return
+        while checkpoint[0] in completed:
+            row_offset = completed.pop(checkpoint[0])
+            checkpoint[0] += 1
+        if on_checkpoint is not None:
+            on_checkpoint(checkpoint[0], row_offset)
+    
+    try:
+        chunk_id = start_chunk
+        row_offset = start_row
+        while not job_manager.is_cancelled(job_id) and not failed:
+            chunk = await loop.run_in_executor(None, next_chunk, chunk_scheduler.chunk_size())
+            if chunk is None:
+                input_rows = row_offset
+                break
+            
+            future = asyncio.ensure_future(chunk_scheduler.submit(
+                job_id, len(chunk), process_sample_chunk,
+                chunk, chunk_id, row_offset, job_id, available_metals, writer, store, model, source
+            ))
+            future.add_done_callback(lambda f, c=chunk_id, r=row_offset + len(chunk): chunk_done(c, r, f))
+            pending.add(future)
+            chunk_id += 1
+            row_offset += len(chunk)
+            
+            if len(pending) >= BATCH_CONCURRENCY * 2:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        # Stop queued chunks
+        job_manager.cancel(job_id)
+        raise
+    finally:
+        # Chunks in flight use the writer and the store: wait for them on every
+        # exit path (including a failed read) before the writer closes
+        if pending:
+            await asyncio.wait(pending)
+        write_outcome = await loop.run_in_executor(None, writer.close)
+    
+    if failed:
+        chunk_id, error = min(failed, key=lambda failure: failure[0])
+        raise RuntimeError(f"{len(failed)} chunk(s) could not be scored, the first (chunk {chunk_id}): {error}")
+    return {**write_outcome, 'input_rows': input_rows}
+
+def payload_source(samples: List[Dict]) -> str:
+    """Source of the rows of a JSON batch: a hash of the submitted samples, so a resubmitted batch updates its samples"""
+    return hashlib.sha1(json.dumps(samples, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def rows_source(job_id: str, upload: Optional[Dict] = None, source: Optional[str] = None) -> str:
+    """Where a job's rows come from, as save_block_samples takes it: source, the upload's content hash or the job"""
+    if source is not None:
+        return source
+    return upload['content_hash'] if upload is not None else job_id
+
+async def run_chunked_job(job_id: str, next_chunk, available_metals: List[str], upload: Optional[Dict] = None,
+                          source: Optional[str] = None):
+    """
+    Score an in-process job once it gets a slot and keep its results in memory
+    (or spilled to disk). The results of a fully processed upload are kept in
+    the upload cache. source identifies a batch that is not an upload (see rows_source).
+    """
+    if not await job_manager.start(job_id):
+        return
+    
+    job = job_manager.get(job_id)
+    chunk_scheduler.register(job_id, job.get('priority', 1) if job else 1)
+    
+    # The job keeps the model version it started with, even if a newer one is swapped in
+    model = model_registry.acquire()
+    # Results are kept as columnar blocks that spill to disk for large jobs
+    store = ColumnarResultStore(available_metals, model.hmpi_metals, model.get_class_labels(),
+                                model_version=model.model_version)
+    try:
+        # Database writes go through a write-behind buffer
         loop = asyncio.get_event_loop()
-        futures = []
-        
-        for chunk_id, chunk in enumerate(chunks):
-            future = loop.run_in_executor(
-                thread_pool, 
-                process_sample_chunk, 
-                chunk.to_dict('records'), 
-                chunk_id, 
-                job_id
+        write_outcome = await score_job_chunks(
+            job_id, next_chunk, available_metals, store, BulkWriteBuffer(db_manager), model,
+            source=rows_source(job_id, upload, source)
+        )
+        
+        # Leave out rows that could not be saved, rows that updated a stored sample get its ID
+        await loop.run_in_executor(None, store.exclude_rows, write_outcome['errors'].keys())
+        await loop.run_in_executor(None, store.set_sample_ids, write_outcome['reassigned_ids'])
+        
+        details = {'failed_writes': write_outcome['failed_count'], 'model_version': model.model_version}
+        if write_outcome['input_rows'] is not None:
+            # The upload's row count was estimated from its line breaks, the reader counted the actual rows
+            details['total'] = write_outcome['input_rows']
+        job_manager.finish(job_id, store, **details)
+        print(f"Batch job {job_id} finished. Processed {len(store)} samples.")
+        
+        job = job_manager.get(job_id)
+        if job and job['status'] == 'completed' and fully_scored(store, write_outcome):
+            await loop.run_in_executor(None, cache_upload_results, upload, store, model, len(store))
+        
+    except Exception as e:
+        store.close()
+        job_manager.fail(job_id, str(e))
+        print(f"Batch job {job_id} failed: {e}")
+    finally:
+        model_registry.release(model)
+        chunk_scheduler.unregister(job_id)
+        job_manager.release(job_id)
+
+def upload_cache_key(upload: Dict, model: WaterSafetyPredictor) -> str:
+    """Upload cache entry of an upload's results: its content and parser, scored with model and the current settings"""
+    return upload_cache.key(upload['content_hash'], score_cache_namespace('upload', model, upload['parser'], upload['file_ext']))
+
+def fully_scored(store: ColumnarResultStore, write_outcome: Dict, failed_writes: int = 0) -> bool:
+    """Whether every input row of a job was read, scored and saved, so its results can be cached"""
+    input_rows = write_outcome['input_rows']
+    return (input_rows is not None and not failed_writes and not write_outcome['failed_count']
+            and len(store) == input_rows)
+
+def cache_upload_results(upload: Optional[Dict], store: ColumnarResultStore, model: WaterSafetyPredictor, total: int):
+    """Keep the results of a fully processed upload for re-uploads of the same file"""
+    if upload is None or not upload_cache.enabled:
+        return
+    try:
+        upload_cache.store(upload_cache_key(upload, model), store, {'total_samples': total})
+    except Exception as e:
+        print(f"Could not cache upload results: {e}")
+
+def cached_upload_rows(store: ColumnarResultStore, upload: Dict) -> List[Dict]:
+    """Result rows of a cached upload, saved to the database again under the "insert" duplicates policy"""
+    if UPLOAD_CACHE_DUPLICATES != "insert":
+        return store.to_rows()
+    
+    rows = []
+    for _, block in store.iter_blocks():
+        saved = save_block_samples(block, store.metals, store.model_version, source=upload['content_hash'])
+        rows.extend(block_rows(saved, store.metals, store.cf_metals, store.class_labels))
+    return rows
+
+async def replay_cached_job(job_id: str, cached: ColumnarResultStore, upload: Dict):
+    """Save the rows of cached upload results to the database again as a job of their own, without scoring them"""
+    if not await job_manager.start(job_id):
+        return
+    
+    loop = asyncio.get_event_loop()
+    store = ColumnarResultStore(cached.metals, cached.cf_metals, cached.class_labels, model_version=cached.model_version)
+    writer = BulkWriteBuffer(db_manager)
+    try:
+        try:
+            blocks = cached.iter_blocks()
+            while not job_manager.is_cancelled(job_id):
+                part = await loop.run_in_executor(None, next, blocks, None)
+                if part is None:
+                    break
+                part_id, block = part
+                saved = await loop.run_in_executor(
+                    thread_pool, save_block_samples, block, cached.metals, cached.model_version, writer,
+                    upload['content_hash']
+                )
+                store.add_block(part_id, saved)
+                job_manager.add_progress(job_id, len(block['row_id']))
+        finally:
+            write_outcome = await loop.run_in_executor(None, writer.close)
+        
+        # Leave out rows that could not be saved, rows that updated a stored sample get its ID
+        await loop.run_in_executor(None, store.exclude_rows, write_outcome['errors'].keys())
+        await loop.run_in_executor(None, store.set_sample_ids, write_outcome['reassigned_ids'])
+        job_manager.finish(job_id, store, failed_writes=write_outcome['failed_count'], model_version=cached.model_version)
+        print(f"Batch job {job_id} finished from cached results. Saved {len(store)} samples.")
+        
+    except Exception as e:
+        store.close()
+        job_manager.fail(job_id, str(e))
+        print(f"Batch job {job_id} failed: {e}")
+    finally:
+        job_manager.release(job_id)
+
+async def start_cached_job(job_id: str, upload: Dict, priority: int) -> Optional[Tuple[int, str]]:
+    """
+    Start a batch job for an upload whose results are in the upload cache,
+    returning its sample count and status. Returns None when the upload has to
+    be processed: not cached, small enough for /upload-file, or to be saved
+    again (the "insert" duplicates policy) on the durable queue, whose workers
+    only run jobs from their input CSV.
+    """
+    if not upload_cache.enabled:
+        return None
+    loop = asyncio.get_event_loop()
+    cached = await loop.run_in_executor(None, upload_cache.lookup, upload_cache_key(upload, model_registry.current))
+    if cached is None:
+        return None
+    info, store = cached
+    total = info['total_samples']
+    if total <= 100 or (UPLOAD_CACHE_DUPLICATES == "insert" and job_queue is not None):
+        return None
+    
+    if UPLOAD_CACHE_DUPLICATES == "insert":
+        job_manager.create_job(job_id, total, priority)
+        asyncio.create_task(replay_cached_job(job_id, store, upload))
+        return total, 'queued'
+    
+    # The stored samples are reused; the job gets its own copy of the results
+    if job_queue is not None:
+        results = await loop.run_in_executor(None, store.copy_to, job_results_dir(job_id))
+        await loop.run_in_executor(None, job_queue.add_completed, job_id, total, len(results), priority)
+        results.close()
+    else:
+        job_manager.create_job(job_id, total, priority)
+        job_manager.add_progress(job_id, total)
+        results = await loop.run_in_executor(None, store.copy_to)
+        job_manager.finish(job_id, results, failed_writes=0, model_version=results.model_version)
+    return total, 'completed'
+
+def job_data_dir(job_id: str) -> str:
+    """Directory holding a durable job's input CSV and results"""
+    return os.path.join(JOB_DATA_DIR, job_id)
+
+def job_results_dir(job_id: str) -> str:
+    return os.path.join(job_data_dir(job_id), 'results')
+
+# Durable jobs whose results are being read: job_id -> number of readers. The retention
+# sweep leaves their directories to the last reader, which removes them when it is done
+job_readers = {}
+job_readers_expired = set()
+job_readers_lock = threading.Lock()
+
+def pin_job_data(job_id: str):
+    """Keep a durable job's directory until unpin_job_data()"""
+    with job_readers_lock:
+        job_readers[job_id] = job_readers.get(job_id, 0) + 1
+
+def unpin_job_data(job_id: str):
+    """Drop a pin; the last one removes the directory if the job expired meanwhile"""
+    with job_readers_lock:
+        job_readers[job_id] -= 1
+        if job_readers[job_id]:
+            return
+        del job_readers[job_id]
+        if job_id not in job_readers_expired:
+            return
+        job_readers_expired.discard(job_id)
+    shutil.rmtree(job_data_dir(job_id), ignore_errors=True)
+
+def remove_job_data(job_id: str):
+    """Remove an expired durable job's directory, or leave it to its last reader"""
+    with job_readers_lock:
+        if job_id in job_readers:
+            job_readers_expired.add(job_id)
+            return
+    shutil.rmtree(job_data_dir(job_id), ignore_errors=True)
+
+def save_job_origin(job_id: str, upload: Optional[Dict], source: Optional[str] = None):
+    """
+    Record which upload (or other batch, by source) a durable job processes,
+    so its worker can cache the results and save the rows under their source
+    """
+    with open(os.path.join(job_data_dir(job_id), 'origin.json'), 'w', encoding='utf-8') as f:
+        json.dump({'upload': upload, 'source': source}, f)
+
+def load_job_origin(job_id: str) -> Dict:
+    try:
+        with open(os.path.join(job_data_dir(job_id), 'origin.json'), encoding='utf-8') as f:
+            return json.load(f)
+    except OSError:
+        return {'upload': None, 'source': None}
+
+async def run_durable_job(record: Dict, worker_id: str):
+    """
+    Run a job claimed from the durable queue, resuming from its checkpoint.
+    Results go to the job's results directory chunk by chunk. A checkpoint is
+    recorded once every row before it is scored and written to the database;
+    the lease is renewed every JOB_POLL_INTERVAL seconds. Rows after the last
+    checkpoint may be scored again when a job is resumed; saving them again
+    updates their samples (upserts on the row fingerprint). A worker that loses
+    its lease stops scoring and leaves the job's input and results to the
+    worker that took it over.
+    """
+    job_id = record['job_id']
+    loop = asyncio.get_event_loop()
+    
+    # The local job record drives cancellation, progress and the chunk scheduler
+    job_manager.create_job(job_id, record['total'], record['priority'])
+    job_manager.add_progress(job_id, record['processed'])
+    await job_manager.start(job_id)
+    chunk_scheduler.register(job_id, record['priority'])
+    
+    writer = BulkWriteBuffer(db_manager)
+    origin = load_job_origin(job_id)
+    scored = deque()
+    excluded = set()
+    reassigned = set()
+    lease = {'lost': False}
+    sync_lock = threading.Lock()
+    heartbeat = None
+    model = None
+    
+    def sync_queue(store: ColumnarResultStore) -> Optional[str]:
+        """Renew the lease and checkpoint up to the oldest row not yet written"""
+        # The heartbeat and the final sync after scoring may overlap
+        with sync_lock:
+            job = job_manager.get(job_id)
+            status = job_queue.renew(job_id, worker_id, job['processed'] if job else record['processed'])
+            if status is None:
+                # Another worker took the job over: its results directory is no longer ours to write
+                lease['lost'] = True
+                store.detach()
+                return status
+            
+            failed = writer.failed_rows()
+            if failed.keys() - excluded:
+                store.exclude_rows(failed.keys() - excluded)
+                excluded.update(failed.keys())
+            sample_ids = writer.reassigned_rows()
+            if sample_ids.keys() - reassigned:
+                store.set_sample_ids({row_id: sample_ids[row_id] for row_id in sample_ids.keys() - reassigned})
+                reassigned.update(sample_ids.keys())
+            
+            oldest = writer.oldest_unwritten()
+            point = None
+            while scored and (oldest is None or scored[0][1] < oldest):
+                point = scored.popleft()
+            if point is not None:
+                job_queue.checkpoint(job_id, worker_id, point[0], point[1], record['failed_writes'] + len(failed))
+            return status
+    
+    async def keep_lease(store: ColumnarResultStore):
+        while True:
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            status = await loop.run_in_executor(None, sync_queue, store)
+            # Cancellation was requested or another worker took the job over
+            if status != 'processing':
+                job_manager.cancel(job_id)
+    
+    try:
+        available_metals, reader, next_chunk = read_csv_chunks(record['input_path'], skip_rows=record['row_offset'])
+        results_dir = job_results_dir(job_id)
+        if record['chunk_id'] > 0 and os.path.exists(os.path.join(results_dir, 'meta.json')):
+            # A resumed job continues with the model version it started with
+            store = ColumnarResultStore.open(results_dir, keep_parts_below=record['chunk_id'])
+            model = await loop.run_in_executor(None, model_registry.acquire, store.model_version)
+        else:
+            shutil.rmtree(results_dir, ignore_errors=True)
+            model = model_registry.acquire()
+            store = ColumnarResultStore(
+                available_metals, model.hmpi_metals, model.get_class_labels(), directory=results_dir,
+                model_version=model.model_version
             )
-            futures.append(future)
         
-        # Wait for all chunks to complete
-        chunk_results = await asyncio.gather(*futures)
+        heartbeat = asyncio.ensure_future(keep_lease(store))
+        with reader:
+            write_outcome = await score_job_chunks(
+                job_id, next_chunk, available_metals, store, writer, model,
+                record['chunk_id'], record['row_offset'], on_checkpoint=lambda *point: scored.append(point),
+                source=rows_source(job_id, origin['upload'], origin['source'])
+            )
+        heartbeat.cancel()
+        # Renew the lease once more before touching the results and the input
+        await loop.run_in_executor(None, sync_queue, store)
+        if lease['lost']:
+            print(f"Batch job {job_id} was taken over by another worker, {worker_id} stopped.")
+            return
         
-        # Combine results
-        all_results = []
-        for results in chunk_results:
-            all_results.extend(results)
+        # Leave out rows that could not be saved, rows that updated a stored sample get its ID
+        await loop.run_in_executor(None, store.exclude_rows, write_outcome['errors'].keys())
+        await loop.run_in_executor(None, store.set_sample_ids, write_outcome['reassigned_ids'])
         
-        # Update job status
-        batch_jobs[job_id]['status'] = 'completed'
-        batch_jobs[job_id]['results'] = all_results
-        batch_jobs[job_id]['end_time'] = datetime.utcnow()
+        status = 'cancelled' if job_manager.is_cancelled(job_id) else 'completed'
+        failed_writes = record['failed_writes'] + write_outcome['failed_count']
+        # The upload's row count was estimated from its line breaks, the reader counted the actual rows
+        finished = await loop.run_in_executor(
+            None, lambda: job_queue.finish(
+                job_id, worker_id, status, len(store), failed_writes, total=write_outcome['input_rows']
+            )
+        )
+        if not finished:
+            # The lease ran out before the job was closed; the input belongs to the worker holding it now
+            print(f"Batch job {job_id} was taken over by another worker, {worker_id} stopped.")
+            return
+        os.remove(record['input_path'])
+        print(f"Batch job {job_id} {status}. Processed {len(store)} samples.")
         
-        print(f"Batch job {job_id} completed. Processed {len(all_results)} samples.")
+        if status == 'completed' and fully_scored(store, write_outcome, failed_writes):
+            await loop.run_in_executor(None, cache_upload_results, origin['upload'], store, model, len(store))
         
+    except asyncio.CancelledError:
+        # Worker shutting down: the job goes back to the queue and resumes from its last checkpoint
+        job_queue.release(job_id, worker_id)
+        raise
     except Exception as e:
-        batch_jobs[job_id]['status'] = 'failed'
-        batch_jobs[job_id]['error'] = str(e)
+        job_queue.finish(job_id, worker_id, 'failed', error=str(e))
         print(f"Batch job {job_id} failed: {e}")
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+        if model is not None:
+            model_registry.release(model)
+        chunk_scheduler.unregister(job_id)
+        job_manager.release(job_id)
+        job_manager.discard(job_id)
+
+async def durable_worker_loop(worker_id: str, stop: asyncio.Event = None):
+    """Claim jobs from the durable queue, running up to MAX_CONCURRENT_JOBS at a time, until stop is set"""
+    loop = asyncio.get_event_loop()
+    running = set()
+    print(f"Batch worker {worker_id} polling the {JOB_QUEUE_BACKEND} job queue")
+    
+    try:
+        while stop is None or not stop.is_set():
+            # Jobs are only claimed once the model can score them
+            while model_ready.is_set() and len(running) < job_manager.max_concurrent_jobs:
+                try:
+                    record = await loop.run_in_executor(None, job_queue.claim, worker_id)
+                except Exception as e:
+                    print(f"Error claiming batch job: {e}")
+                    break
+                if record is None:
+                    break
+                
+                print(f"Worker {worker_id} claimed batch job {record['job_id']} from row {record['row_offset']}")
+                task = asyncio.ensure_future(run_durable_job(record, worker_id))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+    finally:
+        for task in list(running):
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+async def process_large_batch_async(job_id: str, df: pd.DataFrame, available_metals: List[str], upload: Optional[Dict] = None,
+                                    source: Optional[str] = None):
+    """Process large batch asynchronously in chunks"""
+    await run_chunked_job(job_id, frame_chunks(df), available_metals, upload, source)
+
+async def process_csv_stream_async(job_id: str, path: str, upload: Optional[Dict] = None):
+    """Process a spooled CSV upload chunk by chunk without loading it whole"""
+    try:
+        available_metals, reader, next_chunk = read_csv_chunks(path)
+        with reader:
+            await run_chunked_job(job_id, next_chunk, available_metals, upload)
+    except Exception as e:
+        job_manager.fail(job_id, str(e))
+        print(f"Batch job {job_id} failed: {e}")
+    finally:
+        os.remove(path)
+
+def enqueue_durable_job(job_id: str, input_path: str, total: int, priority: int):
+    """Put a job whose rows are in the CSV at input_path on the durable queue"""
+    queued = job_queue.count_queued()
+    if queued >= job_manager.max_queued_jobs:
+        raise JobQueueFullError(f"{queued} batch jobs are already waiting, try again later")
+    job_queue.enqueue(job_id, input_path, total, priority)
+
+def discard_job_input(job_id: str, path: str):
+    """Remove the spooled input of a job that was not started"""
+    if job_queue is not None:
+        shutil.rmtree(job_data_dir(job_id), ignore_errors=True)
+    else:
+        os.remove(path)
+
+async def start_frame_job(job_id: str, df: pd.DataFrame, available_metals: List[str], priority: int = 1,
+                          upload: Optional[Dict] = None, source: Optional[str] = None):
+    """
+    Start a batch job over an in-memory DataFrame, through the durable queue
+    when one is configured. upload identifies the uploaded file the rows come
+    from, for the upload cache; source identifies a batch that is not an
+    upload (see rows_source).
+    """
+    if job_queue is None:
+        job_manager.create_job(job_id, len(df), priority)
+        asyncio.create_task(process_large_batch_async(job_id, df, available_metals, upload, source))
+        return
+    
+    # Workers read durable jobs from CSV, so the frame is written out once
+    loop = asyncio.get_event_loop()
+    path = os.path.join(job_data_dir(job_id), 'input.csv')
+    os.makedirs(job_data_dir(job_id), exist_ok=True)
+    await loop.run_in_executor(None, lambda: df.to_csv(path, index=False))
+    save_job_origin(job_id, upload, source)
+    try:
+        await loop.run_in_executor(None, enqueue_durable_job, job_id, path, len(df), priority)
+    except JobQueueFullError:
+        discard_job_input(job_id, path)
+        raise
+
+async def find_job(job_id: str) -> Optional[Dict]:
+    """
+    Snapshot of a batch job in the JobManager shape, from the durable queue
+    when one is configured (results_count and results_dir replace results).
+    """
+    if job_queue is None:
+        return job_manager.get(job_id)
+    
+    loop = asyncio.get_event_loop()
+    record = await loop.run_in_executor(None, job_queue.get, job_id)
+    if record is None:
+        return None
+    
+    progress = min(record['processed'] / record['total'] * 100, 100.0) if record['total'] else 0.0
+    return {
+        'status': record['status'],
+        'progress': 100.0 if record['status'] == 'completed' else progress,
+        'processed': record['processed'],
+        'total': record['total'],
+        'results_count': record['results_count'] or 0,
+        'results_dir': job_results_dir(job_id),
+        'failed_writes': record['failed_writes'],
+        'error': record['error']
+    }
 
 # API endpoints
 @app.get("/")
 async def root():
     return {"message": "Water Quality Monitoring API", "status": "active"}
 
-@app.post("/analyze-sample", response_model=AnalysisResponse)
-async def analyze_sample(sample: SampleData):
-    """Analyze a single water sample with auto unit detection"""
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once the model can serve predictions, 503 while it is loading or training"""
+    return JSONResponse(
+        status_code=200 if model_ready.is_set() else 503,
+        content={'ready': model_ready.is_set(), **model_state}
+    )
+
+# The full view is documented; view=compact and fields return subsets of it, so the
+# response is not validated against AnalysisResponse
+@app.post("/analyze-sample", response_model=None, responses={200: {
+    'model': AnalysisResponse,
+    'description': "The full view; view=compact leaves out the per-metal sections and actions, fields returns only the listed fields"
+}})
+async def analyze_sample(sample: SampleData, mode: Optional[str] = Query(None, pattern="^(full|fast)$"),
+                         view: Optional[str] = Query(None, pattern="^(full|compact)$"),
+                         fields: Optional[str] = Query(None)):
+    """
+    Analyze a single water sample with auto unit detection; mode=fast uses the compiled fast predictor.
+    view=compact leaves out the per-metal sections (contamination_factors, contributions)
+    and the recommended actions; fields picks a comma-separated list of fields such as
+    "sample_id,analysis_results.hmpi,ml_prediction" and takes precedence over view.
+    """
+    require_model()
+    try:
+        selected = parse_fields(fields, view)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     try:
         # Prepare sample data
         sample_data = sample.dict()
         unit_input = sample_data.pop('unit_input', 'Auto-detect')
         
-        # Auto-detect unit if requested
-        if unit_input == "Auto-detect":
-            detected_unit = auto_detect_unit(sample_data)
-            print(f"Auto-detected unit: {detected_unit}")
-        else:
-            detected_unit = unit_input
-        
-        # Calculate comprehensive indices - USING FIXED CALCULATION
-        comprehensive_results = predictor.calculate_comprehensive_indices(sample_data)
-        
-        # ML Prediction
-        ml_input = []
-        for metal in predictor.hmpi_metals:
-            ml_input.append(sample_data.get(metal, 0.0))
-        
-        ml_prediction, probabilities = predictor.predict_pollution(ml_input)
+        # Calculate comprehensive indices and ML prediction together with concurrent requests,
+        # building only the per-metal sections the response needs
+        comprehensive_results, ml_result, detected_unit, model_version = await analyze_batcher.submit(
+            (sample_data, unit_input, mode or PREDICTION_MODE, detail_sections(selected))
+        )
         
         # Prepare data for database
         db_sample = {
@@ -431,69 +1423,184 @@ async def analyze_sample(sample: SampleData):
             'total_cf_score': comprehensive_results['total_cf']['score'],
             'pollution_level': comprehensive_results['hmpi']['level'],
             'unit_detected': detected_unit,
+            'model_version': model_version,
             'timestamp': datetime.utcnow().isoformat()
         }
         
         # Save to database
-        sample_id = db_manager.insert_sample(db_sample)
+        sample_id = await async_db_manager.insert_sample(db_sample)
         
         # Prepare CORRECTED response
+        recommendations = {
+            'overall': comprehensive_results['hmpi']['recommendation'],
+            'compliance_status': "Compliant" if comprehensive_results['hmpi']['level'] == "Safe" else "Non-Compliant"
+        }
+        if wants(selected, 'recommendations', 'actions'):
+            recommendations['actions'] = generate_recommendations(comprehensive_results)
         response = {
             'sample_id': sample_id,
             'timestamp': db_sample['timestamp'],
             'analysis_results': comprehensive_results,
-            'ml_prediction': {
-                'prediction': ml_prediction,
-                'confidence': {k: float(v) for k, v in zip(predictor.label_encoder.classes_, probabilities)}
-            } if hasattr(predictor.label_encoder, 'classes_') else {'prediction': 'N/A', 'confidence': {}},
-            'recommendations': {
-                'overall': comprehensive_results['hmpi']['recommendation'],
-                'compliance_status': "Compliant" if comprehensive_results['hmpi']['level'] == "Safe" else "Non-Compliant",
-                'actions': generate_recommendations(comprehensive_results)
-            },
-            'unit_detected': detected_unit
+            'ml_prediction': ml_result,
+            'recommendations': recommendations,
+            'unit_detected': detected_unit,
+            'model_version': model_version
         }
         
-        return AnalysisResponse(**response)
+        # Plain values in AnalysisResponse's shape (a subset of it for compact views), encoded as they are
+        return FastJSONResponse(pick_fields(response, selected))
         
     except Exception as e:
         print(f"Error in analyze-sample: {e}")
         raise HTTPException(status_code=500, detail=f"Error analyzing sample: {str(e)}")
 
+@app.get("/metrics/analyze-batching")
+async def analyze_batching_metrics():
+    """Batch-size distribution and queueing delay of coalesced /analyze-sample requests"""
+    return analyze_batcher.metrics()
+
+@app.get("/metrics/models")
+async def model_metrics():
+    """Model version serving new requests, versions still pinned by running jobs and swaps so far"""
+    return {**model_registry.status(), 'watch_interval_seconds': MODEL_WATCH_INTERVAL}
+
+@app.get("/metrics/fast-model")
+async def fast_model_metrics():
+    """Agreement and single-sample latency of the fast predictor against the full model"""
+    model = model_registry.current
+    if model.model is None:
+        raise HTTPException(status_code=503, detail="No model is loaded")
+    if model.fast_model_agreement is None:
+        # Measured once per model version
+        loop = asyncio.get_event_loop()
+        model.fast_model_agreement = await loop.run_in_executor(None, measure_agreement, model)
+    return {**model.fast_model_agreement, 'default_mode': PREDICTION_MODE}
+
+@app.get("/metrics/ml-gate")
+async def ml_gate_metrics():
+    """Share of samples that skipped the model and model/HMPI agreement by distance to a level threshold"""
+    return ml_gate_stats.report()
+
+@app.get("/metrics/score-cache")
+async def score_cache_metrics():
+    """Hits, misses and size of the cache of recently scored metal vectors"""
+    return score_cache.metrics()
+
+@app.get("/metrics/upload-cache")
+async def upload_cache_metrics():
+    """Size, hit rate and duplicates policy of the cache of processed uploads"""
+    return await asyncio.get_event_loop().run_in_executor(None, upload_cache.metrics)
+
+@app.get("/metrics/startup")
+async def startup_metrics():
+    """Seconds spent importing modules, loading the model and connecting at startup"""
+    return {**startup_timer.report(), 'model': model_state}
+
+@app.get("/metrics/batch-scheduler")
+async def batch_scheduler_metrics():
+    """Chunk queue depth, adaptive chunk size and per-job throughput of running batch jobs"""
+    return {**chunk_scheduler.metrics(), 'jobs_by_status': job_manager.stats()}
+
 @app.post("/upload-file-large")
-async def upload_file_large(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
-    """Upload and process large files asynchronously"""
+async def upload_file_large(background_tasks: BackgroundTasks, file: UploadFile = File(...),
+                            priority: int = Query(1, ge=1, le=10)):
+    """Upload and process large files asynchronously (priority weights the job's share of workers)"""
+    require_model()
     try:
         # Generate job ID
         job_id = str(uuid.uuid4())
         
+        loop = asyncio.get_event_loop()
+        file_ext = file.filename.split('.')[-1].lower()
+        
+        # CSV files are spooled to disk and streamed through scoring in chunks
+        if file_ext == 'csv':
+            # Durable jobs keep their input in the job's directory until they finish
+            spool_path = None
+            if job_queue is not None:
+                os.makedirs(job_data_dir(job_id), exist_ok=True)
+                spool_path = os.path.join(job_data_dir(job_id), 'input.csv')
+            path, total_rows, content_hash = await loop.run_in_executor(None, spool_upload, file, 1024 * 1024, spool_path)
+            upload = {'content_hash': content_hash, 'parser': 'stream', 'file_ext': file_ext}
+            
+            if total_rows > 100:
+                # A file uploaded before is served from the upload cache
+                try:
+                    cached = await start_cached_job(job_id, upload, priority)
+                except JobQueueFullError:
+                    discard_job_input(job_id, path)
+                    raise
+                if cached is not None:
+                    os.remove(path)
+                    return {
+                        "job_id": job_id,
+                        "message": f"File was processed before. Results of {cached[0]} samples reused.",
+                        "total_samples": cached[0],
+                        "status": cached[1],
+                        "cached": True
+                    }
+                
+                try:
+                    if job_queue is not None:
+                        await loop.run_in_executor(None, save_job_origin, job_id, upload)
+                        await loop.run_in_executor(None, enqueue_durable_job, job_id, path, total_rows, priority)
+                    else:
+                        job_manager.create_job(job_id, total_rows, priority)
+                except JobQueueFullError:
+                    discard_job_input(job_id, path)
+                    raise
+                if job_queue is None:
+                    background_tasks.add_task(process_csv_stream_async, job_id, path, upload)
+                
+                return {
+                    "job_id": job_id,
+                    "message": f"Large file processing started. {total_rows} samples queued for processing.",
+                    "total_samples": total_rows,
+                    "status": "queued"
+                }
+            
+            discard_job_input(job_id, path)
+            await file.seek(0)
+            return await upload_file(file)
+        
+        # A file uploaded before is served from the upload cache
+        upload = {'content_hash': await loop.run_in_executor(None, hash_file, file.file),
+                  'parser': 'frame', 'file_ext': file_ext}
+        cached = await start_cached_job(job_id, upload, priority)
+        if cached is not None:
+            return {
+                "job_id": job_id,
+                "message": f"File was processed before. Results of {cached[0]} samples reused.",
+                "total_samples": cached[0],
+                "status": cached[1],
+                "cached": True
+            }
+        
         # Process the uploaded file
         df, available_metals = process_uploaded_file(file)
         
         # Start background processing for large files
         if len(df) > 100:  # Use async processing for files with more than 100 samples
-            background_tasks.add_task(process_large_batch_async, job_id, df, available_metals)
+            await start_frame_job(job_id, df, available_metals, priority, upload)
             
             return {
                 "job_id": job_id,
                 "message": f"Large file processing started. {len(df)} samples queued for processing.",
                 "total_samples": len(df),
-                "status": "processing"
+                "status": "queued"
             }
         else:
             # Use existing synchronous processing for small files
+            await file.seek(0)
             return await upload_file(file)
             
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
-@app.get("/batch-status/{job_id}")
-async def get_batch_status(job_id: str):
-    """Check status of a batch processing job"""
-    if job_id not in batch_jobs:
-        raise HTTPException(status_code=404, detail="Job not found")
-    
-    job = batch_jobs[job_id]
+def batch_status_payload(job_id: str, job: Dict) -> Dict:
+    """Status and progress fields of a batch job as the API reports them"""
     response = {
         "job_id": job_id,
         "status": job['status'],
@@ -502,18 +1609,259 @@ async def get_batch_status(job_id: str):
         "total_samples": job['total']
     }
     
+    results_count = job['results_count'] if 'results_count' in job else len(job['results'])
+    model_version = job.get('model_version') or getattr(job.get('results'), 'model_version', None)
+    if model_version is not None:
+        response["model_version"] = model_version
     if job['status'] == 'completed':
-        response["results"] = job['results']
-        response["message"] = f"Processing completed. {len(job['results'])} samples processed."
+        response["message"] = f"Processing completed. {results_count} samples processed."
+        response["results_count"] = results_count
+        response["failed_writes"] = job.get('failed_writes', 0)
+    elif job['status'] == 'cancelled':
+        response["message"] = f"Processing cancelled. {results_count} samples were processed before cancellation."
+        response["results_count"] = results_count
+        response["failed_writes"] = job.get('failed_writes', 0)
     elif job['status'] == 'failed':
         response["error"] = job.get('error', 'Unknown error')
     
     return response
 
+@app.get("/batch-status/{job_id}")
+async def get_batch_status(job_id: str):
+    """Check status of a batch processing job (results are read from /batch-results)"""
+    job = await find_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return batch_status_payload(job_id, job)
+
+async def job_progress_events(job_id: str, event: Optional[asyncio.Event]):
+    """
+    Server-sent events for a job: a progress event whenever it changes (at most
+    one per PROGRESS_EVENT_INTERVAL seconds) and a final completed, failed or
+    cancelled event, after which the stream ends. Without an event (durable
+    queue) the job is re-read every JOB_POLL_INTERVAL seconds instead.
+    """
+    try:
+        last_payload = None
+        last_sent = time.monotonic()
+        while True:
+            if event is not None:
+                event.clear()
+            job = await find_job(job_id)
+            if job is None:
+                yield f"event: failed\ndata: {json.dumps({'job_id': job_id, 'status': 'failed', 'error': 'Job no longer exists'})}\n\n"
+                return
+            
+            payload = batch_status_payload(job_id, job)
+            if job['status'] in JobManager.FINISHED_STATUSES:
+                yield f"event: {job['status']}\ndata: {json.dumps(payload)}\n\n"
+                return
+            if payload != last_payload:
+                yield f"event: progress\ndata: {json.dumps(payload)}\n\n"
+                last_payload = payload
+                last_sent = time.monotonic()
+            
+            # Throttle, then wait for the next change (changes in between are coalesced)
+            await asyncio.sleep(PROGRESS_EVENT_INTERVAL)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), PROGRESS_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(max(JOB_POLL_INTERVAL - PROGRESS_EVENT_INTERVAL, 0))
+            
+            if time.monotonic() - last_sent >= PROGRESS_HEARTBEAT_INTERVAL:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        if event is not None:
+            job_manager.unsubscribe(job_id, event)
+
+@app.get("/batch-progress/{job_id}")
+async def stream_batch_progress(job_id: str):
+    """Push a batch job's progress and its final status as server-sent events"""
+    if job_queue is not None:
+        event = None
+        if await find_job(job_id) is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+    else:
+        event = job_manager.subscribe(job_id)
+        if event is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+    
+    return StreamingResponse(
+        job_progress_events(job_id, event),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class ClosingRows:
+    """Iterate over rows and call on_close once: when they run out, on close() or when collected"""
+
+    def __init__(self, rows, on_close):
+        self.rows = iter(rows)
+        self.on_close = on_close
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        try:
+            return next(self.rows)
+        except StopIteration:
+            self.close()
+            raise
+    
+    def close(self):
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close()
+    
+    __del__ = close
+
+def iter_ndjson(rows):
+    """Serialize result rows as newline-delimited JSON, one block of lines at a time"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, default=str))
+        if len(lines) >= 1000:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def iter_csv(rows, columns: List[str]):
+    """Serialize result rows as CSV with a fixed header, one block of lines at a time"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+    writer.writeheader()
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % 1000 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@app.get("/batch-results/{job_id}")
+async def get_batch_results(job_id: str, cursor: int = Query(0, ge=0), limit: Optional[int] = Query(None, ge=1),
+                            fields: Optional[str] = None, format: str = Query("json", pattern="^(json|ndjson|csv)$")):
+    """
+    Read the results of a finished batch job.
+    json returns one page starting at cursor (at most limit rows, default 1000) with
+    the cursor of the next page; ndjson and csv stream every row from cursor on.
+    fields is a comma-separated list of result keys to return.
+    """
+    # A durable job's directory is pinned before the job is looked up, so the retention
+    # sweep cannot remove it while its results are read
+    pinned = job_queue is not None
+    if pinned:
+        pin_job_data(job_id)
+    store = None
+    
+    def release():
+        if store is not None:
+            store.close()
+        if pinned:
+            unpin_job_data(job_id)
+    
+    streaming = False
+    try:
+        job = await find_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job['status'] not in ('completed', 'cancelled'):
+            raise HTTPException(status_code=409, detail=f"Job is {job['status']}, results are not available")
+        
+        # Durable jobs' results are read back from their results directory
+        if 'results_dir' in job:
+            has_results = job['results_count'] and os.path.exists(os.path.join(job['results_dir'], 'meta.json'))
+            results = store = ColumnarResultStore.open(job['results_dir']) if has_results else []
+        else:
+            results = job['results']
+        total = len(results)
+        columns = results.columns() if total else []
+        selected = [field.strip() for field in fields.split(',') if field.strip()] if fields else None
+        unknown = [field for field in selected or [] if field not in columns]
+        if total and unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        
+        if format == "json":
+            # One page per request, capped at 10000 rows
+            stop = min(cursor + min(limit or 1000, 10000), total)
+            loop = asyncio.get_event_loop()
+            rows = await loop.run_in_executor(
+                None, lambda: list(results.iter_rows(cursor, stop, fields=selected))
+            ) if cursor < total else []
+            return {
+                "job_id": job_id,
+                "status": job['status'],
+                "total": total,
+                "cursor": cursor,
+                "next_cursor": stop if stop < total else None,
+                "model_version": getattr(results, 'model_version', None),
+                "results": rows
+            }
+        
+        # Streamed rows close the store and unpin the job once sent (or abandoned)
+        stop = min(cursor + limit, total) if limit is not None else total
+        rows = ClosingRows(results.iter_rows(cursor, stop, fields=selected) if cursor < total else iter(()), release)
+        streaming = True
+        if format == "ndjson":
+            return StreamingResponse(iter_ndjson(rows), media_type="application/x-ndjson",
+                                     background=BackgroundTask(rows.close))
+        
+        return StreamingResponse(
+            iter_csv(rows, selected or columns),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="batch_{job_id}.csv"'},
+            background=BackgroundTask(rows.close)
+        )
+    finally:
+        if not streaming:
+            release()
+
+@app.post("/batch-cancel/{job_id}")
+async def cancel_batch_job(job_id: str):
+    """Cancel a queued or running batch job; rows already processed stay saved"""
+    if job_queue is not None:
+        loop = asyncio.get_event_loop()
+        status = await loop.run_in_executor(None, job_queue.cancel, job_id)
+    else:
+        status = job_manager.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {"job_id": job_id, "status": status}
+
 @app.post("/upload-file", response_model=FileUploadResponse)
 async def upload_file(file: UploadFile = File(...)):
     """Upload and process CSV, Excel, or PDF files with auto unit detection - for small files"""
+    require_model()
     try:
+        loop = asyncio.get_event_loop()
+        model = model_registry.current
+        
+        # The file's hash identifies its rows in the database; a file uploaded before is served from the upload cache
+        upload = {'content_hash': await loop.run_in_executor(None, hash_file, file.file),
+                  'parser': 'frame', 'file_ext': file.filename.split('.')[-1].lower()}
+        if upload_cache.enabled:
+            cached = await loop.run_in_executor(None, upload_cache.lookup, upload_cache_key(upload, model))
+            if cached is not None and cached[0]['total_samples'] <= 500:
+                info, store = cached
+                results = await loop.run_in_executor(thread_pool, cached_upload_rows, store, upload)
+                return FileUploadResponse(
+                    message=f"File processed successfully. Processed {len(results)} out of {info['total_samples']} samples.",
+                    total_samples=info['total_samples'],
+                    processed_samples=len(results),
+                    results=results,
+                    available_metals=store.metals,
+                    model_version=store.model_version,
+                    cached=True
+                )
+        
         # Process the uploaded file
         df, available_metals = process_uploaded_file(file)
         
@@ -527,96 +1875,29 @@ async def upload_file(file: UploadFile = File(...)):
                 available_metals=available_metals
             )
         
-        results = []
-        processed_count = 0
+        # Score every row as one block off the event loop (uses the synchronous DB path)
+        block = await loop.run_in_executor(
+            thread_pool, score_sample_block, df, available_metals, [idx + 1 for idx in df.index], None, None, model,
+            upload['content_hash']
+        )
+        results = block_rows(block, available_metals, model.hmpi_metals, model.get_class_labels())
+        processed_count = len(results)
         
-        for idx, row in df.iterrows():
-            try:
-                # Extract available metals for calculation
-                sample_data = {}
-                for metal in available_metals:
-                    if metal in row and not pd.isna(row[metal]):
-                        sample_data[metal] = float(row[metal])
-                    else:
-                        sample_data[metal] = 0.0
-                
-                # Preserve geographical and location data
-                geo_columns = ['latitude', 'longitude', 'Latitude', 'Longitude', 'location', 'Location', 'location_name', 'Location_Name']
-                for geo_col in geo_columns:
-                    if geo_col in row and not pd.isna(row[geo_col]):
-                        sample_data[geo_col] = row[geo_col]
-                
-                if not sample_data:
-                    continue
-                
-                # Auto-detect unit for each sample
-                detected_unit = auto_detect_unit(sample_data)
-                
-                # Calculate comprehensive indices
-                comprehensive_results = predictor.calculate_comprehensive_indices(sample_data)
-                comprehensive_results['unit_detected'] = detected_unit
-                
-                # ML Prediction
-                ml_input = []
-                for metal in predictor.hmpi_metals:
-                    ml_input.append(sample_data.get(metal, 0.0))
-                
-                ml_prediction, probabilities = predictor.predict_pollution(ml_input)
-                
-                # Prepare data for database
-                db_sample = {
-                    **sample_data,
-                    'hmpi_score': comprehensive_results['hmpi']['score'],
-                    'pli_score': comprehensive_results['pli']['score'],
-                    'pollution_level': comprehensive_results['hmpi']['level'],
-                    'unit_detected': detected_unit,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
-                
-                # Add location name if available
-                location_cols = ['location_name', 'Location', 'location', 'Location_Name']
-                for loc_col in location_cols:
-                    if loc_col in row and not pd.isna(row[loc_col]):
-                        db_sample['location_name'] = row[loc_col]
-                        break
-                else:
-                    db_sample['location_name'] = f"Batch Sample {idx + 1}"
-                
-                # Save to database
-                sample_id = db_manager.insert_sample(db_sample)
-                
-                result_row = {
-                    'sample_id': sample_id,
-                    'row_id': idx + 1,
-                    'hmpi_score': comprehensive_results['hmpi']['score'],
-                    'pli_score': comprehensive_results['pli']['score'],
-                    'pollution_level': comprehensive_results['hmpi']['level'],
-                    'pli_level': comprehensive_results['pli']['level'],
-                    'recommendation': comprehensive_results['hmpi']['recommendation'],
-                    'unit_detected': detected_unit,
-                    'ml_prediction': ml_prediction,
-                    **sample_data
-                }
-                
-                # Add contamination factors
-                for metal, cf_data in comprehensive_results['contamination_factors'].items():
-                    result_row[f'{metal}_cf'] = cf_data['cf_value']
-                    result_row[f'{metal}_cf_level'] = cf_data['level']
-                
-                results.append(result_row)
-                processed_count += 1
-                
-            except Exception as e:
-                # Skip problematic rows but continue processing
-                print(f"Error processing row {idx + 1}: {e}")
-                continue
+        # Keep the results for re-uploads once every row is saved
+        if upload_cache.enabled and processed_count == len(df):
+            store = ColumnarResultStore(available_metals, model.hmpi_metals, model.get_class_labels(),
+                                        model_version=model.model_version)
+            store.add_block(0, block)
+            await loop.run_in_executor(None, cache_upload_results, upload, store, model, len(df))
+            store.close()
         
         return FileUploadResponse(
             message=f"File processed successfully. Processed {processed_count} out of {len(df)} samples.",
             total_samples=len(df),
             processed_samples=processed_count,
             results=results,
-            available_metals=available_metals
+            available_metals=available_metals,
+            model_version=model.model_version
         )
         
     except Exception as e:
@@ -624,9 +1905,51 @@ async def upload_file(file: UploadFile = File(...)):
 
 # ... (keep the rest of your existing endpoints unchanged - get_samples, get_sample, delete_samples, statistics, export_csv, health, model-info)
 
+@app.get("/samples")
+async def get_samples(days: int = Query(30, ge=0), location: Optional[str] = None):
+    """Get stored samples with optional filtering"""
+    try:
+        samples = await async_db_manager.get_samples(days=days, location=location)
+        return {"samples": samples, "total": len(samples)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching samples: {str(e)}")
+
+@app.get("/samples/{sample_id}")
+async def get_sample(sample_id: str):
+    """Get a single stored sample"""
+    if not is_valid_sample_id(sample_id):
+        raise HTTPException(status_code=400, detail="Invalid sample ID")
+    
+    try:
+        sample = await async_db_manager.get_sample_by_id(sample_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching sample: {str(e)}")
+    
+    if not sample:
+        raise HTTPException(status_code=404, detail="Sample not found")
+    return sample
+
+@app.post("/delete-samples")
+async def delete_samples(request: DeleteRequest):
+    """Delete stored samples by option (all, date_range or selected)"""
+    try:
+        result = await async_db_manager.delete_samples(
+            request.delete_option,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            sample_ids=request.sample_ids
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting samples: {str(e)}")
+    
+    if not result['success']:
+        raise HTTPException(status_code=400, detail=result['message'])
+    return result
+
 @app.post("/batch-analyze")
-async def batch_analyze(samples: BatchProcessRequest):
-    """Analyze multiple samples in batch via JSON with auto unit detection"""
+async def batch_analyze(samples: BatchProcessRequest, mode: Optional[str] = Query(None, pattern="^(full|fast)$")):
+    """Analyze multiple samples in batch via JSON with auto unit detection (mode applies to small batches)"""
+    require_model()
     try:
         # For large batches, use async processing
         if len(samples.samples) > 100:
@@ -637,91 +1960,227 @@ async def batch_analyze(samples: BatchProcessRequest):
             df = pd.DataFrame(samples_dict)
             
             # Start background processing
-            asyncio.create_task(process_large_batch_async(job_id, df, predictor.hmpi_metals))
+            await start_frame_job(
+                job_id, df, model_registry.current.hmpi_metals, min(max(samples.priority or 1, 1), 10),
+                source=payload_source(samples_dict)
+            )
             
             return {
                 "job_id": job_id,
                 "message": f"Batch analysis started for {len(samples.samples)} samples.",
-                "status": "processing"
+                "status": "queued"
             }
         
         # Small batch - process synchronously
-        results = []
-        
+        items = []
         for sample in samples.samples:
             sample_data = sample.dict()
             unit_input = sample_data.pop('unit_input', 'Auto-detect')
-            
-            # Auto-detect unit if requested
-            if unit_input == "Auto-detect":
-                detected_unit = auto_detect_unit(sample_data)
-            else:
-                detected_unit = unit_input
-            
-            comprehensive_results = predictor.calculate_comprehensive_indices(sample_data)
+            items.append((sample_data, unit_input, mode or PREDICTION_MODE, None))
+        
+        # Scored off the event loop, like coalesced /analyze-sample requests
+        loop = asyncio.get_event_loop()
+        scored = await loop.run_in_executor(None, score_analysis_batch, items)
+        
+        results = []
+        db_samples = []
+        model_version = None
+        metals = model_registry.current.hmpi_metals
+        source = payload_source([sample.dict() for sample in samples.samples])
+        for row_id, (item, scores) in enumerate(zip(items, scored), 1):
+            sample_data = item[0]
+            comprehensive_results, ml_result, detected_unit, model_version = scores
             comprehensive_results['unit_detected'] = detected_unit
             
-            # ML Prediction
-            ml_input = []
-            for metal in predictor.hmpi_metals:
-                ml_input.append(sample_data.get(metal, 0.0))
-            
-            ml_prediction, probabilities = predictor.predict_pollution(ml_input)
-            
-            # Save to database
+            # Prepare data for database
             db_sample = {
                 **sample_data,
                 'hmpi_score': comprehensive_results['hmpi']['score'],
                 'pli_score': comprehensive_results['pli']['score'],
                 'pollution_level': comprehensive_results['hmpi']['level'],
                 'unit_detected': detected_unit,
+                'model_version': model_version,
                 'timestamp': datetime.utcnow().isoformat()
             }
-            
-            sample_id = db_manager.insert_sample(db_sample)
+            db_sample['fingerprint'] = sample_fingerprint(db_sample, metals, f"{source}:{row_id}")
+            db_samples.append(db_sample)
             
             results.append({
-                'sample_id': sample_id,
                 'analysis_results': comprehensive_results,
-                'ml_prediction': {
-                    'prediction': ml_prediction,
-                    'confidence': {predictor.label_encoder.classes_[i]: float(probabilities[i]) 
-                                 for i in range(len(probabilities))}
-                },
+                'ml_prediction': ml_result,
                 'unit_detected': detected_unit
             })
         
-        return {"results": results, "total_samples": len(results)}
+        # Save to database with bulk upserts, so a resubmitted batch updates its samples
+        outcome = await loop.run_in_executor(None, db_manager.insert_samples_bulk, db_samples)
+        if outcome['errors']:
+            raise RuntimeError(f"{outcome['failed_count']} samples could not be saved: {next(iter(outcome['errors'].values()))}")
+        for i, result in enumerate(results):
+            results[i] = {'sample_id': outcome['inserted_ids'][i], **result}
         
+        return FastJSONResponse({"results": results, "total_samples": len(results), "model_version": model_version})
+        
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error in batch analysis: {str(e)}")
+
+@app.post("/batch-analyze-columnar")
+async def batch_analyze_columnar(request: Request, standards: Optional[str] = Query(None)):
+    """
+    Analyze a columnar batch: an Arrow IPC stream (application/vnd.apache.arrow.stream)
+    or an .npz archive of NumPy arrays (application/x-npz) with one column per
+    SampleData field. Columns are validated as vectors, the samples scored as one
+    block with auto unit detection and saved, as large batches are (missing
+    values count as 0.0); results come back in the same format, one column per
+    result key. standards (comma-separated profile names) adds the indices against
+    each of those standards as <name>_hmpi_score, <name>_pollution_level, ... columns.
+    """
+    require_model()
+    try:
+        profiles = standards_registry.resolve(standards) if standards else []
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    content_type = request.headers.get('content-type', '').split(';')[0].strip()
+    model = model_registry.current
+    loop = asyncio.get_event_loop()
+    
+    body = await request.body()
+    try:
+        columns = await loop.run_in_executor(None, read_columns, body, content_type)
+        df = validated_frame(columns, model.hmpi_metals + ['latitude', 'longitude'], ['location_name', 'sample_date'])
+    except ColumnarFormatError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ColumnarPayloadError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    if not any(metal in df.columns for metal in model.hmpi_metals):
+        raise HTTPException(status_code=422, detail=f"No metal columns, expected some of {', '.join(model.hmpi_metals)}")
+    if len(df) > COLUMNAR_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {COLUMNAR_MAX_ROWS} samples per request, got {len(df)}")
+    
+    try:
+        block = await loop.run_in_executor(
+            thread_pool, score_sample_block, df, model.hmpi_metals, list(range(1, len(df) + 1)), None, block_scorer, model,
+            hashlib.sha1(body).hexdigest()
+        )
+        columns = block_columns(block, model.hmpi_metals, model.get_class_labels())
+        if profiles:
+            # Scored from the block's metal values, missing ones as 0.0 like the block's own scores
+            standard_scores = await loop.run_in_executor(
+                thread_pool, score_standards, model, block['metal_values'], profiles
+            )
+            columns.update(standards_columns(standard_scores, profiles))
+        payload = await loop.run_in_executor(None, write_columns, columns, content_type)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error in batch analysis: {str(e)}")
+    
+    return Response(content=payload, media_type=content_type, headers={"X-Model-Version": str(model.model_version)})
+
+@app.get("/standards")
+async def list_standards():
+    """
+    Standards profiles samples can be evaluated against, with their versions and
+    limits, and the limits the default scores (without a standard) use
+    """
+    default = StandardsProfile(**DEFAULT_PROFILE).describe()
+    model = model_registry.current
+    if model is not None:
+        # A loaded model scores with the limits saved with it
+        default['limits_ugL'] = model.standard_limits_ugL
+    return {'standards': standards_registry.describe_all(), 'default': default}
+
+@app.post("/evaluate-standards")
+async def evaluate_standards(request: StandardsEvaluationRequest, standards: Optional[str] = Query(None)):
+    """
+    Evaluate samples against several standards profiles at once (comma-separated
+    names, all of them by default) in one vectorized pass. Per standard, each
+    result has HMPI, PLI and total CF with their levels, the contamination
+    factors and the metals above the standard's limits. Samples are not saved.
+    """
+    require_model()
+    try:
+        profiles = standards_registry.resolve(standards)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    model = model_registry.current
+    raw = model.to_metal_matrix(pd.DataFrame([sample.dict() for sample in request.samples]))
+    loop = asyncio.get_event_loop()
+    try:
+        scores = await loop.run_in_executor(thread_pool, score_standards, model, raw, profiles)
+        results = await loop.run_in_executor(None, standards_records, scores, profiles, model.hmpi_metals)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error evaluating standards: {str(e)}")
+    
+    return FastJSONResponse({
+        'standards': [profile.describe() for profile in profiles],
+        'results': results,
+        'total_samples': len(results)
+    })
 
-# ... (keep all your other existing endpoints)
+# Embedded durable-queue worker of this API process
+embedded_worker = None
+embedded_worker_stop = None
 
-# Clean up completed jobs periodically
-@app.on_event("startup")
 async def startup_event():
-    """Initialize cleanup task on startup"""
+    """Connect to the database and start background tasks, plus a batch worker when jobs use a durable queue"""
+    global embedded_worker, embedded_worker_stop
+    # Connections and threads are created here, after a preloading server has forked this worker
+    db_manager.connect()
+    async_db_manager.connect()
+    startup_timer.mark("connect database")
+    
+    ensure_model()
     asyncio.create_task(cleanup_completed_jobs())
+    asyncio.create_task(watch_model_artifacts())
+    
+    if job_queue is not None and JOB_QUEUE_EMBEDDED_WORKER:
+        embedded_worker_stop = asyncio.Event()
+        embedded_worker = asyncio.create_task(
+            durable_worker_loop(f"api-{socket.gethostname()}-{os.getpid()}", embedded_worker_stop)
+        )
+    startup_timer.mark("start background tasks")
+    print(startup_timer.summary())
+
+async def shutdown_event():
+    """Stop batch worker processes, remove spilled job results and close database connections"""
+    if embedded_worker is not None:
+        # Running durable jobs go back to the queue and resume elsewhere
+        embedded_worker_stop.set()
+        embedded_worker.cancel()
+        await asyncio.gather(embedded_worker, return_exceptions=True)
+    if block_scorer is not None:
+        block_scorer.shutdown()
+    job_manager.clear()
+    db_manager.close()
+    async_db_manager.close()
 
 async def cleanup_completed_jobs():
-    """Clean up completed jobs older than 1 hour"""
+    """Clean up finished jobs past their retention period"""
     while True:
-        await asyncio.sleep(3600)  # Run every hour
-        current_time = datetime.utcnow()
-        jobs_to_delete = []
-        
-        for job_id, job in batch_jobs.items():
-            if job['status'] in ['completed', 'failed']:
-                end_time = job.get('end_time', job.get('start_time'))
-                if (current_time - end_time).total_seconds() > 3600:  # 1 hour
-                    jobs_to_delete.append(job_id)
+        await asyncio.sleep(60)  # Run every minute
+        removed = job_manager.cleanup()
         
-        for job_id in jobs_to_delete:
-            del batch_jobs[job_id]
+        if job_queue is not None:
+            loop = asyncio.get_event_loop()
+            try:
+                expired = await loop.run_in_executor(None, job_queue.cleanup, job_manager.retention_seconds)
+            except Exception as e:
+                print(f"Error cleaning up durable jobs: {e}")
+                expired = []
+            for job_id in expired:
+                remove_job_data(job_id)
+            removed += len(expired)
         
-        if jobs_to_delete:
-            print(f"Cleaned up {len(jobs_to_delete)} completed jobs")
+        if removed:
+            print(f"Cleaned up {removed} finished jobs")
+
+startup_timer.mark("create app")
+
+# Everything allocated during import lives as long as the process; keeping it out of the
+# collector's generations stops collections from dirtying pages shared with forked workers
+gc.freeze()
 
 if __name__ == "__main__":
     import uvicorn
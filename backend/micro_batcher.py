@@ -0,0 +1,119 @@
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item requests into one batched call.
+
+    Items submitted within window_ms of the first waiting item (up to
+    max_batch_size) are handed to process_batch together in an executor thread,
+    and each caller gets back its own entry of the returned list.
+    """
+
+    def __init__(self, process_batch: Callable[[List[Any]], List[Any]], window_ms: float = 5.0,
+                 max_batch_size: int = 64, executor=None, delay_history: int = 1000):
+        self.process_batch = process_batch
+        self.window_ms = window_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self.executor = executor
+
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self._inflight = set()
+
+        # Metrics
+        self.total_items = 0
+        self.total_batches = 0
+        self.failed_batches = 0
+        self.batch_sizes = Counter()
+        self.queue_delays_ms = deque(maxlen=delay_history)
+        self.max_queue_delay_ms = 0.0
+
+    def _ensure_worker(self):
+        """Start the collector task on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its result"""
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        """Gather items into batches and dispatch them"""
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.window_ms / 1000.0
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Score off the event loop and keep collecting the next batch meanwhile
+            task = self._loop.create_task(self._dispatch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _dispatch(self, batch):
+        """Run one batch and fan the results back out to the waiting requests"""
+        dispatched_at = time.perf_counter()
+        for _, _, queued_at in batch:
+            delay_ms = (dispatched_at - queued_at) * 1000.0
+            self.queue_delays_ms.append(delay_ms)
+            self.max_queue_delay_ms = max(self.max_queue_delay_ms, delay_ms)
+        self.total_items += len(batch)
+        self.total_batches += 1
+        self.batch_sizes[len(batch)] += 1
+
+        items = [item for item, _, _ in batch]
+        try:
+            results = await self._loop.run_in_executor(self.executor, self.process_batch, items)
+            if len(results) != len(items):
+                raise RuntimeError(f"Batch returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            self.failed_batches += 1
+            print(f"Micro-batch of {len(items)} items failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self) -> Dict:
+        """Batch-size distribution and queueing delay statistics"""
+        delays = np.array(self.queue_delays_ms) if self.queue_delays_ms else np.zeros(1)
+        return {
+            'window_ms': self.window_ms,
+            'max_batch_size': self.max_batch_size,
+            'total_items': self.total_items,
+            'total_batches': self.total_batches,
+            'failed_batches': self.failed_batches,
+            'mean_batch_size': round(self.total_items / self.total_batches, 2) if self.total_batches else 0.0,
+            'batch_size_distribution': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            'queue_delay_ms': {
+                'mean': round(float(delays.mean()), 3),
+                'p50': round(float(np.percentile(delays, 50)), 3),
+                'p95': round(float(np.percentile(delays, 95)), 3),
+                'p99': round(float(np.percentile(delays, 99)), 3),
+                'max': round(self.max_queue_delay_ms, 3)
+            },
+            'pending': self._queue.qsize() if self._queue is not None else 0
+        }
@@ -0,0 +1,128 @@
+import os
+import threading
+from typing import Dict, Tuple
+
+import numpy as np
+
+from water_quality_model import HMPI_LEVELS
+
+# ML gating: "on" runs the model only for samples whose HMPI is near a level threshold
+ML_GATE_MODE = os.getenv("ML_GATE_MODE", "off")
+# Samples within this fraction of a threshold (|hmpi - t| <= band * t) are borderline
+ML_GATE_BAND = float(os.getenv("ML_GATE_BAND", "0.5"))
+# Share of bypassed samples still run through the model to keep measuring agreement
+ML_GATE_AUDIT_RATE = float(os.getenv("ML_GATE_AUDIT_RATE", "0.02"))
+
+# HMPI level thresholds of WaterSafetyPredictor.get_pollution_level
+HMPI_THRESHOLDS = np.array([100.0, 200.0])
+# Buckets of relative distance to the nearest threshold that agreement is tracked in
+DISTANCE_EDGES = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0]
+
+def threshold_distance(hmpi: np.ndarray) -> np.ndarray:
+    """Relative distance of each HMPI to the nearest level threshold"""
+    hmpi = np.asarray(hmpi, dtype=float)
+    return np.min(np.abs(hmpi[:, None] - HMPI_THRESHOLDS) / HMPI_THRESHOLDS, axis=1)
+
+def borderline_mask(hmpi: np.ndarray, level_codes: np.ndarray, band: float) -> np.ndarray:
+    """Samples that need the model: within band of a threshold, or without an HMPI level"""
+    return (threshold_distance(hmpi) <= band) | (np.asarray(level_codes) == 0)
+
+def predict_gated(predictor, ml_matrix: np.ndarray, hmpi: np.ndarray, level_codes: np.ndarray,
+                  band: float = None, audit_rate: float = None, fast: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict]:
+    """
+    predict_pollution_batch for borderline samples only. The others take their
+    HMPI level as the prediction, with all probability on that level.
+
+    A random audit_rate share of the bypassed samples is scored as well; they and
+    the borderline samples count towards agreement between the model and the
+    HMPI level per distance bucket. Returns (labels, probabilities, gated, summary),
+    gated marking the samples that skipped the model and summary holding the
+    counts for MLGateStats.record.
+    """
+    band = ML_GATE_BAND if band is None else band
+    audit_rate = ML_GATE_AUDIT_RATE if audit_rate is None else audit_rate
+    hmpi = np.asarray(hmpi, dtype=float)
+    level_codes = np.asarray(level_codes)
+    class_labels = predictor.get_class_labels()
+    level_names = np.array([level for level, _ in HMPI_LEVELS], dtype=object)
+    index_labels = level_names[level_codes]
+
+    borderline = borderline_mask(hmpi, level_codes, band)
+    audited = ~borderline & (np.random.default_rng().random(len(borderline)) < audit_rate)
+    run_model = borderline | audited
+
+    # Bypassed samples: the HMPI level, certain
+    labels = index_labels.copy()
+    probabilities = np.zeros((len(labels), len(class_labels)))
+    for class_index, label in enumerate(class_labels):
+        probabilities[labels == label, class_index] = 1.0
+
+    rows = np.flatnonzero(run_model)
+    if len(rows):
+        model_labels, model_probabilities = predictor.predict_pollution_batch(ml_matrix[rows], fast=fast)
+        keep = borderline[rows]
+        labels[rows[keep]] = model_labels[keep]
+        probabilities[rows[keep]] = model_probabilities[keep]
+
+        # Agreement of the model with the HMPI level, wherever both are known
+        compared = level_codes[rows] != 0
+        buckets = np.searchsorted(DISTANCE_EDGES, threshold_distance(hmpi[rows][compared]), side='right')
+        agreed = model_labels[compared] == index_labels[rows][compared]
+        compared_counts = np.bincount(buckets, minlength=len(DISTANCE_EDGES) + 1)
+        agreed_counts = np.bincount(buckets[agreed], minlength=len(DISTANCE_EDGES) + 1)
+    else:
+        compared_counts = agreed_counts = np.zeros(len(DISTANCE_EDGES) + 1, dtype=np.int64)
+
+    summary = {
+        'rows': len(labels),
+        'model_rows': int(borderline.sum()),
+        'audited_rows': int(audited.sum()),
+        'compared': compared_counts.tolist(),
+        'agreed': agreed_counts.tolist()
+    }
+    return labels, probabilities, ~borderline, summary
+
+class MLGateStats:
+    """Thread-safe totals of gated predictions and model/HMPI agreement per distance bucket"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.model_rows = 0
+        self.audited_rows = 0
+        self.compared = [0] * (len(DISTANCE_EDGES) + 1)
+        self.agreed = [0] * (len(DISTANCE_EDGES) + 1)
+
+    def record(self, summary: Dict):
+        """Add the counts of one predict_gated call"""
+        with self._lock:
+            self.rows += summary['rows']
+            self.model_rows += summary['model_rows']
+            self.audited_rows += summary['audited_rows']
+            self.compared = [a + b for a, b in zip(self.compared, summary['compared'])]
+            self.agreed = [a + b for a, b in zip(self.agreed, summary['agreed'])]
+
+    def report(self) -> Dict:
+        """Bypass rate and agreement by distance to the nearest threshold, for tuning the band"""
+        edges = [0.0] + DISTANCE_EDGES + [None]
+        with self._lock:
+            buckets = []
+            for i, (compared, agreed) in enumerate(zip(self.compared, self.agreed)):
+                buckets.append({
+                    'distance_from': edges[i],
+                    'distance_to': edges[i + 1],
+                    'compared': compared,
+                    'agreement': round(agreed / compared, 4) if compared else None
+                })
+            return {
+                'mode': ML_GATE_MODE,
+                'band': ML_GATE_BAND,
+                'audit_rate': ML_GATE_AUDIT_RATE,
+                'rows': self.rows,
+                'model_rows': self.model_rows,
+                'audited_rows': self.audited_rows,
+                'bypass_rate': round(1 - (self.model_rows + self.audited_rows) / self.rows, 4) if self.rows else None,
+                'agreement_by_distance': buckets
+            }
+
+ml_gate_stats = MLGateStats()
@@ -0,0 +1,113 @@
+import os
+import threading
+from typing import Dict, Optional
+
+from water_quality_model import WaterSafetyPredictor
+
+# Seconds between checks for a newer model artifact
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "30"))
+
+class ModelRegistry:
+    """
+    The predictor serving new work, plus older model versions still in use.
+
+    Callers take one predictor at the start of a batch and use it throughout,
+    so swapping in a new version never changes a batch half way. Jobs pin
+    their version with acquire/release; a replaced version stays loaded until
+    its last job releases it. refresh() loads the artifact version named by
+    artifact_dir/LATEST in the calling thread and only then swaps it in.
+    """
+
+    def __init__(self, artifact_dir: str):
+        self.artifact_dir = artifact_dir
+        self._lock = threading.Lock()
+        self._current = None
+        self._loaded = {}  # model_version -> predictor, the current one and pinned ones
+        self._pins = {}  # model_version -> number of jobs using it
+        self.swaps = 0
+        self.last_error = None
+
+    @property
+    def current(self) -> Optional[WaterSafetyPredictor]:
+        """The predictor new requests and jobs should use"""
+        return self._current
+
+    def publish(self, predictor: WaterSafetyPredictor):
+        """Make predictor the current one; requests already scoring keep the one they took"""
+        with self._lock:
+            previous = self._current
+            self._current = predictor
+            self._loaded[predictor.model_version] = predictor
+            if previous is not None and previous.model_version != predictor.model_version:
+                self.swaps += 1
+                self._drop_if_unused(previous.model_version)
+
+    def acquire(self, model_version: Optional[str] = None) -> WaterSafetyPredictor:
+        """
+        Pin a model version (the current one by default) until release().
+        Versions that are no longer loaded are read back from their artifact.
+        """
+        with self._lock:
+            if model_version is None:
+                model_version = self._current.model_version
+            predictor = self._loaded.get(model_version)
+        if predictor is None:
+            predictor = WaterSafetyPredictor.load_artifact(os.path.join(self.artifact_dir, model_version))
+
+        with self._lock:
+            predictor = self._loaded.setdefault(model_version, predictor)
+            self._pins[model_version] = self._pins.get(model_version, 0) + 1
+        return predictor
+
+    def release(self, predictor: WaterSafetyPredictor):
+        """Unpin a version taken with acquire()"""
+        with self._lock:
+            model_version = predictor.model_version
+            self._pins[model_version] = self._pins.get(model_version, 1) - 1
+            if self._pins[model_version] <= 0:
+                del self._pins[model_version]
+                self._drop_if_unused(model_version)
+
+    def _drop_if_unused(self, model_version: Optional[str]):
+        """Forget a version that is neither current nor pinned (lock held)"""
+        if model_version not in self._pins and (self._current is None or self._current.model_version != model_version):
+            self._loaded.pop(model_version, None)
+
+    def latest_version(self) -> Optional[str]:
+        """Version named by the artifact directory's LATEST file, None if there is none"""
+        try:
+            with open(os.path.join(self.artifact_dir, "LATEST"), encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def refresh(self) -> bool:
+        """Load and swap in the latest artifact if it is not the current version, True if swapped"""
+        model_version = self.latest_version()
+        current = self._current
+        if model_version is None or (current is not None and current.model_version == model_version):
+            return False
+
+        try:
+            predictor = WaterSafetyPredictor.load_artifact(os.path.join(self.artifact_dir, model_version))
+        except Exception as e:
+            # Typically a version still being written; it is retried on the next refresh
+            self.last_error = f"{model_version}: {e}"
+            print(f"Could not load model {model_version}: {e}")
+            return False
+
+        self.publish(predictor)
+        self.last_error = None
+        print(f"Swapped in model {model_version}")
+        return True
+
+    def status(self) -> Dict:
+        """Current version, loaded and pinned versions, number of swaps"""
+        with self._lock:
+            return {
+                'current_version': self._current.model_version if self._current is not None else None,
+                'loaded_versions': sorted(str(version) for version in self._loaded),
+                'pinned_versions': {str(version): count for version, count in self._pins.items()},
+                'swaps': self.swaps,
+                'last_error': self.last_error
+            }
@@ -0,0 +1,106 @@
+import json
+from typing import Any, Dict, Optional, Set
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Top-level fields of an /analyze-sample response and the sections that can be picked from them
+ANALYSIS_FIELDS = {
+    'sample_id': set(),
+    'timestamp': set(),
+    'analysis_results': {'hmpi', 'pli', 'total_cf', 'contamination_factors', 'unit_detected', 'contributions'},
+    'ml_prediction': set(),
+    'recommendations': {'overall', 'compliance_status', 'actions'},
+    'unit_detected': set(),
+    'model_version': set()
+}
+
+# view=compact: scores, levels and the prediction, without the per-metal sections
+COMPACT_VIEW = {
+    'sample_id': None,
+    'timestamp': None,
+    'analysis_results': {'hmpi', 'pli', 'total_cf', 'unit_detected'},
+    'ml_prediction': None,
+    'recommendations': {'overall', 'compliance_status'},
+    'unit_detected': None,
+    'model_version': None
+}
+
+# Per-metal sections of an analysis record, the costly part to build and encode
+DETAIL_SECTIONS = frozenset({'contamination_factors', 'contributions'})
+
+def dumps(content: Any) -> bytes:
+    """JSON bytes of content, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """
+    JSON response for content that is already plain JSON data: it skips
+    FastAPI's response_model validation and jsonable_encoder pass.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def parse_fields(fields: Optional[str], view: Optional[str] = None) -> Optional[Dict[str, Optional[Set[str]]]]:
+    """
+    Selected fields of an /analyze-sample response: top-level field -> the
+    sections picked from it (None for all of it), or None for the full response.
+    fields is a comma-separated list of names like "ml_prediction" or
+    "analysis_results.hmpi"; it takes precedence over view.
+    """
+    if not fields:
+        return dict(COMPACT_VIEW) if view == "compact" else None
+
+    selected = {}
+    for name in fields.split(","):
+        name = name.strip()
+        if not name:
+            continue
+        field, _, section = name.partition(".")
+        if field not in ANALYSIS_FIELDS or (section and section not in ANALYSIS_FIELDS[field]):
+            raise ValueError(f"Unknown field {name!r}")
+        if not section:
+            selected[field] = None
+        elif field not in selected:
+            selected[field] = {section}
+        elif selected[field] is not None:
+            selected[field].add(section)
+    if not selected:
+        raise ValueError("fields names no field")
+    return selected
+
+def wants(selected: Optional[Dict[str, Optional[Set[str]]]], field: str, section: str = None) -> bool:
+    """Whether a selection includes a field, or one section of it"""
+    if selected is None:
+        return True
+    if field not in selected:
+        return False
+    return section is None or selected[field] is None or section in selected[field]
+
+def detail_sections(selected: Optional[Dict[str, Optional[Set[str]]]]) -> frozenset:
+    """Per-metal sections the analysis record has to be built with for a selection"""
+    sections = {section for section in DETAIL_SECTIONS if wants(selected, 'analysis_results', section)}
+    # The recommended actions are derived from the contamination factors
+    if wants(selected, 'recommendations', 'actions'):
+        sections.add('contamination_factors')
+    return frozenset(sections)
+
+def pick_fields(response: Dict, selected: Optional[Dict[str, Optional[Set[str]]]]) -> Dict:
+    """The selected fields of a response"""
+    if selected is None:
+        return response
+    picked = {}
+    for field, value in response.items():
+        if field not in selected:
+            continue
+        sections = selected[field]
+        picked[field] = value if sections is None else {key: item for key, item in value.items() if key in sections}
+    return picked
@@ -0,0 +1,375 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from water_quality_model import decode_levels, HMPI_LEVELS, PLI_LEVELS, CF_LEVELS
+
+# Spill a job's results to disk once this many rows are held in memory
+RESULT_SPILL_ROWS = int(os.getenv("RESULT_SPILL_ROWS", "50000"))
+RESULT_SPILL_DIR = os.getenv("RESULT_SPILL_DIR") or None
+
+# Arrays every result block carries, one entry per row (cf_* are rows x cf metals)
+BLOCK_ARRAYS = [
+    'row_id', 'sample_id', 'hmpi_score', 'pli_score', 'hmpi_level_code', 'pli_level_code',
+    'unit_is_mgL', 'ml_code', 'metal_values', 'cf_value', 'cf_level_code'
+]
+
+def filter_block(block: Dict, mask: np.ndarray) -> Dict:
+    """Keep only the rows of a result block selected by a boolean mask"""
+    filtered = {name: block[name][mask] for name in BLOCK_ARRAYS}
+    filtered['geo'] = {col: values[mask] for col, values in block['geo'].items()}
+    return filtered
+
+def block_rows(block: Dict, metals: List[str], cf_metals: List[str], class_labels: List[str],
+               start: int = 0, stop: Optional[int] = None, fields: Optional[List[str]] = None) -> List[Dict]:
+    """
+    Materialize rows of a result block as the per-row dicts the batch endpoints return.
+    With fields only those keys are kept, in the order given.
+    """
+    stop = len(block['row_id']) if stop is None else stop
+    window = slice(start, stop)
+
+    hmpi_levels, recommendations = decode_levels(np.asarray(block['hmpi_level_code'][window]), HMPI_LEVELS)
+    pli_levels = decode_levels(np.asarray(block['pli_level_code'][window]), PLI_LEVELS)[0]
+    cf_levels = decode_levels(np.asarray(block['cf_level_code'][window]), CF_LEVELS)[0].tolist()
+    units = np.where(block['unit_is_mgL'][window], "mg/L", "µg/L").tolist()
+    ml_predictions = np.array(class_labels, dtype=object)[np.asarray(block['ml_code'][window])].tolist()
+
+    columns = {
+        'row_id': block['row_id'][window].tolist(),
+        'sample_id': block['sample_id'][window].tolist(),
+        'hmpi_score': block['hmpi_score'][window].tolist(),
+        'pli_score': block['pli_score'][window].tolist(),
+        'metal_values': block['metal_values'][window].tolist(),
+        'cf_value': block['cf_value'][window].tolist()
+    }
+    geo_values = {col: values[window].tolist() for col, values in block['geo'].items()}
+    hmpi_levels = hmpi_levels.tolist()
+    recommendations = recommendations.tolist()
+    pli_levels = pli_levels.tolist()
+
+    rows = []
+    for i in range(stop - start):
+        row = {
+            'sample_id': columns['sample_id'][i],
+            'row_id': columns['row_id'][i],
+            'hmpi_score': columns['hmpi_score'][i],
+            'pli_score': columns['pli_score'][i],
+            'pollution_level': hmpi_levels[i],
+            'pli_level': pli_levels[i],
+            'recommendation': recommendations[i],
+            'unit_detected': units[i],
+            'ml_prediction': ml_predictions[i]
+        }
+        row.update(zip(metals, columns['metal_values'][i]))
+        for col, values in geo_values.items():
+            if not pd.isna(values[i]):
+                row[col] = values[i]
+
+        # Add contamination factors
+        for j, metal in enumerate(cf_metals):
+            row[f'{metal}_cf'] = columns['cf_value'][i][j]
+            row[f'{metal}_cf_level'] = cf_levels[i][j]
+
+        if fields is not None:
+            row = {field: row[field] for field in fields if field in row}
+        rows.append(row)
+
+    return rows
+
+def block_columns(block: Dict, cf_metals: List[str], class_labels: List[str]) -> Dict[str, np.ndarray]:
+    """
+    Result columns of a block, keyed as the rows of block_rows are (without
+    metal values and geo columns), with levels decoded to strings.
+    """
+    hmpi_levels, recommendations = decode_levels(np.asarray(block['hmpi_level_code']), HMPI_LEVELS)
+    columns = {
+        'row_id': np.asarray(block['row_id']),
+        'sample_id': np.asarray(block['sample_id']),
+        'hmpi_score': np.asarray(block['hmpi_score']),
+        'pli_score': np.asarray(block['pli_score']),
+        'pollution_level': hmpi_levels,
+        'pli_level': decode_levels(np.asarray(block['pli_level_code']), PLI_LEVELS)[0],
+        'recommendation': recommendations,
+        'unit_detected': np.where(block['unit_is_mgL'], "mg/L", "µg/L").astype(object),
+        'ml_prediction': np.array(class_labels, dtype=object)[np.asarray(block['ml_code'])]
+    }
+    cf_levels = decode_levels(np.asarray(block['cf_level_code']), CF_LEVELS)[0]
+    for j, metal in enumerate(cf_metals):
+        columns[f'{metal}_cf'] = np.asarray(block['cf_value'][:, j])
+        columns[f'{metal}_cf_level'] = cf_levels[:, j]
+    return columns
+
+def _link_or_copy(source: str, destination: str):
+    """Hard-link a file, copying it where links are not possible (e.g. across file systems)"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+class ColumnarResultStore:
+    """
+    Result rows of one batch job kept as typed column arrays.
+
+    Levels, units and ML predictions are stored as small integer codes. Blocks
+    are kept in memory until spill_rows rows are held, after which they are
+    written to .npy files and read back memory-mapped. Dicts are only built
+    when rows are read.
+
+    With a directory every block is written there straight away and the store
+    can be reopened later, by another process, with ColumnarResultStore.open.
+    model_version records the model that scored the rows.
+    """
+
+    def __init__(self, metals: List[str], cf_metals: List[str], class_labels: List[str],
+                 spill_rows: int = None, spill_dir: str = None, directory: str = None,
+                 model_version: Optional[str] = None):
+        self.metals = list(metals)
+        self.cf_metals = list(cf_metals)
+        self.class_labels = list(class_labels)
+        self.model_version = model_version
+        self.spill_rows = RESULT_SPILL_ROWS if spill_rows is None else spill_rows
+        self.spill_dir = spill_dir or RESULT_SPILL_DIR
+
+        self._lock = threading.Lock()
+        self._parts = {}  # part_id -> block dict in memory or path of a spilled block
+        self._part_rows = {}
+        self._memory_rows = 0
+        self._directory = None
+        self._persistent = directory is not None
+        self._detached = False
+
+        if self._persistent:
+            self.spill_rows = 0
+            self._directory = directory
+            os.makedirs(directory, exist_ok=True)
+            # A reopened store keeps its meta.json, which readers may be using
+            if os.path.exists(os.path.join(directory, "meta.json")):
+                return
+            with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump({
+                    'metals': self.metals, 'cf_metals': self.cf_metals, 'class_labels': self.class_labels,
+                    'model_version': self.model_version
+                }, f)
+
+    @classmethod
+    def open(cls, directory: str, keep_parts_below: Optional[int] = None) -> 'ColumnarResultStore':
+        """
+        Reopen a store written with a directory. With keep_parts_below, parts
+        from that part_id on are deleted (to resume from a checkpoint).
+        """
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(meta['metals'], meta['cf_metals'], meta['class_labels'], directory=directory,
+                    model_version=meta.get('model_version'))
+
+        for name in os.listdir(directory):
+            if not name.startswith("part_"):
+                continue
+            part_id = int(name[len("part_"):])
+            path = os.path.join(directory, name)
+            if keep_parts_below is not None and part_id >= keep_parts_below:
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            store._parts[part_id] = path
+            store._part_rows[part_id] = len(np.load(os.path.join(path, "row_id.npy"), mmap_mode='r'))
+        return store
+
+    def __len__(self):
+        with self._lock:
+            return sum(self._part_rows.values())
+
+    @property
+    def memory_rows(self) -> int:
+        """Rows currently held in memory rather than on disk"""
+        return self._memory_rows
+
+    def add_block(self, part_id: int, block: Dict):
+        """Store the result block of one chunk; parts are read back in part_id order"""
+        with self._lock:
+            if self._detached:
+                return
+            self._parts[part_id] = block
+            self._part_rows[part_id] = len(block['row_id'])
+            self._memory_rows += len(block['row_id'])
+            if self._memory_rows > self.spill_rows:
+                self._spill()
+
+    def exclude_rows(self, row_ids):
+        """Drop rows (e.g. ones that failed to save) from the stored results"""
+        excluded = np.array(sorted(row_ids), dtype=np.int64)
+        if not len(excluded):
+            return
+        with self._lock:
+            if self._detached:
+                return
+            for part_id, part in self._parts.items():
+                block = self._load(part)
+                keep = ~np.isin(block['row_id'], excluded)
+                if not keep.all():
+                    self._parts[part_id] = filter_block(block, keep)
+                    if isinstance(part, str):
+                        self._memory_rows += int(keep.sum())
+                    else:
+                        self._memory_rows -= int((~keep).sum())
+                    self._part_rows[part_id] = int(keep.sum())
+            if self._memory_rows > self.spill_rows:
+                self._spill()
+
+    def set_sample_ids(self, sample_ids: Dict):
+        """Replace the sample IDs of rows, {row_id: sample ID}, e.g. of rows that updated a sample stored before"""
+        if not sample_ids:
+            return
+        row_ids = np.array(sorted(sample_ids), dtype=np.int64)
+        with self._lock:
+            if self._detached:
+                return
+            for part_id, part in self._parts.items():
+                block = self._load(part)
+                rows = np.isin(block['row_id'], row_ids)
+                if not rows.any():
+                    continue
+                updated = filter_block(block, np.ones(len(rows), dtype=bool))
+                updated['sample_id'] = np.array(updated['sample_id'], dtype=object)
+                for index in np.flatnonzero(rows):
+                    updated['sample_id'][index] = sample_ids[int(updated['row_id'][index])]
+                self._parts[part_id] = updated
+                if isinstance(part, str):
+                    self._memory_rows += len(rows)
+            if self._memory_rows > self.spill_rows:
+                self._spill()
+
+    def detach(self):
+        """Stop writing to the store, e.g. once another worker took its directory over; later blocks are dropped"""
+        with self._lock:
+            self._detached = True
+
+    def _spill(self):
+        """Write every in-memory block to disk (lock held)"""
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="batch-results-", dir=self.spill_dir)
+
+        for part_id, part in list(self._parts.items()):
+            if isinstance(part, str):
+                continue
+            path = os.path.join(self._directory, f"part_{part_id}")
+            # Files of a part may be hard-linked into other stores, so they are replaced, never overwritten
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+            for name in BLOCK_ARRAYS:
+                np.save(os.path.join(path, f"{name}.npy"), part[name], allow_pickle=True)
+            for index, (col, values) in enumerate(part['geo'].items()):
+                np.save(os.path.join(path, f"geo_{index}.npy"), values, allow_pickle=True)
+            with open(os.path.join(path, "geo_columns.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(part['geo'].keys()))
+            self._parts[part_id] = path
+        self._memory_rows = 0
+
+    def _load(self, part) -> Dict:
+        """Return an in-memory block or open a spilled one (numeric columns memory-mapped)"""
+        if not isinstance(part, str):
+            return part
+
+        block = {}
+        for name in BLOCK_ARRAYS:
+            file_path = os.path.join(part, f"{name}.npy")
+            try:
+                block[name] = np.load(file_path, mmap_mode='r')
+            except ValueError:
+                # Object columns (sample IDs) are pickled and cannot be memory-mapped
+                block[name] = np.load(file_path, allow_pickle=True)
+
+        with open(os.path.join(part, "geo_columns.txt"), encoding="utf-8") as f:
+            geo_columns = [col for col in f.read().split("\n") if col]
+        block['geo'] = {
+            col: np.load(os.path.join(part, f"geo_{index}.npy"), allow_pickle=True)
+            for index, col in enumerate(geo_columns)
+        }
+        return block
+
+    def columns(self) -> List[str]:
+        """Every key a result row can have, in row order"""
+        with self._lock:
+            parts = [self._parts[part_id] for part_id in sorted(self._parts)]
+        geo_columns = []
+        for part in parts[:1]:
+            geo_columns = list(self._load(part)['geo'].keys())
+
+        cf_columns = []
+        for metal in self.cf_metals:
+            cf_columns.extend([f'{metal}_cf', f'{metal}_cf_level'])
+        return ['sample_id', 'row_id', 'hmpi_score', 'pli_score', 'pollution_level', 'pli_level',
+                'recommendation', 'unit_detected', 'ml_prediction'] + self.metals + geo_columns + cf_columns
+
+    def iter_rows(self, start: int = 0, stop: Optional[int] = None, batch_size: int = 1000,
+                  fields: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Yield result rows in row order, materializing batch_size rows at a time"""
+        with self._lock:
+            parts = [(self._parts[part_id], self._part_rows[part_id]) for part_id in sorted(self._parts)]
+
+        position = 0
+        for part, rows in parts:
+            if stop is not None and position >= stop:
+                return
+            if position + rows <= start:
+                position += rows
+                continue
+
+            block = self._load(part)
+            local_start = max(start - position, 0)
+            local_stop = rows if stop is None else min(stop - position, rows)
+            for offset in range(local_start, local_stop, batch_size):
+                yield from block_rows(
+                    block, self.metals, self.cf_metals, self.class_labels,
+                    offset, min(offset + batch_size, local_stop), fields
+                )
+            position += rows
+
+    def iter_blocks(self) -> Iterator[tuple]:
+        """Yield (part_id, block) in part_id order"""
+        with self._lock:
+            parts = [(part_id, self._parts[part_id]) for part_id in sorted(self._parts)]
+        for part_id, part in parts:
+            yield part_id, self._load(part)
+
+    def copy_to(self, directory: Optional[str] = None) -> 'ColumnarResultStore':
+        """
+        A copy of the stored results, persistent in directory or a store of its
+        own without one. Spilled parts are hard-linked into directory where the
+        file system allows it.
+        """
+        copy = ColumnarResultStore(self.metals, self.cf_metals, self.class_labels, directory=directory,
+                                   model_version=self.model_version)
+        with self._lock:
+            parts = [(part_id, self._parts[part_id], self._part_rows[part_id]) for part_id in sorted(self._parts)]
+
+        for part_id, part, rows in parts:
+            if directory is not None and isinstance(part, str):
+                path = os.path.join(directory, f"part_{part_id}")
+                shutil.copytree(part, path, copy_function=_link_or_copy)
+                with copy._lock:
+                    copy._parts[part_id] = path
+                    copy._part_rows[part_id] = rows
+            else:
+                copy.add_block(part_id, self._load(part))
+        return copy
+
+    def to_rows(self) -> List[Dict]:
+        """All result rows as dicts"""
+        return list(self.iter_rows())
+
+    def close(self):
+        """Release the stored blocks and remove spilled files (a store's own directory is kept)"""
+        with self._lock:
+            self._parts = {}
+            self._part_rows = {}
+            self._memory_rows = 0
+            if self._directory is not None and not self._persistent:
+                shutil.rmtree(self._directory, ignore_errors=True)
+                self._directory = None
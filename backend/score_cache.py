@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Scored rows kept for repeated metal vectors (0 disables the cache) and their lifetime
+SCORE_CACHE_SIZE = int(os.getenv("SCORE_CACHE_SIZE", "10000"))
+SCORE_CACHE_TTL = float(os.getenv("SCORE_CACHE_TTL", "3600"))
+
+def limits_fingerprint(predictor) -> str:
+    """Short hash of the standard limits a predictor scores against"""
+    limits = json.dumps(predictor.standard_limits_ugL, sort_keys=True)
+    return hashlib.sha1(limits.encode('utf-8')).hexdigest()[:12]
+
+def row_keys(matrix: np.ndarray) -> List[bytes]:
+    """One key per row: the row's float64 bytes, with -0.0 and every NaN made canonical"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float64) + 0.0
+    matrix[np.isnan(matrix)] = np.nan
+    raw = matrix.tobytes()
+    step = matrix.shape[1] * 8 if matrix.ndim == 2 else 8
+    return [raw[start:start + step] for start in range(0, len(raw), step)]
+
+def pack_rows(arrays: Dict[str, np.ndarray]) -> Tuple[tuple, List[bytes]]:
+    """
+    Pack per-row numeric arrays into one float64 record per row. Returns the
+    layout (name, row shape, dtype per array) and the records as bytes.
+    """
+    layout = tuple((name, values.shape[1:], values.dtype) for name, values in arrays.items())
+    n_rows = len(next(iter(arrays.values())))
+    packed = np.column_stack([values.reshape(n_rows, -1).astype(np.float64) for values in arrays.values()])
+    raw = np.ascontiguousarray(packed).tobytes()
+    step = packed.shape[1] * 8
+    return layout, [raw[start:start + step] for start in range(0, len(raw), step)]
+
+def unpack_rows(layout: tuple, records: List[bytes]) -> Dict[str, np.ndarray]:
+    """Arrays of pack_rows records that share one layout"""
+    packed = np.frombuffer(b''.join(records), dtype=np.float64).reshape(len(records), -1)
+    arrays, column = {}, 0
+    for name, shape, dtype in layout:
+        width = int(np.prod(shape)) if shape else 1
+        arrays[name] = packed[:, column:column + width].reshape((len(records),) + shape).astype(dtype)
+        column += width
+    return arrays
+
+class ScoreCache:
+    """
+    Bounded LRU cache of scored rows with a time to live.
+
+    Entries are keyed by a namespace (which path scored them, the model
+    version, the standard limits and the prediction settings) plus the row's
+    metal vector, so scores of one model or set of limits are never served
+    for another. Values are pack_rows records.
+    """
+
+    def __init__(self, capacity: int = None, ttl_seconds: float = None):
+        self.capacity = SCORE_CACHE_SIZE if capacity is None else capacity
+        self.ttl_seconds = SCORE_CACHE_TTL if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (namespace, key) -> (expires_at, layout, record)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def lookup(self, namespace: tuple, keys: List[bytes]) -> List[Optional[tuple]]:
+        """(layout, record) per key, None where the row is not cached"""
+        now = time.monotonic()
+        found = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((namespace, key))
+                if entry is not None and entry[0] < now:
+                    del self._entries[(namespace, key)]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    found.append(None)
+                else:
+                    self._entries.move_to_end((namespace, key))
+                    self.hits += 1
+                    found.append(entry[1:])
+        return found
+
+    def store(self, namespace: tuple, keys: List[bytes], layout: tuple, records: List[bytes]):
+        """Cache the records of freshly scored rows, evicting the least recently used ones"""
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key, record in zip(keys, records):
+                self._entries[(namespace, key)] = (expires_at, layout, record)
+                self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every entry, e.g. after the model or the standard limits changed"""
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def metrics(self) -> Dict:
+        """Size, hit rate and eviction counts"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'capacity': self.capacity,
+                'ttl_seconds': self.ttl_seconds,
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+def cached_scores(cache: ScoreCache, namespace: tuple, matrix: np.ndarray,
+                  compute: Callable[[np.ndarray], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """
+    Per-row score arrays for the rows of matrix, computing only rows not in the
+    cache, and each distinct missing row only once.
+
+    compute(rows) scores the given row positions of matrix and returns numeric
+    arrays with one entry per row; values that are not arrays (e.g. counters)
+    are passed through from the computed rows.
+    """
+    if not cache.enabled or len(matrix) == 0:
+        return compute(np.arange(len(matrix)))
+
+    keys = row_keys(matrix)
+    found = cache.lookup(namespace, keys)
+    missing = [i for i, entry in enumerate(found) if entry is None]
+
+    # Each distinct missing vector is scored once
+    first_rows = {}
+    for i in missing:
+        first_rows.setdefault(keys[i], i)
+    unique_rows = np.fromiter(first_rows.values(), dtype=np.int64, count=len(first_rows))
+    computed = compute(unique_rows) if len(unique_rows) else {}
+    arrays = {name: values for name, values in computed.items() if isinstance(values, np.ndarray)}
+    if arrays:
+        cache.store(namespace, list(first_rows), *pack_rows(arrays))
+    if len(unique_rows) == len(found):
+        return computed
+
+    present = [i for i, entry in enumerate(found) if entry is not None]
+    cached = unpack_rows(found[present[0]][0], [found[i][1] for i in present]) if present else {}
+    template = cached or arrays
+    result = {name: np.empty((len(found),) + values.shape[1:], dtype=values.dtype) for name, values in template.items()}
+    for name, values in cached.items():
+        result[name][present] = values
+    if missing:
+        position = {key: j for j, key in enumerate(first_rows)}
+        sources = np.array([position[keys[i]] for i in missing], dtype=np.int64)
+        for name, values in arrays.items():
+            result[name][missing] = values[sources]
+    for name, value in computed.items():
+        if name not in arrays:
+            result[name] = value
+    return result
+
+score_cache = ScoreCache()
@@ -0,0 +1,37 @@
+import time
+from typing import Dict
+
+class StartupTimer:
+    """
+    Wall-clock time spent in each stage of starting the API.
+
+    Created when this module is first imported, so main should import it
+    before anything else; each mark() records the time since the previous one.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.stages = []
+
+    def mark(self, stage: str) -> float:
+        """Close the current stage under the given name, returns its seconds"""
+        now = time.perf_counter()
+        seconds = now - self._last
+        self._last = now
+        self.stages.append((stage, seconds))
+        return seconds
+
+    def report(self) -> Dict:
+        """Seconds per stage in order, plus the total so far"""
+        return {
+            'stages': [{'stage': stage, 'seconds': round(seconds, 4)} for stage, seconds in self.stages],
+            'total_seconds': round(self._last - self.started, 4)
+        }
+
+    def summary(self) -> str:
+        """One-line report for the startup log"""
+        stages = ", ".join(f"{stage} {seconds:.3f}s" for stage, seconds in self.stages)
+        return f"Startup took {self._last - self.started:.3f}s ({stages})"
+
+startup_timer = StartupTimer()
@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+import pytest
+from pymongo import InsertOne
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNTIME_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+
+# Settings are read when the modules are imported: a throwaway SQLite queue and
+# data directories, no embedded worker, and fixed 100-row chunks
+os.environ.update(
+    JOB_QUEUE_BACKEND="sqlite",
+    JOB_QUEUE_PATH=os.path.join(RUNTIME_DIR, "batch_jobs.sqlite3"),
+    JOB_DATA_DIR=os.path.join(RUNTIME_DIR, "batch_jobs"),
+    JOB_QUEUE_EMBEDDED_WORKER="0",
+    JOB_POLL_INTERVAL="0.05",
+    MODEL_ARTIFACT_DIR=os.path.join(RUNTIME_DIR, "model_artifacts"),
+    UPLOAD_CACHE_DIR=os.path.join(RUNTIME_DIR, "upload_cache"),
+    BATCH_MIN_CHUNK_SIZE="100",
+    BATCH_MAX_CHUNK_SIZE="100",
+    BATCH_EXECUTION_MODE="thread"
+)
+sys.path.insert(0, BACKEND_DIR)
+# The legacy model pickle is found relative to the backend directory
+os.chdir(BACKEND_DIR)
+
+class FakeSamples:
+    """The samples collection: inserts and upserts on the fingerprint, as bulk ingestion uses them"""
+
+    def __init__(self):
+        self.documents = []
+        self.by_fingerprint = {}
+
+    def bulk_write(self, operations, ordered=True):
+        upserted_ids = {}
+        for index, operation in enumerate(operations):
+            if isinstance(operation, InsertOne):
+                self.documents.append(operation._doc)
+                continue
+            fingerprint = operation._filter['fingerprint']
+            document = self.by_fingerprint.get(fingerprint)
+            if document is None:
+                document = dict(operation._doc['$setOnInsert'])
+                self.by_fingerprint[fingerprint] = document
+                self.documents.append(document)
+                upserted_ids[index] = document['_id']
+            document.update(operation._doc['$set'])
+        return SimpleNamespace(upserted_ids=upserted_ids)
+
+    def find(self, query, projection=None):
+        fingerprints = query['fingerprint']['$in']
+        return [dict(self.by_fingerprint[fingerprint]) for fingerprint in fingerprints
+                if fingerprint in self.by_fingerprint]
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+class FakeDatabase:
+    def __init__(self):
+        self.samples = FakeSamples()
+
+@pytest.fixture(scope="session")
+def main():
+    """The API module, writing samples to an in-memory collection"""
+    import database
+    database.db_manager.db = FakeDatabase()
+    import main
+    return main
+
+@pytest.fixture
+def samples_collection(main):
+    """A fresh in-memory samples collection for the test"""
+    import database
+    database.db_manager.db = FakeDatabase()
+    return database.db_manager.db.samples
+
+@pytest.fixture
+def samples_csv(tmp_path):
+    """Write a CSV of rows random samples and return its path"""
+    import numpy as np
+    import pandas as pd
+
+    def write(rows: int, repeated: bool = False) -> str:
+        rng = np.random.default_rng(7)
+        metals = ['arsenic', 'lead', 'cadmium', 'chromium', 'mercury', 'nickel', 'copper']
+        values = rng.lognormal(-2, 2.5, size=(1 if repeated else rows, len(metals)))
+        # repeated: every row is the same reading, like a sensor reporting an unchanged vector
+        df = pd.DataFrame(np.repeat(values, rows, axis=0) if repeated else values, columns=metals)
+        path = str(tmp_path / f"samples_{rows}{'_repeated' if repeated else ''}.csv")
+        df.to_csv(path, index=False)
+        return path
+
+    return write
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from water_quality_model import WaterSafetyPredictor
+
+def tie_samples(predictor: WaterSafetyPredictor) -> list:
+    """Samples whose contamination factors and qi values sit on rounding ties"""
+    samples = []
+    for metal in predictor.hmpi_metals:
+        limit = predictor.standard_limits_ugL[metal]
+        for k in range(1, 400, 7):
+            samples.append({metal: limit * (k + 0.5) / 1000.0, 'lead': 12.0})
+            samples.append({metal: limit * (k + 0.005) / 100.0, 'arsenic': 25.0})
+    return samples
+
+def random_samples(predictor: WaterSafetyPredictor, n: int) -> list:
+    """Samples in µg/L and mg/L with some metals not measured"""
+    rng = np.random.default_rng(3)
+    samples = []
+    for _ in range(n):
+        values = rng.lognormal(0, 2.5, len(predictor.hmpi_metals))
+        samples.append({metal: float(value) for metal, value in zip(predictor.hmpi_metals, values) if rng.random() > 0.2})
+    samples.append({})
+    samples.append({metal: 0.0 for metal in predictor.hmpi_metals})
+    return samples
+
+def test_batch_indices_match_the_scalar_calculation():
+    predictor = WaterSafetyPredictor()
+    samples = tie_samples(predictor) + random_samples(predictor, 300)
+
+    batch = predictor.comprehensive_indices_records(predictor.calculate_comprehensive_indices_batch(pd.DataFrame(samples)))
+    assert len(batch) == len(samples)
+    for sample, result in zip(samples, batch):
+        assert result == predictor.calculate_comprehensive_indices(sample), sample
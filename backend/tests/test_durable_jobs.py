@@ -0,0 +1,177 @@
+import asyncio
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from result_store import ColumnarResultStore
+
+def queue_job(main, csv_path: str, rows: int) -> str:
+    """Put a CSV in a durable job's data directory and queue it"""
+    job_id = str(uuid.uuid4())
+    os.makedirs(main.job_data_dir(job_id), exist_ok=True)
+    input_path = os.path.join(main.job_data_dir(job_id), 'input.csv')
+    shutil.copy(csv_path, input_path)
+    main.job_queue.enqueue(job_id, input_path, rows)
+    return job_id
+
+def claim(main, job_id: str, worker_id: str) -> dict:
+    record = main.job_queue.claim(worker_id)
+    assert record is not None and record['job_id'] == job_id
+    return record
+
+@pytest.fixture
+def scorer(main, monkeypatch):
+    """Wrap score_sample_block; the test sets the hook called before each chunk is scored"""
+    original = main.score_sample_block
+    calls = {'hook': None}
+
+    def score_sample_block(chunk_df, available_metals, row_ids, *args, **kwargs):
+        if calls['hook'] is not None:
+            calls['hook'](row_ids)
+        return original(chunk_df, available_metals, row_ids, *args, **kwargs)
+
+    monkeypatch.setattr(main, 'score_sample_block', score_sample_block)
+    return calls
+
+def test_failed_chunk_fails_the_job_without_checkpointing_past_it(main, scorer, samples_csv):
+    job_id = queue_job(main, samples_csv(1000), 1000)
+
+    def fail_rows_301_to_400(row_ids):
+        if row_ids[0] == 301:
+            raise RuntimeError("boom")
+    scorer['hook'] = fail_rows_301_to_400
+
+    asyncio.run(main.run_durable_job(claim(main, job_id, 'worker-1'), 'worker-1'))
+
+    record = main.job_queue.get(job_id)
+    assert record['status'] == 'failed'
+    assert 'boom' in record['error']
+    assert record['row_offset'] <= 300
+    assert record['total'] == 1000
+    # The input is kept, the job can be retried
+    assert os.path.exists(record['input_path'])
+
+def test_in_process_failed_chunk_fails_the_job(main, scorer, samples_csv):
+    job_id = str(uuid.uuid4())
+    main.job_manager.create_job(job_id, 1000)
+    available_metals, reader, next_chunk = main.read_csv_chunks(samples_csv(1000))
+
+    def fail_rows_501_to_600(row_ids):
+        if row_ids[0] == 501:
+            raise RuntimeError("boom")
+    scorer['hook'] = fail_rows_501_to_600
+
+    with reader:
+        asyncio.run(main.run_chunked_job(job_id, next_chunk, available_metals))
+
+    job = main.job_manager.get(job_id)
+    assert job['status'] == 'failed'
+    assert 'boom' in job['error']
+    assert job['total'] == 1000
+
+def test_job_resumes_from_its_checkpoint(main, scorer, samples_csv):
+    job_id = queue_job(main, samples_csv(2000), 2000)
+    scored_rows = []
+
+    def slow_scoring(row_ids):
+        scored_rows.extend(row_ids)
+        time.sleep(0.2)
+    scorer['hook'] = slow_scoring
+
+    async def stop_after_checkpoint():
+        # The first worker shuts down once a checkpoint has been recorded
+        task = asyncio.ensure_future(main.run_durable_job(claim(main, job_id, 'worker-1'), 'worker-1'))
+        while main.job_queue.get(job_id)['chunk_id'] < 3:
+            assert not task.done()
+            await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(stop_after_checkpoint())
+    record = main.job_queue.get(job_id)
+    assert record['status'] == 'queued'
+    assert record['row_offset'] == record['chunk_id'] * 100
+    checkpoint = record['row_offset']
+
+    scored_rows.clear()
+    scorer['hook'] = scored_rows.extend
+    resumed = claim(main, job_id, 'worker-2')
+    assert resumed['row_offset'] == checkpoint
+    asyncio.run(main.run_durable_job(resumed, 'worker-2'))
+
+    record = main.job_queue.get(job_id)
+    assert (record['status'], record['total'], record['processed'], record['results_count']) == ('completed', 2000, 2000, 2000)
+    assert not os.path.exists(record['input_path'])
+
+    # Every row is in the results exactly once, rows before the checkpoint were not scored again
+    store = ColumnarResultStore.open(main.job_results_dir(job_id))
+    row_ids = np.concatenate([block['row_id'] for _, block in store.iter_blocks()])
+    assert sorted(row_ids.tolist()) == list(range(1, 2001))
+    assert min(scored_rows) == checkpoint + 1
+
+def test_worker_that_lost_its_lease_leaves_the_job_to_its_new_holder(main, scorer, samples_csv):
+    job_id = queue_job(main, samples_csv(2000), 2000)
+    scorer['hook'] = lambda row_ids: time.sleep(0.2)
+
+    async def lose_lease_mid_job():
+        task = asyncio.ensure_future(main.run_durable_job(claim(main, job_id, 'worker-1'), 'worker-1'))
+        while main.job_queue.get(job_id)['chunk_id'] < 3:
+            assert not task.done()
+            await asyncio.sleep(0.02)
+        # worker-1 stalls past its lease and worker-2 takes the job over
+        main.job_queue._execute("UPDATE batch_jobs SET lease_until = 0 WHERE job_id = ?", (job_id,))
+        taken_over = claim(main, job_id, 'worker-2')
+        await asyncio.wait_for(task, timeout=30)
+        return taken_over
+
+    taken_over = asyncio.run(lose_lease_mid_job())
+    record = main.job_queue.get(job_id)
+    assert (record['status'], record['worker_id']) == ('processing', 'worker-2')
+    assert os.path.exists(record['input_path'])
+
+    scorer['hook'] = None
+    asyncio.run(main.run_durable_job(taken_over, 'worker-2'))
+
+    record = main.job_queue.get(job_id)
+    assert (record['status'], record['results_count']) == ('completed', 2000)
+    store = ColumnarResultStore.open(main.job_results_dir(job_id))
+    row_ids = np.concatenate([block['row_id'] for _, block in store.iter_blocks()])
+    assert sorted(row_ids.tolist()) == list(range(1, 2001))
+
+def test_results_being_streamed_outlive_the_retention_sweep(main, samples_csv):
+    job_id = queue_job(main, samples_csv(1000), 1000)
+    asyncio.run(main.run_durable_job(claim(main, job_id, 'worker-1'), 'worker-1'))
+
+    async def stream_results(expire_while_reading: bool):
+        response = await main.get_batch_results(job_id, cursor=0, limit=None, fields="row_id", format="ndjson")
+        if expire_while_reading:
+            main.remove_job_data(job_id)
+        # Pinned until the rows are sent
+        assert os.path.exists(main.job_results_dir(job_id))
+        body = "".join([chunk async for chunk in response.body_iterator])
+        await response.background()
+        return body.splitlines()
+
+    assert len(asyncio.run(stream_results(False))) == 1000
+    assert job_id not in main.job_readers
+    assert len(asyncio.run(stream_results(True))) == 1000
+    assert job_id not in main.job_readers
+    assert not os.path.exists(main.job_data_dir(job_id))
+
+def test_abandoned_results_stream_unpins_the_job(main, samples_csv):
+    job_id = queue_job(main, samples_csv(300), 300)
+    asyncio.run(main.run_durable_job(claim(main, job_id, 'worker-1'), 'worker-1'))
+
+    async def abandon_stream():
+        response = await main.get_batch_results(job_id, cursor=0, limit=None, fields=None, format="csv")
+        main.remove_job_data(job_id)
+        assert main.job_readers[job_id] == 1
+        # The client went away before anything was sent
+
+    asyncio.run(abandon_stream())
+    assert job_id not in main.job_readers
+    assert not os.path.exists(main.job_data_dir(job_id))
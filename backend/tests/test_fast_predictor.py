@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from fast_predictor import TreeEnsembleEvaluator, measure_agreement, reference_samples
+from water_quality_model import WaterSafetyPredictor
+
+@pytest.fixture(scope="module")
+def predictor():
+    """A model trained on the synthetic training data"""
+    trained = WaterSafetyPredictor()
+    geo_dataset, y = trained.generate_sample_data(1000)
+    trained.train_model(geo_dataset[trained.hmpi_metals], y)
+    return trained
+
+def test_fast_predictions_agree_with_the_full_model(predictor):
+    samples = reference_samples(predictor.hmpi_metals, 2000)
+    full_labels, full_probabilities = predictor.predict_pollution_batch(samples)
+    fast_labels, fast_probabilities = predictor.predict_pollution_batch(samples, fast=True)
+
+    assert (fast_labels == full_labels).all()
+    np.testing.assert_allclose(fast_probabilities, full_probabilities, atol=1e-5)
+
+    agreement = measure_agreement(predictor, samples, timing_calls=5)
+    assert agreement['label_agreement'] == 1.0
+    assert agreement['max_probability_difference'] < 1e-5
+    assert agreement['rounds'] == agreement['total_rounds'] == 100
+
+def test_missing_values_take_the_default_branch(predictor):
+    booster = predictor.model.get_booster()
+    features = predictor.scaler.transform(reference_samples(predictor.hmpi_metals, 500))
+    features[np.random.default_rng(5).random(features.shape) < 0.3] = np.nan
+
+    expected = booster.predict(xgb.DMatrix(features), output_margin=True)
+    margin = TreeEnsembleEvaluator(booster).predict_margin(features)
+    np.testing.assert_allclose(margin, expected, rtol=1e-5, atol=1e-5)
+
+def test_max_rounds_keeps_the_first_boosting_rounds(predictor):
+    booster = predictor.model.get_booster()
+    features = predictor.scaler.transform(reference_samples(predictor.hmpi_metals, 500))
+
+    evaluator = TreeEnsembleEvaluator(booster, max_rounds=10)
+    assert (evaluator.rounds, evaluator.total_rounds) == (10, 100)
+    expected = booster.predict(xgb.DMatrix(features), output_margin=True, iteration_range=(0, 10))
+    np.testing.assert_allclose(evaluator.predict_margin(features), expected, rtol=1e-5, atol=1e-5)
@@ -0,0 +1,57 @@
+import time
+
+from job_queue import SQLiteJobQueue
+
+def test_expired_lease_is_reclaimed_from_checkpoint(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "queue.sqlite3"), lease_seconds=0.1)
+    queue.enqueue("job", "input.csv", 1000)
+
+    first = queue.claim("worker-1")
+    assert first['job_id'] == "job" and first['worker_id'] == "worker-1"
+    queue.checkpoint("job", "worker-1", 3, 300, 0)
+    queue.renew("job", "worker-1", 450)
+    # The lease is still held: nothing to claim
+    assert queue.claim("worker-2") is None
+
+    time.sleep(0.2)
+    second = queue.claim("worker-2")
+    assert second['job_id'] == "job" and second['worker_id'] == "worker-2"
+    # Resumes from the checkpoint, progress past it is counted again
+    assert (second['chunk_id'], second['row_offset'], second['processed']) == (3, 300, 300)
+
+    # The first worker lost the job: its renewals, checkpoints and results are ignored
+    assert queue.renew("job", "worker-1", 900) is None
+    queue.checkpoint("job", "worker-1", 9, 900, 0)
+    assert queue.finish("job", "worker-1", "completed", 1000) is False
+    record = queue.get("job")
+    assert (record['status'], record['worker_id'], record['row_offset']) == ('processing', "worker-2", 300)
+
+    assert queue.finish("job", "worker-2", "completed", 990, total=990) is True
+    record = queue.get("job")
+    assert (record['status'], record['total'], record['processed']) == ('completed', 990, 990)
+
+def test_released_job_is_claimed_again(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue("job", "input.csv", 100)
+    queue.claim("worker-1")
+    queue.checkpoint("job", "worker-1", 1, 50, 2)
+    queue.release("job", "worker-1")
+
+    record = queue.claim("worker-2")
+    assert (record['worker_id'], record['chunk_id'], record['row_offset'], record['failed_writes']) == ("worker-2", 1, 50, 2)
+
+def test_connection_is_opened_on_first_use_in_each_process(tmp_path):
+    path = tmp_path / "queue.sqlite3"
+    queue = SQLiteJobQueue(str(path))
+    # Nothing is opened when the queue is created, e.g. in a server process that forks its workers later
+    assert not path.exists()
+
+    queue.enqueue("job", "input.csv", 100)
+    first = queue._connection
+    queue.get("job")
+    assert queue._connection is first
+
+    # A forked process opens a connection of its own
+    queue._connection_pid = -1
+    assert queue.get("job")['status'] == 'queued'
+    assert queue._connection is not first
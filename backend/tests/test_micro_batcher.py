@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+def test_concurrent_requests_are_coalesced_and_get_their_own_results():
+    batches = []
+
+    def process_batch(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(process_batch, window_ms=50, max_batch_size=4)
+
+    async def submit_all():
+        return await asyncio.gather(*[batcher.submit(item) for item in range(10)])
+
+    assert asyncio.run(submit_all()) == [item * 10 for item in range(10)]
+    # Ten requests within the window in batches of at most four
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert sorted(item for batch in batches for item in batch) == list(range(10))
+    metrics = batcher.metrics()
+    assert (metrics['total_items'], metrics['total_batches'], metrics['failed_batches']) == (10, 3, 0)
+    assert metrics['batch_size_distribution'] == {'2': 1, '4': 2}
+
+def test_a_failed_batch_fails_only_its_own_callers():
+    def process_batch(items):
+        if "bad" in items:
+            raise ValueError("bad sample")
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(process_batch, window_ms=50, max_batch_size=2)
+
+    async def submit_all():
+        return await asyncio.gather(*[batcher.submit(item) for item in ["a", "bad", "c", "d"]],
+                                    return_exceptions=True)
+
+    first, bad, third, fourth = asyncio.run(submit_all())
+    # "a" was batched with "bad" and shares its error, the next batch is unaffected
+    assert isinstance(first, ValueError) and isinstance(bad, ValueError)
+    assert (third, fourth) == ("C", "D")
+    assert batcher.metrics()['failed_batches'] == 1
+
+def test_a_batch_with_missing_results_fails_its_callers():
+    batcher = MicroBatcher(lambda items: items[:-1], window_ms=50, max_batch_size=8)
+
+    async def submit_all():
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2))
+
+    with pytest.raises(RuntimeError, match="2 items"):
+        asyncio.run(submit_all())
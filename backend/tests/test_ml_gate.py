@@ -0,0 +1,68 @@
+import numpy as np
+
+from ml_gate import DISTANCE_EDGES, MLGateStats, borderline_mask, predict_gated
+
+class ModerateModel:
+    """Predicts Moderate for every sample and remembers how many it was given"""
+
+    def __init__(self):
+        self.scored = []
+
+    def get_class_labels(self):
+        return ['Critical', 'Moderate', 'Safe']
+
+    def predict_pollution_batch(self, matrix, fast=False):
+        self.scored.append(len(matrix))
+        probabilities = np.tile([0.1, 0.8, 0.1], (len(matrix), 1))
+        return np.array(['Moderate'] * len(matrix), dtype=object), probabilities
+
+# HMPI and level codes (0 No data, 1 Safe, 2 Moderate, 3 Critical)
+HMPI = np.array([10.0, 95.0, 150.0, 190.0, 600.0, 0.0])
+LEVELS = np.array([1, 1, 2, 2, 3, 0])
+
+def test_borderline_band():
+    # Within 10% of 100 or 200, and the sample without an HMPI level
+    assert borderline_mask(HMPI, LEVELS, 0.1).tolist() == [False, True, False, True, False, True]
+    assert borderline_mask(HMPI, LEVELS, 0.5).tolist() == [False, True, True, True, False, True]
+
+def test_bypassed_samples_take_their_hmpi_level():
+    model = ModerateModel()
+    labels, probabilities, gated, summary = predict_gated(model, np.zeros((6, 3)), HMPI, LEVELS, band=0.1, audit_rate=0.0)
+
+    assert gated.tolist() == [True, False, True, False, True, False]
+    assert labels.tolist() == ['Safe', 'Moderate', 'Moderate', 'Moderate', 'Critical', 'Moderate']
+    # Bypassed samples are certain of their level, the others keep the model's probabilities
+    assert probabilities[0].tolist() == [0.0, 0.0, 1.0]
+    assert probabilities[4].tolist() == [1.0, 0.0, 0.0]
+    assert probabilities[1].tolist() == [0.1, 0.8, 0.1]
+    assert model.scored == [3]
+
+    # Agreement is only counted where the HMPI level is known: 95 (Safe, disagrees) and 190 (agrees)
+    assert (summary['rows'], summary['model_rows'], summary['audited_rows']) == (6, 3, 0)
+    assert sum(summary['compared']) == 2 and sum(summary['agreed']) == 1
+    assert summary['compared'][0] == 2
+
+def test_audited_samples_are_compared_but_keep_their_hmpi_level():
+    model = ModerateModel()
+    labels, _, gated, summary = predict_gated(model, np.zeros((6, 3)), HMPI, LEVELS, band=0.1, audit_rate=1.0)
+
+    # Every bypassed sample is audited, yet still answered with its HMPI level
+    assert gated.tolist() == [True, False, True, False, True, False]
+    assert labels[[0, 2, 4]].tolist() == ['Safe', 'Moderate', 'Critical']
+    assert model.scored == [6]
+    assert (summary['model_rows'], summary['audited_rows']) == (3, 3)
+    assert sum(summary['compared']) == 5 and sum(summary['agreed']) == 2
+
+def test_stats_accumulate_bypass_rate_and_agreement_by_distance():
+    stats = MLGateStats()
+    for _ in range(2):
+        stats.record(predict_gated(ModerateModel(), np.zeros((6, 3)), HMPI, LEVELS, band=0.1, audit_rate=0.0)[3])
+
+    report = stats.report()
+    assert (report['rows'], report['model_rows'], report['audited_rows']) == (12, 6, 0)
+    assert report['bypass_rate'] == 0.5
+    buckets = report['agreement_by_distance']
+    assert len(buckets) == len(DISTANCE_EDGES) + 1
+    assert (buckets[0]['distance_from'], buckets[0]['distance_to'], buckets[-1]['distance_to']) == (0.0, 0.1, None)
+    assert (buckets[0]['compared'], buckets[0]['agreement']) == (4, 0.5)
+    assert all(bucket['agreement'] is None for bucket in buckets[1:])
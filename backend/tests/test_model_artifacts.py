@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+from water_quality_model import WaterSafetyPredictor
+
+def test_versions_saved_in_the_same_second_do_not_collide(tmp_path):
+    predictor = WaterSafetyPredictor()
+    versions = [predictor.save_artifact(str(tmp_path)) for _ in range(5)]
+    assert len(set(versions)) == 5
+
+    for version in versions:
+        assert WaterSafetyPredictor.load_artifact(str(tmp_path / version)).model_version == version
+    assert WaterSafetyPredictor.load_artifact(str(tmp_path)).model_version == versions[-1]
+    # Only the versions and LATEST are left behind
+    assert sorted(os.listdir(tmp_path)) == sorted(versions + ["LATEST"])
+
+def test_existing_version_is_not_overwritten(tmp_path):
+    predictor = WaterSafetyPredictor()
+    predictor.save_artifact(str(tmp_path), model_version="v1")
+    with pytest.raises(FileExistsError):
+        predictor.save_artifact(str(tmp_path), model_version="v1")
+    assert sorted(os.listdir(tmp_path)) == ["LATEST", "v1"]
@@ -0,0 +1,53 @@
+import numpy as np
+
+from result_store import ColumnarResultStore
+
+METALS = ['arsenic', 'lead']
+
+def make_block(first_row: int, rows: int) -> dict:
+    """A result block of rows rows numbered from first_row"""
+    return {
+        'row_id': np.arange(first_row, first_row + rows, dtype=np.int64),
+        'sample_id': np.array([f"s{i}" for i in range(first_row, first_row + rows)], dtype=object),
+        'hmpi_score': np.linspace(0, 100, rows),
+        'pli_score': np.ones(rows),
+        'hmpi_level_code': np.zeros(rows, dtype=np.int8),
+        'pli_level_code': np.zeros(rows, dtype=np.int8),
+        'unit_is_mgL': np.zeros(rows, dtype=bool),
+        'ml_code': np.zeros(rows, dtype=np.int16),
+        'metal_values': np.ones((rows, len(METALS))),
+        'cf_value': np.ones((rows, len(METALS))),
+        'cf_level_code': np.zeros((rows, len(METALS)), dtype=np.int8),
+        'geo': {'location': np.array([f"site {i}" for i in range(first_row, first_row + rows)], dtype=object)}
+    }
+
+def test_exclude_rows_from_spilled_store(tmp_path):
+    store = ColumnarResultStore(METALS, METALS, ['Safe'], spill_rows=15, spill_dir=str(tmp_path))
+    for part_id in range(4):
+        store.add_block(part_id, make_block(part_id * 10 + 1, 10))
+    # Parts past spill_rows went to disk
+    assert store.memory_rows < 40
+
+    store.exclude_rows({3, 12, 13, 40})
+    assert len(store) == 36
+
+    rows = store.to_rows()
+    assert [row['row_id'] for row in rows] == [i for i in range(1, 41) if i not in (3, 12, 13, 40)]
+    assert rows[2]['sample_id'] == "s4" and rows[2]['location'] == "site 4"
+    assert store.memory_rows <= 15
+
+    # Excluding rows again (or ones already gone) leaves the rest in place
+    store.exclude_rows({3, 20})
+    assert len(store) == 35
+    store.close()
+
+def test_exclude_rows_from_persistent_store_survives_reopen(tmp_path):
+    directory = str(tmp_path / "results")
+    store = ColumnarResultStore(METALS, METALS, ['Safe'], directory=directory)
+    store.add_block(0, make_block(1, 10))
+    store.add_block(1, make_block(11, 10))
+    store.exclude_rows({5, 15})
+
+    reopened = ColumnarResultStore.open(directory)
+    assert len(reopened) == 18
+    assert 5 not in [row['row_id'] for row in reopened.to_rows()]
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import uuid
+
+from bson.objectid import ObjectId
+
+from database import sample_fingerprint
+
+METALS = ['arsenic', 'lead']
+
+def test_undated_samples_are_told_apart_by_their_source_row():
+    reading = {'arsenic': 12.0, 'lead': 3.0, 'location_name': "Well 4"}
+    first = sample_fingerprint(reading, METALS, "upload:1")
+    assert first == sample_fingerprint(dict(reading), METALS, "upload:1")
+    assert first != sample_fingerprint(reading, METALS, "upload:2")
+    # Without a sampling time or a source the sample cannot be told apart from repeated readings
+    assert sample_fingerprint(reading, METALS) is None
+
+def test_dated_samples_are_identified_by_their_content():
+    reading = {'arsenic': 12.0, 'lead': 3.0, 'location_name': "Well 4", 'sample_date': "2024-03-01"}
+    assert sample_fingerprint(reading, METALS, "upload:1") == sample_fingerprint(reading, METALS, "other:7")
+    assert sample_fingerprint(reading, METALS) != sample_fingerprint({**reading, 'sample_date': "2024-03-02"}, METALS)
+
+def test_saving_samples_again_keeps_their_ids(main, samples_collection):
+    def samples():
+        reading = {'arsenic': 12.0, 'lead': 3.0}
+        return [{**reading, 'fingerprint': sample_fingerprint(reading, METALS, f"batch:{row}")} for row in range(1, 4)]
+
+    first = main.db_manager.insert_samples_bulk(samples())
+    retried = main.db_manager.insert_samples_bulk(samples())
+    assert retried['inserted_ids'] == first['inserted_ids']
+    assert len(samples_collection.documents) == 3
+
+    # IDs are plain ObjectIds: their timestamp is when the sample was first saved
+    for sample_id in first['inserted_ids'].values():
+        assert abs(ObjectId(sample_id).generation_time.timestamp() - time.time()) < 60
+
+def run_upload_job(main, path: str, upload: dict) -> list:
+    """Run an in-process job over a CSV upload, returns its result rows"""
+    job_id = str(uuid.uuid4())
+    main.job_manager.create_job(job_id, 300)
+    available_metals, reader, next_chunk = main.read_csv_chunks(path)
+    with reader:
+        asyncio.run(main.run_chunked_job(job_id, next_chunk, available_metals, upload))
+    job = main.job_manager.get(job_id)
+    assert job['status'] == 'completed'
+    return job['results'].to_rows()
+
+def test_repeated_undated_readings_are_kept_and_a_retry_updates_them(main, samples_collection, samples_csv):
+    path = samples_csv(300, repeated=True)
+    upload = {'content_hash': "repeated-readings", 'parser': 'stream', 'file_ext': 'csv'}
+
+    first = run_upload_job(main, path, upload)
+    # Identical undated readings are distinct samples, one per row
+    assert len(samples_collection.documents) == 300
+    assert len({row['sample_id'] for row in first}) == 300
+
+    retried = run_upload_job(main, path, upload)
+    assert len(samples_collection.documents) == 300
+    assert [row['sample_id'] for row in retried] == [row['sample_id'] for row in first]
+
+    # The same readings uploaded in another file are other samples
+    run_upload_job(main, path, {**upload, 'content_hash': "another-file"})
+    assert len(samples_collection.documents) == 600
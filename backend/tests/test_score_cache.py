@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+
+from score_cache import ScoreCache, cached_scores, pack_rows, row_keys
+
+# Rows 0 and 2 are the same vector, so are rows 3 and 4 (-0.0 and 0.0)
+matrix = np.array([[1.0, 2.0], [3.0, np.nan], [1.0, 2.0], [-0.0, 5.0], [0.0, 5.0]])
+
+def scorer(calls: list):
+    """compute() for cached_scores: twice the row sum, recording which rows it scored"""
+    def compute(rows):
+        calls.append(rows.tolist())
+        return {'score': matrix[rows].sum(axis=1) * 2, 'level': (matrix[rows][:, 0] > 1).astype(np.int8)}
+    return compute
+
+def test_repeated_rows_are_scored_once_and_then_served_from_the_cache():
+    cache = ScoreCache(capacity=100, ttl_seconds=60)
+    calls = []
+    first = cached_scores(cache, ('analysis', 'v1'), matrix, scorer(calls))
+    # Identical vectors (also -0.0 and 0.0) are scored once
+    assert calls == [[0, 1, 3]]
+    np.testing.assert_array_equal(first['score'][[0, 2]], [6.0, 6.0])
+    assert first['level'].dtype == np.int8
+
+    again = cached_scores(cache, ('analysis', 'v1'), matrix, scorer(calls))
+    assert len(calls) == 1
+    for name in first:
+        np.testing.assert_array_equal(again[name], first[name])
+        assert again[name].dtype == first[name].dtype
+
+    # Another namespace (e.g. another model version) does not see these entries
+    cached_scores(cache, ('analysis', 'v2'), matrix, scorer(calls))
+    assert calls[-1] == [0, 1, 3]
+
+def test_least_recently_used_rows_are_evicted():
+    cache = ScoreCache(capacity=2, ttl_seconds=60)
+    keys = row_keys(np.array([[1.0], [2.0], [3.0]]))
+    layout, records = pack_rows({'score': np.array([10.0, 20.0, 30.0])})
+    cache.store('ns', keys[:2], layout, records[:2])
+    # Using the first row makes the second the least recently used
+    assert cache.lookup('ns', keys[:1])[0] is not None
+    cache.store('ns', keys[2:], layout, records[2:])
+
+    assert [entry is not None for entry in cache.lookup('ns', keys)] == [True, False, True]
+    assert cache.metrics()['evictions'] == 1
+
+def test_expired_rows_are_scored_again():
+    cache = ScoreCache(capacity=100, ttl_seconds=0.05)
+    calls = []
+    cached_scores(cache, 'ns', matrix, scorer(calls))
+    time.sleep(0.1)
+    cached_scores(cache, 'ns', matrix, scorer(calls))
+    assert calls == [[0, 1, 3], [0, 1, 3]]
+    assert cache.metrics()['expirations'] == 3
+
+def test_publishing_a_model_clears_the_cache(main):
+    calls = []
+    main.score_cache.clear()
+    namespace = main.score_cache_namespace('analysis', main.model_registry.current, 'full')
+    cached_scores(main.score_cache, namespace, matrix, scorer(calls))
+    assert main.score_cache.metrics()['size'] == 3
+    invalidations = main.score_cache.metrics()['invalidations']
+
+    # A training run publishes a new version, the watcher swaps it in
+    version = main.model_registry.current.save_artifact(main.MODEL_ARTIFACT_DIR)
+    assert main.refresh_model()
+    assert main.model_registry.current.model_version == version
+    metrics = main.score_cache.metrics()
+    assert (metrics['size'], metrics['invalidations']) == (0, invalidations + 1)
+    # Rows of the new model are namespaced by its version
+    assert main.score_cache_namespace('analysis', main.model_registry.current, 'full') != namespace
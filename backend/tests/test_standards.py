@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from standards import DEFAULT_PROFILE, StandardsProfile, standards_registry
+from water_quality_model import PROFILE_INDEX_FIELDS, WaterSafetyPredictor
+
+def sample_matrix(predictor: WaterSafetyPredictor) -> np.ndarray:
+    """Samples in µg/L and mg/L, with missing metals and readings at zero"""
+    rng = np.random.default_rng(11)
+    raw = rng.lognormal(1, 2.5, size=(200, len(predictor.hmpi_metals)))
+    raw[:50] /= 1000.0
+    raw[rng.random(raw.shape) < 0.1] = np.nan
+    raw[rng.random(raw.shape) < 0.05] = 0.0
+    return raw
+
+def test_default_limits_are_the_default_profile():
+    predictor = WaterSafetyPredictor()
+    assert predictor.standard_limits_ugL == DEFAULT_PROFILE['limits_ugL']
+    # The default scores differ from BIS only in copper
+    bis = standards_registry.resolve("BIS")[0]
+    assert {metal for metal, limit in bis.limits_ugL.items() if predictor.standard_limits_ugL[metal] != limit} == {'copper'}
+
+@pytest.mark.parametrize("name", ["BIS", "WHO", "Default"])
+def test_single_standard_matches_the_default_path_with_its_limits(name):
+    if name == "Default":
+        profile = StandardsProfile(**DEFAULT_PROFILE)
+    else:
+        profile = standards_registry.resolve(name)[0]
+    predictor = WaterSafetyPredictor()
+    predictor.standard_limits_ugL = dict(profile.limits_ugL)
+    raw = sample_matrix(predictor)
+
+    expected = predictor.calculate_index_arrays(raw)
+    limits = standards_registry.limits_matrix([profile], predictor.hmpi_metals)
+    arrays = predictor.calculate_standards_arrays(raw, limits)
+
+    assert set(arrays) == set(expected)
+    for key, values in arrays.items():
+        if key in PROFILE_INDEX_FIELDS:
+            assert values.shape[1] == 1
+            values = values[:, 0]
+        np.testing.assert_array_equal(values, expected[key], err_msg=key)
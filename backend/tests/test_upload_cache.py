@@ -0,0 +1,66 @@
+import os
+
+from result_store import ColumnarResultStore
+from test_result_store import METALS, make_block
+from upload_cache import UploadResultCache
+
+def results(rows: int) -> ColumnarResultStore:
+    store = ColumnarResultStore(METALS, METALS, ['Safe'], model_version="v1")
+    store.add_block(0, make_block(1, rows))
+    return store
+
+def age_entry(cache: UploadResultCache, key: str, seconds_ago: float):
+    """Set when an entry was last used"""
+    entry = os.path.join(cache.directory, key, "entry.json")
+    used = os.path.getmtime(entry) - seconds_ago
+    os.utime(entry, (used, used))
+
+def test_key_depends_on_content_and_how_it_was_scored():
+    key = UploadResultCache.key("abc", ('upload', "v1", "limits", 'stream', 'csv'))
+    assert key == UploadResultCache.key("abc", ('upload', "v1", "limits", 'stream', 'csv'))
+    assert key != UploadResultCache.key("abd", ('upload', "v1", "limits", 'stream', 'csv'))
+    assert key != UploadResultCache.key("abc", ('upload', "v2", "limits", 'stream', 'csv'))
+    assert key != UploadResultCache.key("abc", ('upload', "v1", "limits", 'frame', 'xlsx'))
+
+def test_upload_key_changes_with_the_model(main):
+    upload = {'content_hash': "abc", 'parser': 'stream', 'file_ext': 'csv'}
+    model = main.model_registry.current
+    key = main.upload_cache_key(upload, model)
+    assert key == main.upload_cache_key(dict(upload), model)
+    assert key != main.upload_cache_key({**upload, 'parser': 'frame'}, model)
+
+    other = main.WaterSafetyPredictor()
+    other.model_version = "another-version"
+    assert key != main.upload_cache_key(upload, other)
+
+def test_stored_results_are_served_back(tmp_path):
+    cache = UploadResultCache(str(tmp_path), max_bytes=10 ** 9)
+    assert cache.lookup("missing") is None
+    cache.store("entry", results(25), {'total_samples': 25})
+
+    info, store = cache.lookup("entry")
+    assert (info['total_samples'], info['rows'], info['model_version']) == (25, 25, "v1")
+    assert [row['row_id'] for row in store.to_rows()] == list(range(1, 26))
+    # Storing again under the same key keeps the first entry
+    cache.store("entry", results(5), {'total_samples': 5})
+    assert cache.lookup("entry")[0]['total_samples'] == 25
+    assert (cache.metrics()['hits'], cache.metrics()['misses'], cache.metrics()['stores']) == (2, 1, 1)
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = UploadResultCache(str(tmp_path), max_bytes=10 ** 9)
+    cache.store("first", results(50), {})
+    entry_bytes = cache.metrics()['bytes']
+    # Room for two entries
+    cache.max_bytes = int(entry_bytes * 2.5)
+
+    cache.store("second", results(50), {})
+    age_entry(cache, "first", 20)
+    age_entry(cache, "second", 10)
+    # Using the first entry makes the second the least recently used one
+    assert cache.lookup("first") is not None
+    cache.store("third", results(50), {})
+
+    assert sorted(os.listdir(tmp_path)) == ["first", "third"]
+    metrics = cache.metrics()
+    assert (metrics['entries'], metrics['evictions']) == (2, 1)
+    assert metrics['bytes'] <= cache.max_bytes
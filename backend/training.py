@@ -0,0 +1,275 @@
+"""
+Train the water safety model on the labelled samples stored in MongoDB.
+
+Samples are streamed from the samples collection in batches into an XGBoost
+QuantileDMatrix, or an external-memory DMatrix with --external-memory, so
+the raw rows never have to fit in memory. Training uses the hist tree
+method on all cores with early stopping on a held-out slice of the samples.
+The model is written as a new artifact version; running APIs keep serving
+their current model, so run this as its own process:
+
+    python training.py --max-rounds 1000 --early-stopping 20
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from water_quality_model import WaterSafetyPredictor, HMPI_LEVELS
+
+MODEL_ARTIFACT_DIR = os.getenv("MODEL_ARTIFACT_DIR", "model_artifacts")
+TRAINING_BATCH_ROWS = int(os.getenv("TRAINING_BATCH_ROWS", "100000"))
+TRAINING_THREADS = int(os.getenv("TRAINING_THREADS", str(os.cpu_count() or 1)))
+# Every Nth sample is held out for validation and early stopping, up to a cap
+TRAINING_VALIDATION_EVERY = int(os.getenv("TRAINING_VALIDATION_EVERY", "10"))
+TRAINING_MAX_VALIDATION_ROWS = int(os.getenv("TRAINING_MAX_VALIDATION_ROWS", "200000"))
+
+# Labels the model learns: every HMPI level except "No data"
+TRAINING_LABELS = [level for level, _ in HMPI_LEVELS[1:]]
+
+def sample_arrays(docs: List[Dict], metals: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Feature matrix (missing or unreadable values as 0.0, as at prediction time) and labels"""
+    frame = pd.DataFrame.from_records(docs, columns=metals + ['pollution_level'])
+    features = frame[metals].apply(pd.to_numeric, errors='coerce').fillna(0.0).to_numpy(dtype=float)
+    return features, frame['pollution_level'].to_numpy(dtype=object)
+
+def iter_sample_batches(collection, metals: List[str], batch_rows: int = None, query: Optional[Dict] = None,
+                        limit: Optional[int] = None) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Yield (features, labels) of labelled samples in _id order, batch_rows at a time"""
+    batch_rows = batch_rows or TRAINING_BATCH_ROWS
+    query = {**(query or {}), 'pollution_level': {'$in': TRAINING_LABELS}}
+    projection = {metal: 1 for metal in metals}
+    projection.update({'pollution_level': 1, '_id': 0})
+
+    cursor = collection.find(query, projection).sort('_id', 1).batch_size(min(batch_rows, 10000))
+    if limit:
+        cursor = cursor.limit(limit)
+
+    docs = []
+    for doc in cursor:
+        docs.append(doc)
+        if len(docs) >= batch_rows:
+            yield sample_arrays(docs, metals)
+            docs = []
+    if docs:
+        yield sample_arrays(docs, metals)
+
+def split_mask(start: int, rows: int, validation_every: int) -> np.ndarray:
+    """True for the validation rows among stream positions start..start+rows"""
+    if validation_every <= 0:
+        return np.zeros(rows, dtype=bool)
+    return (np.arange(start, start + rows) % validation_every) == 0
+
+class SampleIterator(xgb.DataIter):
+    """Feed the training part of the sample stream to XGBoost one batch at a time"""
+
+    def __init__(self, batches, scaler: StandardScaler, classes: List[str], validation_every: int,
+                 cache_prefix: Optional[str] = None):
+        self.batches = batches  # callable returning a fresh batch iterator
+        self.scaler = scaler
+        self.classes = np.asarray(classes, dtype=object)
+        self.validation_every = validation_every
+        self._iterator = None
+        self._position = 0
+        super().__init__(cache_prefix=cache_prefix)
+
+    def next(self, input_data) -> int:
+        if self._iterator is None:
+            self._iterator = self.batches()
+        for features, labels in self._iterator:
+            train = ~split_mask(self._position, len(labels), self.validation_every)
+            self._position += len(labels)
+            if not train.any():
+                continue
+            input_data(
+                data=self.scaler.transform(features[train]).astype(np.float32),
+                label=np.searchsorted(self.classes, labels[train])
+            )
+            return 1
+        return 0
+
+    def reset(self):
+        self._iterator = None
+        self._position = 0
+
+def scan_samples(batches, validation_every: int, max_validation_rows: int):
+    """
+    First pass over the stream: fit the scaler on the training rows, count
+    labels and keep the (capped) validation rows in memory.
+    """
+    scaler = StandardScaler()
+    label_counts = {}
+    validation_features, validation_labels = [], []
+    validation_rows = 0
+    position = 0
+
+    for features, labels in batches():
+        validation = split_mask(position, len(labels), validation_every)
+        position += len(labels)
+        if (~validation).any():
+            scaler.partial_fit(features[~validation])
+            for label, count in zip(*np.unique(labels[~validation].astype(str), return_counts=True)):
+                label_counts[str(label)] = label_counts.get(str(label), 0) + int(count)
+        if validation.any() and validation_rows < max_validation_rows:
+            keep = np.flatnonzero(validation)[:max_validation_rows - validation_rows]
+            validation_features.append(features[keep])
+            validation_labels.append(labels[keep])
+            validation_rows += len(keep)
+
+    if validation_features:
+        validation_set = (np.concatenate(validation_features), np.concatenate(validation_labels))
+    else:
+        validation_set = None
+    return scaler, label_counts, validation_set
+
+def train_from_samples(collection, metals: List[str], artifact_dir: str = None, max_rounds: int = 1000,
+                       early_stopping_rounds: int = 20, max_depth: int = 6, learning_rate: float = 0.1,
+                       max_bin: int = 256, threads: int = None, batch_rows: int = None,
+                       validation_every: int = None, external_memory_dir: Optional[str] = None,
+                       query: Optional[Dict] = None, limit: Optional[int] = None,
+                       base: Optional[WaterSafetyPredictor] = None) -> WaterSafetyPredictor:
+    """
+    Train a model on the samples in collection and save it as a new artifact
+    version under artifact_dir. base supplies the standard limits of the new
+    model (defaults of WaterSafetyPredictor otherwise). Returns the predictor.
+    """
+    artifact_dir = artifact_dir or MODEL_ARTIFACT_DIR
+    threads = threads or TRAINING_THREADS
+    validation_every = TRAINING_VALIDATION_EVERY if validation_every is None else validation_every
+    started = time.perf_counter()
+
+    def batches():
+        return iter_sample_batches(collection, metals, batch_rows, query, limit)
+
+    scaler, label_counts, validation_set = scan_samples(batches, validation_every, TRAINING_MAX_VALIDATION_ROWS)
+    training_rows = sum(label_counts.values())
+    if len(label_counts) < 2:
+        raise ValueError(f"Need labelled samples of at least two pollution levels, found {label_counts or 'none'}")
+    classes = sorted(label_counts)
+    print(f"Training on {training_rows} samples {label_counts}, "
+          f"{0 if validation_set is None else len(validation_set[1])} held out for validation")
+
+    cache_dir = None
+    if external_memory_dir:
+        os.makedirs(external_memory_dir, exist_ok=True)
+        cache_dir = tempfile.mkdtemp(prefix="xgb-cache-", dir=external_memory_dir)
+    iterator = SampleIterator(batches, scaler, classes, validation_every,
+                              cache_prefix=os.path.join(cache_dir, "samples") if cache_dir else None)
+    if cache_dir:
+        # Pages of the quantized data are written to disk and read back per iteration
+        dtrain = xgb.DMatrix(iterator, nthread=threads)
+    else:
+        dtrain = xgb.QuantileDMatrix(iterator, max_bin=max_bin, nthread=threads)
+
+    params = {
+        'objective': 'multi:softprob',
+        'num_class': len(classes),
+        'tree_method': 'hist',
+        'max_bin': max_bin,
+        'max_depth': max_depth,
+        'learning_rate': learning_rate,
+        'eval_metric': 'mlogloss',
+        'nthread': threads,
+        'seed': 42
+    }
+    evals = []
+    dvalidation = None
+    if validation_set is not None:
+        features, labels = validation_set
+        known = np.isin(labels, classes)
+        dvalidation = xgb.DMatrix(
+            scaler.transform(features[known]).astype(np.float32),
+            label=np.searchsorted(np.asarray(classes, dtype=object), labels[known]),
+            nthread=threads
+        )
+        evals = [(dvalidation, 'validation')]
+
+    try:
+        booster = xgb.train(
+            params, dtrain, num_boost_round=max_rounds, evals=evals,
+            early_stopping_rounds=early_stopping_rounds if evals else None, verbose_eval=50
+        )
+    finally:
+        del dtrain
+        if cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    if evals and booster.best_iteration + 1 < booster.num_boosted_rounds():
+        booster = booster[:booster.best_iteration + 1]
+
+    validation_accuracy = None
+    if dvalidation is not None:
+        predicted = np.argmax(booster.predict(dvalidation), axis=1)
+        validation_accuracy = float(np.mean(predicted == dvalidation.get_label().astype(int)))
+
+    predictor = WaterSafetyPredictor()
+    if base is not None:
+        predictor.standard_limits_ugL = base.standard_limits_ugL
+        predictor.standard_limits_mgL = base.standard_limits_mgL
+        predictor.weights_ugL = base.weights_ugL
+        predictor.weights_mgL = base.weights_mgL
+    predictor.hmpi_metals = list(metals)
+    predictor.scaler = scaler
+    predictor.label_encoder = LabelEncoder().fit(classes)
+    predictor.model = xgb.XGBClassifier()
+    predictor.model.load_model(bytearray(booster.save_raw('ubj')))
+
+    seconds = time.perf_counter() - started
+    predictor.model_version = predictor.save_artifact(artifact_dir, training={
+        'source': 'samples',
+        'trained_at': datetime.utcnow().isoformat(),
+        'training_rows': training_rows,
+        'validation_rows': 0 if validation_set is None else int(dvalidation.num_row()),
+        'label_counts': label_counts,
+        'rounds': booster.num_boosted_rounds(),
+        'validation_accuracy': validation_accuracy,
+        'external_memory': cache_dir is not None,
+        'params': params,
+        'seconds': round(seconds, 2)
+    })
+    print(f"Model {predictor.model_version} trained in {seconds:.1f}s with {booster.num_boosted_rounds()} rounds"
+          + (f", validation accuracy {validation_accuracy:.3f}" if validation_accuracy is not None else ""))
+    return predictor
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the water safety model on stored samples")
+    parser.add_argument("--artifact-dir", default=MODEL_ARTIFACT_DIR)
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    parser.add_argument("--early-stopping", type=int, default=20)
+    parser.add_argument("--max-depth", type=int, default=6)
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument("--max-bin", type=int, default=256)
+    parser.add_argument("--threads", type=int, default=TRAINING_THREADS)
+    parser.add_argument("--batch-rows", type=int, default=TRAINING_BATCH_ROWS)
+    parser.add_argument("--external-memory", metavar="CACHE_DIR", default=None,
+                        help="Keep the quantized training data in this directory instead of memory")
+    parser.add_argument("--days", type=int, default=None, help="Only samples stored in the last DAYS days")
+    parser.add_argument("--limit", type=int, default=None, help="Train on at most LIMIT samples")
+    args = parser.parse_args()
+
+    # The current model decides the features and standard limits of the new one
+    try:
+        base = WaterSafetyPredictor.load_artifact(args.artifact_dir)
+    except Exception:
+        base = WaterSafetyPredictor()
+    query = {'created_at': {'$gte': datetime.utcnow() - timedelta(days=args.days)}} if args.days else None
+
+    from database import db_manager
+    train_from_samples(
+        db_manager.db.samples, base.hmpi_metals, args.artifact_dir,
+        max_rounds=args.max_rounds, early_stopping_rounds=args.early_stopping,
+        max_depth=args.max_depth, learning_rate=args.learning_rate, max_bin=args.max_bin,
+        threads=args.threads, batch_rows=args.batch_rows, external_memory_dir=args.external_memory,
+        query=query, limit=args.limit, base=base
+    )
+    db_manager.close()
+
+if __name__ == "__main__":
+    main()
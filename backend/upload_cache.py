@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from result_store import ColumnarResultStore
+
+# Results of previously processed uploads kept on disk, bounded by size (0 disables the cache)
+UPLOAD_CACHE_DIR = os.getenv("UPLOAD_CACHE_DIR", "upload_cache")
+UPLOAD_CACHE_MAX_BYTES = int(os.getenv("UPLOAD_CACHE_MAX_BYTES", str(1024 ** 3)))
+# Re-uploads served from the cache: "skip" returns the stored samples, "insert" writes them to the
+# database again (upserted on their fingerprints, refreshing the stored samples)
+UPLOAD_CACHE_DUPLICATES = os.getenv("UPLOAD_CACHE_DUPLICATES", "skip")
+
+def hash_file(file_obj, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file object's content, read block by block and rewound afterwards"""
+    hasher = hashlib.sha256()
+    while True:
+        block = file_obj.read(block_size)
+        if not block:
+            break
+        hasher.update(block)
+    file_obj.seek(0)
+    return hasher.hexdigest()
+
+class UploadResultCache:
+    """
+    Bounded on-disk cache of the scored results of uploaded files.
+
+    Entries are keyed by the upload's content hash plus a namespace naming how
+    the file was parsed, the model version, the standard limits and the scoring
+    settings, so results are only served for identical input scored the same
+    way. Each entry is a directory holding entry.json and a persistent
+    ColumnarResultStore; the least recently used entries are removed once the
+    cache grows beyond max_bytes.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = directory or UPLOAD_CACHE_DIR
+        self.max_bytes = UPLOAD_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(content_hash: str, namespace: tuple) -> str:
+        """Entry name for an upload's content scored under namespace"""
+        raw = json.dumps([content_hash, list(namespace)], default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Tuple[Dict, ColumnarResultStore]]:
+        """(entry info, stored results) of a cached upload, None on a miss"""
+        path = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(path, "entry.json"), encoding="utf-8") as f:
+                info = json.load(f)
+            store = ColumnarResultStore.open(os.path.join(path, "results"))
+            # The entry's modification time orders entries for eviction
+            os.utime(os.path.join(path, "entry.json"))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return info, store
+
+    def store(self, key: str, results: ColumnarResultStore, info: Dict):
+        """Keep a copy of an upload's results; an entry already present for key is left as it is"""
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, key)
+        if os.path.exists(path):
+            return
+
+        # Entries are written next to the cache and renamed into place once complete
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.directory)
+        try:
+            results.copy_to(os.path.join(staging, "results")).close()
+            with open(os.path.join(staging, "entry.json"), "w", encoding="utf-8") as f:
+                json.dump({**info, 'rows': len(results), 'model_version': results.model_version,
+                           'created_at': time.time()}, f)
+            os.rename(staging, path)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.exists(path):
+                raise
+            return
+
+        with self._lock:
+            self.stores += 1
+        self._evict()
+
+    def _entries(self) -> list:
+        """(last used, bytes, path) of every complete entry"""
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("."):
+                continue
+            try:
+                used = os.path.getmtime(os.path.join(path, "entry.json"))
+                size = 0
+                for root, _, files in os.walk(path):
+                    size += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+            except OSError:
+                # Removed while being measured
+                continue
+            entries.append((used, size, path))
+        return entries
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                self.evictions += 1
+
+    def metrics(self) -> Dict:
+        """Size on disk, hit rate and eviction counts"""
+        entries = self._entries() if os.path.isdir(self.directory) else []
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'max_bytes': self.max_bytes,
+                'bytes': sum(size for _, size, _ in entries),
+                'entries': len(entries),
+                'duplicates': UPLOAD_CACHE_DUPLICATES,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'stores': self.stores,
+                'evictions': self.evictions
+            }
+
+upload_cache = UploadResultCache()
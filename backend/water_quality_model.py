@@ -5,30 +5,84 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.metrics import accuracy_score
 import pickle
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import uuid
 from datetime import datetime
 import warnings
+from fast_predictor import TreeEnsembleEvaluator, FAST_MODEL_MAX_ROUNDS
+from standards import DEFAULT_PROFILE
 warnings.filterwarnings('ignore')
 
+# Layout version of model artifact directories written by save_artifact
+MODEL_FORMAT_VERSION = 1
+
+def round_like_python(values, ndigits):
+    """Vectorized round() that returns exactly what Python's round() gives per element"""
+    values = np.asarray(values, dtype=float)
+    rounded = np.round(values, ndigits)
+    
+    # np.round scales by 10**ndigits before rounding, which can land on the wrong
+    # side of a tie; re-round only the elements sitting next to one
+    scaled = values * 10.0 ** ndigits
+    distance_to_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5)
+    near_tie = np.flatnonzero(distance_to_tie < 1e-6 + np.abs(scaled) * 1e-12)
+    if near_tie.size:
+        flat_values = values.reshape(-1)
+        flat_rounded = rounded.reshape(-1)
+        for i in near_tie:
+            flat_rounded[i] = round(float(flat_values[i]), ndigits)
+    return rounded
+
+# Level categories used by the batch engine, indexed by level code: (level, description)
+HMPI_LEVELS = [
+    ("No data", "Insufficient data for assessment"),
+    ("Safe", "Suitable for drinking purposes"),
+    ("Moderate", "Requires treatment before consumption"),
+    ("Critical", "Not suitable for drinking")
+]
+PLI_LEVELS = [
+    ("No data", "Insufficient data for calculation"),
+    ("Low", "Baseline level - suitable for drinking"),
+    ("Moderate", "Moderate level of contamination"),
+    ("High", "Significant contamination"),
+    ("Very High", "High level of contamination")
+]
+CF_LEVELS = [
+    ("No data", "No concentration data"),
+    ("Low", "Within acceptable limits"),
+    ("Moderate", "Moderate contamination"),
+    ("Considerable", "Considerable contamination"),
+    ("Very High", "Very high contamination")
+]
+
+# calculate_standards_arrays fields with one entry per standard after the sample axis
+PROFILE_INDEX_FIELDS = (
+    'hmpi_score', 'hmpi_level_code', 'pli_score', 'pli_level_code', 'total_cf_score',
+    'total_cf_level_code', 'cf_value', 'cf_level_code', 'qi_value', 'contribution'
+)
+
+def decode_levels(codes, categories):
+    """Map level codes back to (levels, descriptions) object arrays"""
+    levels = np.array([level for level, _ in categories], dtype=object)
+    descriptions = np.array([description for _, description in categories], dtype=object)
+    return levels[codes], descriptions[codes]
+
 class WaterSafetyPredictor:
     def __init__(self):
         self.model = None
+        self.model_version = None
+        self.fast_model = None
+        self.fast_model_agreement = None
         self.scaler = StandardScaler()
         self.label_encoder = LabelEncoder()
         self.hmpi_metals = ['arsenic', 'lead', 'cadmium', 'chromium', 'mercury', 'nickel', 'copper', 'zinc', 'iron', 'manganese']
         
-        # BIS standard limits (µg/L) - Corrected values
-        self.standard_limits_ugL = {
-            'arsenic': 10.0,    # µg/L
-            'lead': 10.0,       # µg/L
-            'cadmium': 3.0,     # µg/L
-            'chromium': 50.0,   # µg/L
-            'mercury': 1.0,     # µg/L
-            'nickel': 20.0,     # µg/L
-            'copper': 2000.0,   # µg/L
-            'zinc': 5000.0,     # µg/L
-            'iron': 300.0,      # µg/L
-            'manganese': 100.0  # µg/L
-        }
+        # Default limits (µg/L), the standards module's DEFAULT_PROFILE
+        self.standard_limits_ugL = dict(DEFAULT_PROFILE['limits_ugL'])
         
         # Convert to mg/L (divide by 1000)
         self.standard_limits_mgL = {
@@ -207,6 +261,118 @@ class WaterSafetyPredictor:
             # Return safe default prediction
             return "Safe", {"Safe": 1.0, "Moderate": 0.0, "Critical": 0.0}
 
+    def get_class_labels(self):
+        """Class labels in the column order of predict_proba"""
+        if hasattr(self.label_encoder, 'classes_') and len(self.label_encoder.classes_) > 0:
+            return [str(label) for label in self.label_encoder.classes_]
+        return ["Safe", "Moderate", "Critical"]
+    
+    def _coerce_ml_value(self, value):
+        """Convert one ML input value to float the same way predict_pollution does"""
+        try:
+            if isinstance(value, (int, float, np.number)):
+                return float(value)
+            if isinstance(value, str):
+                # Classification labels and unparseable strings become 0.0
+                if value.lower() in ['safe', 'moderate', 'critical']:
+                    return 0.0
+                return float(value)
+        except (ValueError, TypeError):
+            pass
+        return 0.0
+    
+    def validate_ml_matrix(self, input_matrix):
+        """
+        Convert ML input rows into an (N, n_features) float matrix.
+        Numeric input is converted in one step; only rows that fail that
+        conversion are coerced value by value.
+        """
+        matrix = np.asarray(input_matrix)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        if matrix.dtype.kind in 'biuf':
+            return matrix.astype(float)
+        
+        validated = np.empty(matrix.shape, dtype=float)
+        for i, row in enumerate(matrix):
+            try:
+                if any(value is None for value in row):
+                    raise TypeError("missing value")
+                validated[i] = np.asarray(row, dtype=float)
+            except (ValueError, TypeError):
+                validated[i] = [self._coerce_ml_value(value) for value in row]
+        return validated
+    
+    def get_fast_model(self):
+        """The booster compiled into a NumPy tree evaluator (built on first use), None without a model"""
+        if self.fast_model is None and self.model is not None:
+            self.fast_model = TreeEnsembleEvaluator(self.model.get_booster(), FAST_MODEL_MAX_ROUNDS)
+        return self.fast_model
+    
+    def scale_directly(self, input_array):
+        """The fitted scaler's transform without sklearn's per-call input validation"""
+        if input_array.shape[1] != len(self.scaler.mean_):
+            raise ValueError(f"X has {input_array.shape[1]} features, but the scaler expects {len(self.scaler.mean_)}")
+        scaled = input_array
+        if self.scaler.with_mean:
+            scaled = scaled - self.scaler.mean_
+        if self.scaler.with_std:
+            scaled = scaled / self.scaler.scale_
+        return scaled
+    
+    def predict_pollution_batch(self, input_matrix, fast=False):
+        """
+        Predict pollution levels for N samples with a single scaled predict_proba call.
+        Returns (labels, probabilities): an (N,) array of labels and an
+        (N, n_classes) array whose columns follow get_class_labels().
+        fast evaluates the trees with the NumPy evaluator instead of XGBoost.
+        """
+        class_labels = self.get_class_labels()
+        
+        def default_prediction(n_samples):
+            labels = np.full(n_samples, "Safe", dtype=object)
+            probabilities = np.zeros((n_samples, len(class_labels)))
+            if "Safe" in class_labels:
+                probabilities[:, class_labels.index("Safe")] = 1.0
+            return labels, probabilities
+        
+        try:
+            input_array = self.validate_ml_matrix(input_matrix)
+        except Exception as e:
+            print(f"Batch prediction input error: {e}")
+            return default_prediction(len(input_matrix))
+        
+        # If model is not trained, return safe default
+        if self.model is None or len(input_array) == 0:
+            return default_prediction(len(input_array))
+        
+        try:
+            # Scale the input if scaler is fitted
+            if hasattr(self.scaler, 'mean_') and self.scaler.mean_ is not None:
+                try:
+                    input_scaled = self.scale_directly(input_array) if fast else self.scaler.transform(input_array)
+                except Exception as e:
+                    print(f"Scaling error: {e}, using unscaled input")
+                    input_scaled = input_array
+            else:
+                input_scaled = input_array
+            
+            if fast:
+                probabilities = self.get_fast_model().predict_proba(input_scaled)
+            else:
+                probabilities = np.asarray(self.model.predict_proba(input_scaled), dtype=float)
+            labels = np.array(class_labels, dtype=object)[np.argmax(probabilities, axis=1)]
+            return labels, probabilities
+            
+        except Exception as e:
+            print(f"Batch prediction error: {e}")
+            return default_prediction(len(input_array))
+    
+    def probabilities_to_dicts(self, probabilities):
+        """Turn a predict_pollution_batch probability matrix into per-sample dicts"""
+        class_labels = self.get_class_labels()
+        return [dict(zip(class_labels, row)) for row in np.asarray(probabilities, dtype=float).tolist()]
+    
     def calculate_contamination_factors(self, sample_data, standard_limits):
         """Calculate Contamination Factor (CF) for each metal - FIXED"""
         cf_dict = {}
@@ -446,6 +612,278 @@ class WaterSafetyPredictor:
                 converted_data[key] = value
         return converted_data
     
+    def to_metal_matrix(self, data):
+        """
+        Build an (N, len(hmpi_metals)) float matrix from a DataFrame or array.
+        Missing columns and non-numeric cells become NaN, which every batch
+        calculation treats exactly like a metal absent from a sample dict.
+        """
+        if isinstance(data, pd.DataFrame):
+            matrix = np.full((len(data), len(self.hmpi_metals)), np.nan)
+            for j, metal in enumerate(self.hmpi_metals):
+                if metal in data.columns:
+                    matrix[:, j] = pd.to_numeric(data[metal], errors='coerce').to_numpy(dtype=float)
+            return matrix
+        
+        matrix = np.array(data, dtype=float, ndmin=2)
+        if matrix.shape[1] != len(self.hmpi_metals):
+            raise ValueError(f"Expected {len(self.hmpi_metals)} metal columns, got {matrix.shape[1]}")
+        return matrix
+    
+    def detect_unit_batch(self, matrix, positive_only=True):
+        """
+        Vectorized detect_unit over the rows of a metal matrix.
+        With positive_only=False zero and negative readings also count towards the
+        median, which is how main.auto_detect_unit behaves.
+        """
+        values = np.array(matrix, dtype=float, ndmin=2)
+        if positive_only:
+            values[~(values > 0)] = np.nan
+        
+        valid = ~np.isnan(values)
+        n_valid = valid.sum(axis=1)
+        
+        # Median of the valid entries per row (NaNs sort to the end)
+        ordered = np.sort(values, axis=1)
+        rows = np.arange(len(values))
+        lower = ordered[rows, np.maximum(n_valid - 1, 0) // 2]
+        upper = ordered[rows, np.minimum(n_valid // 2, values.shape[1] - 1)]
+        median_conc = np.where(n_valid % 2 == 1, lower, (lower + upper) / 2)
+        
+        low_count = (valid & (values < 0.1)).sum(axis=1)
+        is_mgL = (median_conc < 0.01) | ((median_conc < 1.0) & (low_count >= n_valid * 0.6))
+        
+        units = np.where(is_mgL, "mg/L", "µg/L").astype(object)
+        units[n_valid == 0] = "µg/L"  # Default assumption
+        return units
+    
+    def get_pollution_level_codes(self, hmpi):
+        """Vectorized get_pollution_level as int8 codes into HMPI_LEVELS"""
+        return np.select([hmpi == 0, hmpi < 100, hmpi < 200], [0, 1, 2], 3).astype(np.int8)
+    
+    def interpret_pli_codes(self, pli):
+        """Vectorized interpret_pli as int8 codes into PLI_LEVELS"""
+        return np.select([pli == 0, pli < 1.0, pli < 2.0, pli < 5.0], [0, 1, 2, 3], 4).astype(np.int8)
+    
+    def interpret_cf_codes(self, cf):
+        """Vectorized interpret_cf as int8 codes into CF_LEVELS"""
+        return np.select([cf == 0, cf < 1.0, cf < 3.0, cf < 6.0], [0, 1, 2, 3], 4).astype(np.int8)
+    
+    def get_pollution_level_batch(self, hmpi):
+        """Vectorized get_pollution_level, returns (levels, recommendations)"""
+        return decode_levels(self.get_pollution_level_codes(hmpi), HMPI_LEVELS)
+    
+    def interpret_pli_batch(self, pli):
+        """Vectorized interpret_pli, returns (levels, descriptions)"""
+        return decode_levels(self.interpret_pli_codes(pli), PLI_LEVELS)
+    
+    def interpret_cf_batch(self, cf):
+        """Vectorized interpret_cf, returns (levels, descriptions)"""
+        return decode_levels(self.interpret_cf_codes(cf), CF_LEVELS)
+    
+    def calculate_comprehensive_indices_batch(self, data):
+        """
+        Calculate all pollution indices for N samples at once.
+        
+        Accepts a DataFrame with metal columns or an (N, len(hmpi_metals)) array in
+        hmpi_metals order (NaN = metal not measured). Returns a columnar dict of
+        NumPy arrays whose values are identical to calculate_comprehensive_indices;
+        use comprehensive_indices_records() to get the per-sample nested dicts.
+        """
+        return self.decode_index_arrays(self.calculate_index_arrays(data))
+    
+    def calculate_index_arrays(self, data):
+        """
+        The numeric part of calculate_comprehensive_indices_batch: one numeric
+        array per result field with a row per sample, levels as codes.
+        """
+        standards = np.array([self.standard_limits_ugL.get(metal, 1.0) for metal in self.hmpi_metals], dtype=float)
+        arrays = self.calculate_standards_arrays(data, standards[None, :])
+        return {
+            key: values[:, 0] if key in PROFILE_INDEX_FIELDS else values
+            for key, values in arrays.items()
+        }
+    
+    def calculate_standards_arrays(self, data, limits, contributions=True):
+        """
+        calculate_index_arrays against several standards in one pass. limits is a
+        (standards, len(hmpi_metals)) matrix in µg/L, with 0.0 where a standard sets
+        no limit for a metal (the metal is then left out of that standard's indices).
+        The PROFILE_INDEX_FIELDS arrays get a second axis with one entry per standard;
+        contributions=False leaves out the per-metal qi_value and contribution arrays.
+        """
+        metals = list(self.hmpi_metals)
+        raw = self.to_metal_matrix(data)
+        n_samples = raw.shape[0]
+        n_standards = len(limits)
+        
+        # Detect unit and convert to µg/L
+        unit_detected = self.detect_unit_batch(raw)
+        concentration = np.where((unit_detected == "mg/L")[:, None], raw * 1000.0, raw)
+        
+        # (samples, standards, metals) from here on
+        standards = np.asarray(limits, dtype=float)
+        safe_standards = np.where(standards > 0, standards, 1.0)
+        weights = np.where(standards > 0, 1.0 / safe_standards, 0.0)
+        sample_concentration = concentration[:, None, :]
+        
+        # HMPI: Σ(Wi × Qi) / ΣWi over the metals present in each sample
+        available = concentration >= 0
+        qi = np.where(standards > 0, (sample_concentration / safe_standards) * 100.0, 0.0)
+        weighted_qi = qi * weights
+        
+        # Accumulate column by column so the float sums match the scalar loop exactly
+        total_weighted_qi = np.zeros((n_samples, n_standards))
+        total_weights = np.zeros((n_samples, n_standards))
+        for j in range(len(metals)):
+            total_weighted_qi += np.where(available[:, None, j], weighted_qi[:, :, j], 0.0)
+            total_weights += np.where(available[:, None, j], weights[:, j], 0.0)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hmpi = np.where(total_weights > 0, total_weighted_qi / total_weights, 0.0)
+        hmpi = round_like_python(hmpi, 2)
+        
+        # Contamination factors
+        cf = np.where(available[:, None, :] & (standards > 0), sample_concentration / safe_standards, 0.0)
+        
+        # PLI = nth root of the product of the positive CFs
+        valid_cf = cf > 0
+        n_valid = valid_cf.sum(axis=2)
+        product = np.ones((n_samples, n_standards))
+        total_cf = np.zeros((n_samples, n_standards))
+        for j in range(len(metals)):
+            product *= np.where(valid_cf[:, :, j], np.maximum(cf[:, :, j], 0.001), 1.0)
+            total_cf += cf[:, :, j]
+        
+        with np.errstate(divide='ignore'):
+            pli = np.where(n_valid > 0, product ** (1.0 / np.maximum(n_valid, 1)), 0.0)
+        pli = round_like_python(pli, 2)
+        
+        arrays = {
+            'unit_is_mgL': unit_detected == "mg/L",
+            'hmpi_score': hmpi,
+            'hmpi_level_code': self.get_pollution_level_codes(hmpi),
+            'pli_score': pli,
+            'pli_level_code': self.interpret_pli_codes(pli),
+            'total_cf_score': round_like_python(total_cf, 2),
+            'total_cf_level_code': self.interpret_cf_codes(total_cf),
+            'cf_value': round_like_python(cf, 3),
+            'cf_level_code': self.interpret_cf_codes(cf),
+            'available': available,
+            'concentration': concentration
+        }
+        if contributions:
+            arrays['qi_value'] = round_like_python(qi, 2)
+            arrays['contribution'] = round_like_python(weighted_qi, 2)
+        return arrays
+    
+    def decode_index_arrays(self, arrays):
+        """Add the level names, descriptions and per-metal constants to calculate_index_arrays output"""
+        metals = list(self.hmpi_metals)
+        standards = np.array([self.standard_limits_ugL.get(metal, 1.0) for metal in metals], dtype=float)
+        weights = np.where(standards > 0, 1.0 / np.where(standards > 0, standards, 1.0), 0.0)
+        hmpi_level, hmpi_recommendation = decode_levels(arrays['hmpi_level_code'], HMPI_LEVELS)
+        pli_level, pli_description = decode_levels(arrays['pli_level_code'], PLI_LEVELS)
+        total_cf_level, total_cf_description = decode_levels(arrays['total_cf_level_code'], CF_LEVELS)
+        cf_level, cf_description = decode_levels(arrays['cf_level_code'], CF_LEVELS)
+        
+        return {
+            'metals': metals,
+            'unit_detected': np.where(arrays['unit_is_mgL'], "mg/L", "µg/L").astype(object),
+            'hmpi_score': arrays['hmpi_score'],
+            'hmpi_level': hmpi_level,
+            'hmpi_level_code': arrays['hmpi_level_code'],
+            'hmpi_recommendation': hmpi_recommendation,
+            'pli_score': arrays['pli_score'],
+            'pli_level': pli_level,
+            'pli_level_code': arrays['pli_level_code'],
+            'pli_description': pli_description,
+            'total_cf_score': arrays['total_cf_score'],
+            'total_cf_level': total_cf_level,
+            'total_cf_level_code': arrays['total_cf_level_code'],
+            'total_cf_description': total_cf_description,
+            'cf_value': arrays['cf_value'],
+            'cf_level': cf_level,
+            'cf_level_code': arrays['cf_level_code'],
+            'cf_description': cf_description,
+            'available': arrays['available'],
+            'concentration': arrays['concentration'],
+            'standard_limit': standards,
+            'weight': round_like_python(weights, 6),
+            'qi_value': arrays['qi_value'],
+            'contribution': arrays['contribution']
+        }
+    
+    def comprehensive_indices_records(self, batch_results, sections=None):
+        """
+        Expand a columnar batch result into calculate_comprehensive_indices style dicts.
+        sections holds per row the per-metal sections to build ('contamination_factors',
+        'contributions'), None for both; rows built without one leave that key out.
+        """
+        metals = batch_results['metals']
+        if sections is None:
+            sections = [None] * len(batch_results['hmpi_score'])
+        with_factors = [row is None or 'contamination_factors' in row for row in sections]
+        with_contributions = [row is None or 'contributions' in row for row in sections]
+        
+        # Per-metal columns are only converted when some row includes them
+        skipped = set()
+        if not any(with_factors):
+            skipped.update(['cf_value', 'cf_level', 'cf_description'])
+        if not any(with_contributions):
+            skipped.update(['available', 'concentration', 'qi_value', 'contribution'])
+        columns = {
+            key: value.tolist() for key, value in batch_results.items()
+            if isinstance(value, np.ndarray) and key not in skipped
+        }
+        
+        records = []
+        for i, hmpi in enumerate(columns['hmpi_score']):
+            hmpi_level = columns['hmpi_level'][i]
+            
+            record = {
+                'hmpi': {
+                    'score': hmpi,
+                    'level': hmpi_level,
+                    'recommendation': columns['hmpi_recommendation'][i],
+                    'interpretation': f"HMPI value: {hmpi} ({hmpi_level})"
+                },
+                'pli': {
+                    'score': columns['pli_score'][i],
+                    'level': columns['pli_level'][i],
+                    'description': columns['pli_description'][i]
+                },
+                'total_cf': {
+                    'score': columns['total_cf_score'][i],
+                    'level': columns['total_cf_level'][i],
+                    'description': columns['total_cf_description'][i]
+                }
+            }
+            if with_factors[i]:
+                record['contamination_factors'] = {
+                    metal: {
+                        'cf_value': columns['cf_value'][i][j],
+                        'level': columns['cf_level'][i][j],
+                        'description': columns['cf_description'][i][j]
+                    }
+                    for j, metal in enumerate(metals)
+                }
+            record['unit_detected'] = columns['unit_detected'][i]
+            if with_contributions[i]:
+                record['contributions'] = {
+                    metal: {
+                        'concentration': columns['concentration'][i][j],
+                        'standard_limit': columns['standard_limit'][j],
+                        'qi_value': columns['qi_value'][i][j],
+                        'weight': columns['weight'][j],
+                        'contribution': columns['contribution'][i][j]
+                    }
+                    for j, metal in enumerate(metals) if columns['available'][i][j]
+                }
+            records.append(record)
+        
+        return records
+    
     def interpret_hmpi(self, hmpi):
         """Interpret HMPI value"""
         if hmpi == 0:
@@ -473,6 +911,128 @@ class WaterSafetyPredictor:
         with open(filepath, 'wb') as f:
             pickle.dump(model_data, f)
     
+    def save_artifact(self, root_dir, model_version=None, training=None):
+        """
+        Save the model as a versioned artifact under root_dir/<model_version>:
+        the booster in XGBoost's native format, the scaler as .npy arrays and
+        everything else in manifest.json (training holds optional details of
+        how the model was trained). root_dir/LATEST names the newest version.
+        Returns the model version.
+        """
+        # A random suffix keeps versions saved in the same second (by other processes) apart
+        model_version = model_version or f"{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        directory = os.path.join(root_dir, model_version)
+        if os.path.exists(directory):
+            raise FileExistsError(f"Model version {model_version} already exists in {root_dir}")
+        
+        # Written to a temporary directory and moved into place once complete,
+        # so a half-written version is never loaded
+        os.makedirs(root_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{model_version}.", dir=root_dir)
+        os.chmod(staging, 0o755)
+        try:
+            self.write_artifact_files(staging, model_version, training)
+            os.replace(staging, directory)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        
+        latest_tmp = os.path.join(root_dir, f"LATEST.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+        with open(latest_tmp, 'w', encoding='utf-8') as f:
+            f.write(model_version)
+        os.replace(latest_tmp, os.path.join(root_dir, "LATEST"))
+        return model_version
+    
+    def write_artifact_files(self, directory, model_version, training=None):
+        """The files of a save_artifact version, written into directory"""
+        booster_sha256 = None
+        if self.model is not None:
+            booster_path = os.path.join(directory, "booster.ubj")
+            self.model.get_booster().save_model(booster_path)
+            with open(booster_path, 'rb') as f:
+                booster_sha256 = hashlib.sha256(f.read()).hexdigest()
+        
+        scaler_fitted = hasattr(self.scaler, 'mean_')
+        if scaler_fitted:
+            for name in ('mean_', 'scale_', 'var_'):
+                np.save(os.path.join(directory, f"scaler_{name.rstrip('_')}.npy"), np.asarray(getattr(self.scaler, name), dtype=float))
+        
+        feature_names = getattr(self.scaler, 'feature_names_in_', None)
+        manifest = {
+            'format_version': MODEL_FORMAT_VERSION,
+            'model_version': model_version,
+            'created_at': datetime.utcnow().isoformat(),
+            'xgboost_version': xgb.__version__,
+            'booster_sha256': booster_sha256,
+            'class_labels': self.get_class_labels() if hasattr(self.label_encoder, 'classes_') else None,
+            'scaler': {
+                'fitted': scaler_fitted,
+                'with_mean': self.scaler.with_mean,
+                'with_std': self.scaler.with_std,
+                'n_samples_seen': int(self.scaler.n_samples_seen_) if scaler_fitted else None,
+                'feature_names': [str(name) for name in feature_names] if feature_names is not None else None
+            },
+            'hmpi_metals': self.hmpi_metals,
+            'standard_limits_ugL': self.standard_limits_ugL,
+            'standard_limits_mgL': self.standard_limits_mgL,
+            'weights_ugL': self.weights_ugL,
+            'weights_mgL': self.weights_mgL,
+            'training': training
+        }
+        with open(os.path.join(directory, "manifest.json"), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    
+    @classmethod
+    def load_artifact(cls, path):
+        """
+        Load a model saved with save_artifact. path is an artifact root (the
+        LATEST version is used) or one version directory. Raises if the
+        artifact is missing, of an unknown format or fails its checksum.
+        """
+        latest = os.path.join(path, "LATEST")
+        if os.path.exists(latest):
+            with open(latest, encoding='utf-8') as f:
+                path = os.path.join(path, f.read().strip())
+        
+        with open(os.path.join(path, "manifest.json"), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != MODEL_FORMAT_VERSION:
+            raise ValueError(f"Unsupported model artifact format {manifest.get('format_version')}")
+        
+        predictor = cls()
+        predictor.model_version = manifest['model_version']
+        predictor.hmpi_metals = manifest['hmpi_metals']
+        predictor.standard_limits_ugL = manifest['standard_limits_ugL']
+        predictor.standard_limits_mgL = manifest['standard_limits_mgL']
+        predictor.weights_ugL = manifest['weights_ugL']
+        predictor.weights_mgL = manifest['weights_mgL']
+        
+        if manifest['booster_sha256'] is not None:
+            with open(os.path.join(path, "booster.ubj"), 'rb') as f:
+                raw = bytearray(f.read())
+            if hashlib.sha256(raw).hexdigest() != manifest['booster_sha256']:
+                raise ValueError(f"Model artifact {path} failed its checksum")
+            predictor.model = xgb.XGBClassifier()
+            predictor.model.load_model(raw)
+        
+        scaler = manifest['scaler']
+        predictor.scaler = StandardScaler(with_mean=scaler['with_mean'], with_std=scaler['with_std'])
+        if scaler['fitted']:
+            # Small arrays, memory-mapped rather than copied
+            predictor.scaler.mean_ = np.load(os.path.join(path, "scaler_mean.npy"), mmap_mode='r')
+            predictor.scaler.scale_ = np.load(os.path.join(path, "scaler_scale.npy"), mmap_mode='r')
+            predictor.scaler.var_ = np.load(os.path.join(path, "scaler_var.npy"), mmap_mode='r')
+            predictor.scaler.n_samples_seen_ = scaler['n_samples_seen']
+            predictor.scaler.n_features_in_ = len(predictor.scaler.mean_)
+            if scaler['feature_names'] is not None:
+                predictor.scaler.feature_names_in_ = np.array(scaler['feature_names'], dtype=object)
+        
+        predictor.label_encoder = LabelEncoder()
+        if manifest['class_labels'] is not None:
+            predictor.label_encoder.classes_ = np.array(manifest['class_labels'])
+        
+        return predictor
+    
     @classmethod
     def load_model(cls, filepath):
         """Load a trained model from pickle file"""
@@ -506,6 +1066,9 @@ def train_and_save_model():
     
     predictor.save_model('water_quality_model.pkl')
     print("Model saved as 'water_quality_model.pkl'")
+    
+    model_version = predictor.save_artifact('model_artifacts')
+    print(f"Model artifact saved as 'model_artifacts/{model_version}'")
 
 if __name__ == "__main__":
     train_and_save_model()
\ No newline at end of file
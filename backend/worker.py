@@ -0,0 +1,37 @@
+"""
+Standalone batch worker for durable job queues.
+
+Run next to (or instead of) the API's embedded worker, with the same
+JOB_QUEUE_BACKEND, JOB_QUEUE_PATH / MONGODB_URI and JOB_DATA_DIR settings:
+
+    JOB_QUEUE_BACKEND=sqlite python worker.py
+"""
+import asyncio
+import os
+import socket
+
+import main
+
+async def work(worker_id: str):
+    """Run the worker loop while picking up newly trained model versions"""
+    watcher = asyncio.ensure_future(main.watch_model_artifacts())
+    try:
+        await main.durable_worker_loop(worker_id)
+    finally:
+        watcher.cancel()
+
+def run():
+    """Claim and run batch jobs until interrupted"""
+    if main.job_queue is None:
+        raise SystemExit("Set JOB_QUEUE_BACKEND to sqlite or mongo to run a standalone worker")
+
+    worker_id = os.getenv("WORKER_ID") or f"worker-{socket.gethostname()}-{os.getpid()}"
+    main.db_manager.connect()
+    main.ensure_model()
+    try:
+        asyncio.run(work(worker_id))
+    except KeyboardInterrupt:
+        print(f"Batch worker {worker_id} stopped")
+
+if __name__ == "__main__":
+    run()
@@ -6,7 +6,7 @@ import jsPDF from 'jspdf';
 import 'jspdf-autotable';
 import { computeAllIndices } from '../utils/hmpi';
 import { addSample } from '../utils/storage';
-import { analyzeBatchSamples } from '../utils/api';
+import { analyzeBatchSamples, uploadLargeFile, watchBatchProgress, streamBatchResults, getBatchResultsCSVUrl } from '../utils/api';
 
 const h = React.createElement;
 
@@ -24,11 +24,19 @@ const metalDisplayNames = {
   Mn: 'Manganese'
 };
 
+// Columns requested from the server for the results table
+const serverResultFields = ['row_id', 'sample_id', 'hmpi_score', 'pli_score', 'pollution_level', 'pli_level', 'ml_prediction'];
+const levelBadges = { Safe: 'success', Moderate: 'warning', Critical: 'danger' };
+
 export default function BatchProcessing() {
   const [rows, setRows] = useState([]);
   const [computedRows, setComputedRows] = useState([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
+  const [file, setFile] = useState(null);
+  const [serverJob, setServerJob] = useState(null);
+  const [serverRows, setServerRows] = useState([]);
+  const [serverLoading, setServerLoading] = useState(false);
 
   function normalizeColumnName(colName) {
     if (!colName) return '';
@@ -119,7 +127,10 @@ export default function BatchProcessing() {
     
     setRows([]);
     setComputedRows([]);
+    setServerJob(null);
+    setServerRows([]);
     setError('');
+    setFile(file);
     
     if (file.name.endsWith('.csv')) parseCSV(file);
     else if (file.name.endsWith('.xlsx') || file.name.endsWith('.xls')) parseExcel(file);
@@ -187,6 +198,49 @@ export default function BatchProcessing() {
     }
   }
 
+  async function processOnServer() {
+    if (!file) {
+      setError('Please upload a file first');
+      return;
+    }
+
+    setServerLoading(true);
+    setServerRows([]);
+    setError('');
+
+    try {
+      const started = await uploadLargeFile(file);
+
+      // Small files are processed right away and come back with their results
+      if (!started.job_id) {
+        setServerJob({ status: 'completed', progress: 100, total: started.total_samples });
+        setServerRows(started.results || []);
+        return;
+      }
+
+      // Progress is pushed by the server until the job finishes
+      setServerJob({ id: started.job_id, status: started.status, progress: 0, total: started.total_samples });
+      const status = await watchBatchProgress(started.job_id, (progress) => {
+        setServerJob({ id: started.job_id, status: progress.status, progress: progress.progress, total: progress.total_samples });
+      });
+      setServerJob({ id: started.job_id, status: status.status, progress: status.progress, total: status.total_samples });
+
+      if (status.status === 'failed') {
+        throw new Error(status.error || 'Batch job failed');
+      }
+
+      // Render rows as they arrive instead of waiting for the whole result set
+      await streamBatchResults(started.job_id, (batch) => {
+        setServerRows(prev => prev.concat(batch));
+      }, serverResultFields);
+    } catch (error) {
+      console.error('Server processing error:', error);
+      setError('Error processing file on server: ' + error.message);
+    } finally {
+      setServerLoading(false);
+    }
+  }
+
   function downloadCSV() {
     if (!computedRows.length) {
       setError('Please analyze samples first');
@@ -305,6 +359,19 @@ export default function BatchProcessing() {
                 h('i', { className: 'bi bi-calculator me-2', key: 'icon' }),
                 ` Analyze ${rows.length} Samples`
               ]
+            ),
+            h('button', { 
+              className: `btn btn-outline-info ms-2 ${serverLoading ? 'disabled' : ''}`, 
+              onClick: processOnServer,
+              disabled: serverLoading || !file
+            }, 
+              serverLoading ? [
+                h('span', { className: 'spinner-border spinner-border-sm me-2', key: 'spinner' }),
+                ' Processing on Server...'
+              ] : [
+                h('i', { className: 'bi bi-cloud-upload me-2', key: 'icon' }),
+                ' Process on Server'
+              ]
             )
           ),
           
@@ -318,6 +385,53 @@ export default function BatchProcessing() {
 
       // REMOVED: BackendSummaryCard component entirely
 
+      serverJob && h('div', { className: 'col-12' },
+        h(Card, { 
+          title: `Server Results (${serverRows.length} of ${serverJob.total || 0} samples)`,
+          variant: 'dark'
+        },
+          h('div', { className: 'progress mb-3' },
+            h('div', { 
+              className: 'progress-bar', 
+              role: 'progressbar', 
+              style: { width: `${serverJob.progress || 0}%` } 
+            }, `${Math.round(serverJob.progress || 0)}% (${serverJob.status})`)
+          ),
+          serverRows.length > 0 && h('div', { className: 'table-responsive', style: { maxHeight: '500px' } },
+            h('table', { className: 'table table-dark table-striped table-sm align-middle' },
+              h('thead', { className: 'sticky-top' },
+                h('tr', null,
+                  ['Row', 'HMPI', 'PLI', 'PLI Level', 'ML Prediction', 'Status'].map(k => 
+                    h('th', { key: k }, k)
+                  )
+                )
+              ),
+              h('tbody', null,
+                serverRows.slice(0, 200).map((r) =>
+                  h('tr', { key: r.row_id },
+                    h('td', null, r.row_id),
+                    h('td', null, r.hmpi_score?.toFixed(2) || '0.00'),
+                    h('td', null, r.pli_score?.toFixed(2) || '0.00'),
+                    h('td', null, r.pli_level || 'Unknown'),
+                    h('td', null, r.ml_prediction || 'N/A'),
+                    h('td', null, 
+                      h('span', { className: `badge bg-${levelBadges[r.pollution_level] || 'secondary'}` }, 
+                        r.pollution_level || 'Unknown')
+                    )
+                  )
+                )
+              )
+            )
+          ),
+          serverJob.id && serverRows.length > 0 && !serverLoading && h('div', { className: 'mt-3' },
+            h('a', { 
+              className: 'btn btn-outline-success', 
+              href: getBatchResultsCSVUrl(serverJob.id)
+            }, h('i', { className: 'bi bi-filetype-csv me-2' }), ' Download Server Results')
+          )
+        )
+      ),
+
       h('div', { className: 'col-12' },
         h(Card, { 
           title: `Analysis Results (${displayRows.length} samples)`,
@@ -93,6 +93,146 @@ export const analyzeBatchSamples = async (file) => {
   }
 };
 
+export const uploadLargeFile = async (file) => {
+  try {
+    const formData = new FormData();
+    formData.append('file', file);
+
+    const response = await fetch(`${API_BASE_URL}/upload-file-large`, {
+      method: 'POST',
+      body: formData,
+    });
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP ${response.status}: ${errorText}`);
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Large file upload error:', error);
+    throw error;
+  }
+};
+
+export const getBatchStatus = async (jobId) => {
+  try {
+    const response = await fetch(`${API_BASE_URL}/batch-status/${jobId}`);
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP ${response.status}: ${errorText}`);
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching batch status:', error);
+    throw error;
+  }
+};
+
+// Follow a batch job's progress over server-sent events; resolves with the final status
+export const watchBatchProgress = (jobId, onProgress) => new Promise((resolve, reject) => {
+  // Poll the status endpoint where EventSource is unavailable
+  if (typeof EventSource === 'undefined') {
+    const poll = async () => {
+      try {
+        const status = await getBatchStatus(jobId);
+        if (['completed', 'failed', 'cancelled'].includes(status.status)) {
+          resolve(status);
+        } else {
+          onProgress(status);
+          setTimeout(poll, 1000);
+        }
+      } catch (error) {
+        reject(error);
+      }
+    };
+    poll();
+    return;
+  }
+
+  const source = new EventSource(`${API_BASE_URL}/batch-progress/${jobId}`);
+  source.addEventListener('progress', (e) => onProgress(JSON.parse(e.data)));
+  ['completed', 'failed', 'cancelled'].forEach(eventName => {
+    source.addEventListener(eventName, (e) => {
+      source.close();
+      resolve(JSON.parse(e.data));
+    });
+  });
+  source.onerror = () => {
+    // Closed before a final event, fall back to a single status read
+    if (source.readyState === EventSource.CLOSED) {
+      getBatchStatus(jobId).then(resolve, reject);
+    }
+  };
+});
+
+export const getBatchResultsPage = async (jobId, cursor = 0, limit = 1000, fields = null) => {
+  try {
+    const params = new URLSearchParams({ cursor: cursor.toString(), limit: limit.toString() });
+    if (fields) params.append('fields', fields.join(','));
+
+    const response = await fetch(`${API_BASE_URL}/batch-results/${jobId}?${params}`);
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP ${response.status}: ${errorText}`);
+    }
+
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching batch results:', error);
+    throw error;
+  }
+};
+
+// Stream batch results as NDJSON, calling onRows with each batch of parsed rows as it arrives
+export const streamBatchResults = async (jobId, onRows, fields = null) => {
+  try {
+    const params = new URLSearchParams({ format: 'ndjson' });
+    if (fields) params.append('fields', fields.join(','));
+
+    const response = await fetch(`${API_BASE_URL}/batch-results/${jobId}?${params}`);
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      throw new Error(`HTTP ${response.status}: ${errorText}`);
+    }
+
+    // Fall back to cursor pagination where response bodies cannot be streamed
+    if (!response.body || !response.body.getReader) {
+      let cursor = 0;
+      while (cursor !== null) {
+        const page = await getBatchResultsPage(jobId, cursor, 1000, fields);
+        onRows(page.results);
+        cursor = page.next_cursor;
+      }
+      return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    while (true) {
+      const { done, value } = await reader.read();
+      buffered += done ? decoder.decode() : decoder.decode(value, { stream: true });
+
+      const lines = buffered.split('\n');
+      buffered = done ? '' : lines.pop();
+      const rows = lines.filter(line => line.trim()).map(line => JSON.parse(line));
+      if (rows.length > 0) onRows(rows);
+
+      if (done) break;
+    }
+  } catch (error) {
+    console.error('Error streaming batch results:', error);
+    throw error;
+  }
+};
+
+export const getBatchResultsCSVUrl = (jobId) => `${API_BASE_URL}/batch-results/${jobId}?format=csv`;
+
 export const getSamples = async (days = 30, location = null) => {
   try {
     const params = new URLSearchParams({ days: days.toString() });
@@ -257,6 +397,12 @@ export const downloadCSV = (csvData, filename) => {
 export default {
   analyzeSingleSample,
   analyzeBatchSamples,
+  uploadLargeFile,
+  getBatchStatus,
+  watchBatchProgress,
+  getBatchResultsPage,
+  streamBatchResults,
+  getBatchResultsCSVUrl,
   getSamples,
   getSampleById,
   getStatistics,
@@ -3,6 +3,9 @@ const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 export const API_ENDPOINTS = {
   ANALYZE_SAMPLE: `${API_BASE_URL}/analyze-sample`,
   UPLOAD_FILE: `${API_BASE_URL}/upload-file`,
+  UPLOAD_FILE_LARGE: `${API_BASE_URL}/upload-file-large`,
+  BATCH_STATUS: `${API_BASE_URL}/batch-status`,
+  BATCH_RESULTS: `${API_BASE_URL}/batch-results`,
   BATCH_ANALYZE: `${API_BASE_URL}/batch-analyze`,
   GET_SAMPLES: `${API_BASE_URL}/samples`,
   GET_STATISTICS: `${API_BASE_URL}/statistics`,